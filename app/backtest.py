@@ -0,0 +1,303 @@
+"""
+Backtesting de estrategias de CETES y ETFs sobre el histórico guardado.
+
+El histórico se carga una sola vez en arreglos de NumPy sobre una malla
+semanal (las fechas de subasta de CETES). Cada estrategia se simula de
+forma vectorizada sobre el tiempo y los barridos de parámetros se
+reparten en lotes entre un pool de procesos.
+
+Ejemplos de estrategias:
+    Estrategia("Rolar CETES 28", plazos=(28,))
+    Estrategia("Escalera", plazos=(91, 182, 364))
+    Estrategia("60/40 CETES/SPY", plazos=(28,), ticker="SPY", peso_etf=0.4)
+"""
+
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+import psycopg
+
+from app.config import get_settings
+
+
+SEMANAS_POR_ANIO = 52
+EPOCH = date(1970, 1, 1)
+
+# Estrategias mínimas por lote; con menos no conviene repartir entre procesos
+MIN_LOTE = 50
+
+_executor: ProcessPoolExecutor | None = None
+
+
+@dataclass(frozen=True)
+class Historico:
+    """Histórico alineado a la malla semanal de subastas."""
+    fechas: np.ndarray  # días desde 1970 de cada semana
+    plazos: tuple[int, ...]
+    tasas: np.ndarray  # (semanas, plazos) tasa anual en %, último dato conocido
+    precios: dict[str, np.ndarray]  # ticker -> último precio conocido (NaN sin dato)
+
+
+@dataclass(frozen=True)
+class Estrategia:
+    """Configuración de una estrategia."""
+    nombre: str
+    plazos: tuple[int, ...] = (28,)  # CETES que se rolan con pesos iguales
+    ticker: str | None = None
+    peso_etf: float = 0.0
+    rebalanceo: int = 4  # semanas entre rebalanceos CETES/ETF
+
+
+ESTRATEGIAS_PREDEFINIDAS = [
+    Estrategia("Rolar CETES 28", plazos=(28,)),
+    Estrategia("Escalera 91/182/364", plazos=(91, 182, 364)),
+    Estrategia("60/40 CETES/SPY", plazos=(28,), ticker="SPY", peso_etf=0.4),
+]
+
+
+def load_history(
+    db: psycopg.Connection,
+    fecha_inicio: date | None = None,
+    fecha_fin: date | None = None,
+    tickers: list[str] | None = None,
+) -> Historico:
+    """
+    Carga el histórico de CETES y precios de ETFs en arreglos de NumPy.
+
+    Args:
+        db: Conexión
+        fecha_inicio: Primera fecha (opcional)
+        fecha_fin: Última fecha (opcional)
+        tickers: ETFs a cargar
+
+    Returns:
+        Histórico alineado a las fechas de subasta
+    """
+    from app.columnar import fetch_columns
+
+    rango = [fecha_inicio, fecha_fin]
+    cetes = fetch_columns(
+        db,
+        """
+        SELECT plazo, tasa, fecha_subasta
+        FROM cetes
+        WHERE fecha_subasta >= COALESCE(%s::date, '-infinity')
+          AND fecha_subasta <= COALESCE(%s::date, 'infinity')
+        ORDER BY fecha_subasta
+        """,
+        rango,
+        {"plazo": "int32", "tasa": "float64", "fecha_subasta": "date32"},
+        orden="q.fecha_subasta, q.plazo",
+    )
+
+    plazo = np.asarray(cetes["plazo"], dtype=np.int32)
+    tasa = np.asarray(cetes["tasa"], dtype=np.float64)
+    fecha = np.asarray(cetes["fecha_subasta"], dtype=np.int64)
+
+    fechas = np.unique(fecha)
+    plazos = tuple(int(p) for p in np.unique(plazo))
+
+    tasas = np.full((len(fechas), len(plazos)), np.nan)
+    for j, p in enumerate(plazos):
+        mascara = plazo == p
+        tasas[np.searchsorted(fechas, fecha[mascara]), j] = tasa[mascara]
+    tasas = _forward_fill(tasas)
+
+    precios = {}
+    if tickers and len(fechas):
+        etfs = fetch_columns(
+            db,
+            """
+            SELECT ticker, precio_actual, fecha_actualizacion
+            FROM fondos_etfs
+            WHERE ticker = ANY(%s)
+              AND precio_actual IS NOT NULL
+              AND fecha_actualizacion <= %s
+            ORDER BY ticker, fecha_actualizacion
+            """,
+            [tickers, EPOCH + timedelta(days=int(fechas[-1]))],
+            {"ticker": "string", "precio_actual": "float64", "fecha_actualizacion": "date32"},
+            orden="q.ticker, q.fecha_actualizacion",
+        )
+        ticker = np.asarray(etfs["ticker"], dtype=object)
+        precio = np.asarray(etfs["precio_actual"], dtype=np.float64)
+        fecha_precio = np.asarray(etfs["fecha_actualizacion"], dtype=np.int64)
+
+        for t in tickers:
+            mascara = ticker == t
+            if not mascara.any():
+                continue
+            # Último precio con fecha <= cada semana
+            idx = np.searchsorted(fecha_precio[mascara], fechas, side="right") - 1
+            serie = precio[mascara][np.maximum(idx, 0)]
+            precios[t] = np.where(idx >= 0, serie, np.nan)
+
+    return Historico(fechas=fechas, plazos=plazos, tasas=tasas, precios=precios)
+
+
+def _forward_fill(matriz: np.ndarray) -> np.ndarray:
+    """Rellena cada columna con el último valor no nulo."""
+    filas = np.arange(matriz.shape[0])[:, None]
+    idx = np.where(np.isnan(matriz), 0, filas)
+    idx = np.maximum.accumulate(idx, axis=0)
+    return np.take_along_axis(matriz, idx, axis=0)
+
+
+def _rendimientos_cetes(hist: Historico, plazo: int) -> np.ndarray:
+    """
+    Rendimiento semanal de rolar CETES de un plazo.
+
+    La tasa queda fija desde la compra hasta el vencimiento (cada
+    plazo/7 semanas) y se devenga con base 360.
+    """
+    j = hist.plazos.index(plazo)
+    paso = max(1, round(plazo / 7))
+    semanas = np.arange(len(hist.fechas) - 1)
+    tasa = hist.tasas[(semanas // paso) * paso, j]
+    return tasa / 100 * np.diff(hist.fechas) / 360
+
+
+def _combinar(r_cetes: np.ndarray, r_etf: np.ndarray, peso: float, rebalanceo: int) -> np.ndarray:
+    """
+    Valor de un portafolio CETES/ETF que se rebalancea cada `rebalanceo` semanas.
+
+    Dentro de cada bloque las posiciones crecen por separado; al cierre
+    del bloque se regresa a los pesos objetivo.
+    """
+    n = len(r_cetes)
+    semanas = np.arange(n)
+    inicio = (semanas // rebalanceo) * rebalanceo
+
+    log_cetes = np.concatenate(([0.0], np.cumsum(np.log1p(r_cetes))))
+    log_etf = np.concatenate(([0.0], np.cumsum(np.log1p(r_etf))))
+    factor = (
+        peso * np.exp(log_etf[semanas + 1] - log_etf[inicio])
+        + (1 - peso) * np.exp(log_cetes[semanas + 1] - log_cetes[inicio])
+    )
+
+    cierre_bloque = factor[rebalanceo - 1::rebalanceo]
+    valor_inicio = np.concatenate(([1.0], np.cumprod(cierre_bloque)))
+    return valor_inicio[semanas // rebalanceo] * factor
+
+
+def simulate(hist: Historico, estrategia: Estrategia) -> dict:
+    """
+    Simula una estrategia sobre el histórico.
+
+    Returns:
+        Rendimiento total y anualizado, volatilidad anualizada y máximo
+        drawdown (en %), sobre las semanas con datos de todos sus activos.
+        Sin datos, las métricas son None y `advertencia` dice qué faltó.
+    """
+    resultado = {
+        "nombre": estrategia.nombre,
+        "fecha_inicio": None,
+        "fecha_fin": None,
+        "semanas": 0,
+        "rendimiento_total": None,
+        "rendimiento_anual": None,
+        "volatilidad": None,
+        "max_drawdown": None,
+        "advertencia": None,
+    }
+    if len(hist.fechas) < 2:
+        resultado["advertencia"] = "Sin histórico de CETES en el rango"
+        return resultado
+    faltantes = [p for p in estrategia.plazos if p not in hist.plazos]
+    if faltantes:
+        resultado["advertencia"] = f"Sin histórico de CETES {'/'.join(map(str, faltantes))}"
+        return resultado
+
+    r_cetes = np.mean([_rendimientos_cetes(hist, p) for p in estrategia.plazos], axis=0)
+
+    if estrategia.ticker and estrategia.peso_etf > 0:
+        precios = hist.precios.get(estrategia.ticker)
+        if precios is None:
+            resultado["advertencia"] = f"Sin precios de {estrategia.ticker}"
+            return resultado
+        r_etf = precios[1:] / precios[:-1] - 1
+    else:
+        r_etf = np.zeros_like(r_cetes)
+
+    # Primera semana desde la que todos los activos tienen datos
+    validas = np.isfinite(r_cetes) & np.isfinite(r_etf)
+    if not validas.any():
+        resultado["advertencia"] = "Sin semanas con datos de todos los activos"
+        return resultado
+    desde = int(np.argmax(validas))
+    r_cetes, r_etf = np.nan_to_num(r_cetes[desde:]), np.nan_to_num(r_etf[desde:])
+
+    valor = _combinar(r_cetes, r_etf, estrategia.peso_etf, max(1, estrategia.rebalanceo))
+    rendimientos = valor / np.concatenate(([1.0], valor[:-1])) - 1
+    drawdown = 1 - valor / np.maximum.accumulate(np.maximum(valor, 1.0))
+
+    dias = int(hist.fechas[-1] - hist.fechas[desde])
+    anual = valor[-1] ** (365.25 / dias) - 1 if dias > 0 else 0.0
+    volatilidad = rendimientos.std(ddof=1) * math.sqrt(SEMANAS_POR_ANIO) if len(rendimientos) > 1 else 0.0
+
+    resultado.update({
+        "fecha_inicio": EPOCH + timedelta(days=int(hist.fechas[desde])),
+        "fecha_fin": EPOCH + timedelta(days=int(hist.fechas[-1])),
+        "semanas": len(rendimientos),
+        "rendimiento_total": round(float(valor[-1] - 1) * 100, 4),
+        "rendimiento_anual": round(float(anual) * 100, 4),
+        "volatilidad": round(float(volatilidad) * 100, 4),
+        "max_drawdown": round(float(drawdown.max()) * 100, 4),
+    })
+    return resultado
+
+
+def _simular_lote(hist: Historico, estrategias: list[Estrategia]) -> list[dict]:
+    """Simula un lote de estrategias (se ejecuta en un proceso del pool)."""
+    return [simulate(hist, e) for e in estrategias]
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Pool de procesos compartido, creado en el primer barrido."""
+    global _executor
+    if _executor is None:
+        metodos = multiprocessing.get_all_start_methods()
+        contexto = multiprocessing.get_context("forkserver" if "forkserver" in metodos else "spawn")
+        _executor = ProcessPoolExecutor(max_workers=_workers(), mp_context=contexto)
+    return _executor
+
+
+def _workers() -> int:
+    """Procesos del pool (BACKTEST_WORKERS, 0 = uno por CPU)."""
+    return get_settings().BACKTEST_WORKERS or os.cpu_count() or 1
+
+
+def run_backtests(hist: Historico, estrategias: list[Estrategia]) -> list[dict]:
+    """
+    Simula varias estrategias, repartiéndolas en lotes entre procesos.
+
+    Cada lote recibe el histórico una sola vez. Los barridos pequeños se
+    simulan en el proceso actual.
+
+    Returns:
+        Resultados en el mismo orden que `estrategias`
+    """
+    lotes = min(_workers(), math.ceil(len(estrategias) / MIN_LOTE))
+    if lotes <= 1:
+        return _simular_lote(hist, estrategias)
+
+    tamano = math.ceil(len(estrategias) / lotes)
+    executor = _get_executor()
+    futures = [
+        executor.submit(_simular_lote, hist, estrategias[i:i + tamano])
+        for i in range(0, len(estrategias), tamano)
+    ]
+    return [resultado for future in futures for resultado in future.result()]
+
+
+def close_backtest_pool() -> None:
+    """Detiene el pool de procesos si se creó."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
@@ -0,0 +1 @@
+"""Servidores locales, datos sintéticos y benchmarks de ingesta."""
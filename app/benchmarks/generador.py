@@ -0,0 +1,168 @@
+"""
+Generador de datos sintéticos con el formato de las fuentes reales.
+
+Produce series semanales de CETES de décadas, el FIX, INPC y UDI, cotizaciones
+GLOBAL_QUOTE de miles de tickers y la tabla de SOFIPOs. Todo se genera con
+NumPy de forma vectorizada y es reproducible con la semilla.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+
+from app.collectors.banxico_collector import CETES_SERIES, INFLACION_SERIES, SERIE_FIX
+from app.collectors.inflacion import INPC, UDI
+
+
+@dataclass
+class Dataset:
+    """Datos que sirven los servidores locales."""
+    # serie -> (fechas datetime64[D], registros {"fecha": "dd/mm/yyyy", "dato": "10.05"})
+    series: dict[str, tuple[np.ndarray, list[dict]]]
+    # ticker -> "Global Quote" de Alpha Vantage
+    cotizaciones: dict[str, dict]
+    # Información de cada ticker (como ETFS_LIST)
+    etfs: list[dict]
+    # Filas de la tabla de tasas.mx
+    sofipos: list[dict]
+
+
+def generar_series(anios: int, rng: np.random.Generator) -> dict[str, tuple[np.ndarray, list[dict]]]:
+    """
+    Series semanales de CETES hasta hoy.
+
+    Los cuatro plazos comparten una tasa base (caminata aleatoria acotada)
+    más una prima por plazo y ruido.
+    """
+    fin = np.datetime64(date.today(), "D")
+    fechas = np.arange(fin - anios * 365, fin + 1, 7)
+    base = np.clip(8.0 + np.cumsum(rng.normal(0, 0.08, len(fechas))), 2.5, 20.0)
+
+    # dd/mm/yyyy a partir de YYYY-MM-DD
+    iso = np.datetime_as_string(fechas)
+    fechas_texto = [f"{d[8:10]}/{d[5:7]}/{d[0:4]}" for d in iso]
+
+    series = {}
+    for i, serie in enumerate(CETES_SERIES.values()):
+        tasas = np.round(base + 0.15 * i + rng.normal(0, 0.05, len(fechas)), 2)
+        series[serie] = (
+            fechas,
+            [{"fecha": f, "dato": f"{t:.2f}"} for f, t in zip(fechas_texto, tasas)],
+        )
+    return series
+
+
+def _texto_banxico(fechas: np.ndarray, valores: np.ndarray, decimales: int) -> list[dict]:
+    """Registros {"fecha": "dd/mm/yyyy", "dato": ...} a partir de arreglos."""
+    iso = np.datetime_as_string(fechas)
+    return [
+        {"fecha": f"{d[8:10]}/{d[5:7]}/{d[0:4]}", "dato": f"{v:.{decimales}f}"}
+        for d, v in zip(iso, valores)
+    ]
+
+
+def generar_tipo_cambio(anios: int, rng: np.random.Generator) -> tuple[np.ndarray, list[dict]]:
+    """FIX USD/MXN en días hábiles hasta hoy (caminata aleatoria logarítmica)."""
+    fin = np.datetime64(date.today(), "D")
+    dias = np.arange(fin - anios * 365, fin + 1)
+    fechas = dias[np.is_busday(dias)]
+    fix = 17.5 * np.exp(np.cumsum(rng.normal(0, 0.006, len(fechas))))
+    return fechas, _texto_banxico(fechas, fix, 4)
+
+
+def generar_inflacion(anios: int, rng: np.random.Generator) -> dict[str, tuple[np.ndarray, list[dict]]]:
+    """
+    INPC mensual y UDI diaria hasta hoy, con la misma inflación de fondo
+    (alrededor de 4.5% anual).
+    """
+    fin = np.datetime64(date.today(), "D")
+    dias = np.arange(fin - (anios + 1) * 365, fin + 1)
+    inflacion_diaria = np.clip(rng.normal(0.045, 0.01, len(dias)), 0.0, 0.12) / 365
+    udi = 6.0 * np.exp(np.cumsum(inflacion_diaria))
+
+    # INPC: primero de cada mes, proporcional a la UDI de ese día
+    primeros = dias[np.char.endswith(np.datetime_as_string(dias), "-01")]
+    inpc = 100.0 * udi[np.searchsorted(dias, primeros)] / udi[0]
+
+    return {
+        INFLACION_SERIES[INPC]: (primeros, _texto_banxico(primeros, inpc, 6)),
+        INFLACION_SERIES[UDI]: (dias, _texto_banxico(dias, udi, 6)),
+    }
+
+
+def generar_cotizaciones(n: int, rng: np.random.Generator) -> tuple[list[dict], dict[str, dict]]:
+    """Tickers sintéticos (SYN00000...) con su cotización del día."""
+    anterior = np.round(rng.lognormal(4.0, 0.8, n), 4)
+    cambio_pct = rng.normal(0, 1.5, n)
+    precio = np.round(anterior * (1 + cambio_pct / 100), 4)
+    hoy = f"{date.today():%Y-%m-%d}"
+
+    etfs = []
+    cotizaciones = {}
+    for i in range(n):
+        ticker = f"SYN{i:05d}"
+        etfs.append({
+            "ticker": ticker,
+            "nombre": f"Synthetic ETF {i}",
+            "tipo": "ETF",
+            "mercado": "US",
+        })
+        cotizaciones[ticker] = {
+            "01. symbol": ticker,
+            "05. price": f"{precio[i]:.4f}",
+            "07. latest trading day": hoy,
+            "08. previous close": f"{anterior[i]:.4f}",
+            "09. change": f"{precio[i] - anterior[i]:.4f}",
+            "10. change percent": f"{cambio_pct[i]:.4f}%",
+        }
+    return etfs, cotizaciones
+
+
+# Plazos (días) de las columnas de tasa por plazo de la tabla de SOFIPOs
+PLAZOS_SOFIPOS = (30, 90, 180, 360)
+
+
+def generar_sofipos(n: int, rng: np.random.Generator) -> list[dict]:
+    """Filas de la tabla de SOFIPOs (GAT y tasas por plazo como texto con %)."""
+    gat_nominal = np.round(rng.uniform(6.0, 16.0, n), 2)
+    gat_real = np.round(gat_nominal - rng.uniform(3.5, 4.5, n), 2)
+    # Curva creciente hasta la GAT en el plazo más largo
+    descuento = np.sort(rng.uniform(0.0, 3.0, (n, len(PLAZOS_SOFIPOS))), axis=1)[:, ::-1]
+    descuento[:, -1] = 0.0
+    tasas = np.round(gat_nominal[:, None] - descuento, 2)
+    return [
+        {
+            "nombre": f"SOFIPO Sintética {i}",
+            "gat_nominal": f"{gat_nominal[i]:.2f}%",
+            "gat_real": f"{gat_real[i]:.2f}%",
+            "plazos": {plazo: f"{tasa:.2f}%" for plazo, tasa in zip(PLAZOS_SOFIPOS, tasas[i])},
+        }
+        for i in range(n)
+    ]
+
+
+def generar_dataset(anios: int = 30, tickers: int = 2000, sofipos: int = 100, semilla: int = 42) -> Dataset:
+    """
+    Genera un conjunto de datos completo.
+
+    Args:
+        anios: Años de historia de cada serie de CETES
+        tickers: Número de tickers sintéticos
+        sofipos: Número de SOFIPOs
+        semilla: Semilla del generador aleatorio
+
+    Returns:
+        Dataset para los servidores locales
+    """
+    rng = np.random.default_rng(semilla)
+    etfs, cotizaciones = generar_cotizaciones(tickers, rng)
+    series = generar_series(anios, rng)
+    series[SERIE_FIX] = generar_tipo_cambio(anios, rng)
+    series.update(generar_inflacion(anios, rng))
+    return Dataset(
+        series=series,
+        cotizaciones=cotizaciones,
+        etfs=etfs,
+        sofipos=generar_sofipos(sofipos, rng),
+    )
@@ -0,0 +1,207 @@
+"""
+Servidor HTTP local que imita a Banxico SIE, Alpha Vantage y tasas.mx.
+
+Un solo servidor atiende las tres fuentes bajo prefijos distintos, con el
+formato que interpretan fetch_serie, fetch_etf_data y parse_sofipos:
+
+    /banxico/SieAPIRest/service/v1/series/{serie}/datos/{inicio}/{fin}
+    /alphavantage/query?function=GLOBAL_QUOTE&symbol={ticker}&apikey=...
+    /tasas/sofipos
+
+Cada respuesta puede tardar una latencia fija para simular la red.
+
+Uso:
+    python -m app.benchmarks.servidores --puerto 8900 --latencia-ms 50
+
+y apuntar BANXICO_BASE_URL, ALPHA_VANTAGE_BASE_URL y SOFIPOS_URL a las
+URLs que se imprimen.
+"""
+
+import argparse
+import json
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from app.benchmarks.generador import Dataset, generar_dataset
+
+
+PREFIJO_BANXICO = "/banxico/SieAPIRest/service/v1/series"
+PREFIJO_ALPHA_VANTAGE = "/alphavantage/query"
+RUTA_SOFIPOS = "/tasas/sofipos"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Atiende las rutas de las tres fuentes."""
+
+    server: "ServidorLocal"
+
+    def do_GET(self):
+        """Despacha la petición según el prefijo de la fuente."""
+        if self.server.latencia:
+            time.sleep(self.server.latencia)
+
+        url = urlsplit(self.path)
+        if url.path.startswith(PREFIJO_BANXICO + "/"):
+            self._banxico(url.path[len(PREFIJO_BANXICO) + 1:])
+        elif url.path == PREFIJO_ALPHA_VANTAGE:
+            self._alpha_vantage(parse_qs(url.query))
+        elif url.path == RUTA_SOFIPOS:
+            self._responder(200, self.server.html_sofipos, "text/html; charset=utf-8")
+        else:
+            self._json(404, {"error": "Ruta no encontrada"})
+
+    def _banxico(self, ruta: str):
+        """/{serie}/datos/{inicio}/{fin} con el formato de Banxico SIE."""
+        if not self.headers.get("Bmx-Token"):
+            self._json(401, {"error": {"mensaje": "Token no proporcionado"}})
+            return
+
+        partes = ruta.split("/")
+        if len(partes) != 4 or partes[1] != "datos":
+            self._json(400, {"error": {"mensaje": "Ruta inválida"}})
+            return
+
+        serie, _, inicio, fin = partes
+        if serie not in self.server.dataset.series:
+            self._json(200, {"bmx": {"series": []}})
+            return
+
+        fechas, datos = self.server.dataset.series[serie]
+        desde = np.searchsorted(fechas, np.datetime64(inicio, "D"))
+        hasta = np.searchsorted(fechas, np.datetime64(fin, "D"), side="right")
+        self._json(200, {
+            "bmx": {
+                "series": [{
+                    "idSerie": serie,
+                    "titulo": f"Serie sintética {serie}",
+                    "datos": datos[desde:hasta],
+                }]
+            }
+        })
+
+    def _alpha_vantage(self, params: dict[str, list[str]]):
+        """GLOBAL_QUOTE con el formato de Alpha Vantage."""
+        if not params.get("apikey"):
+            self._json(200, {"Error Message": "the parameter apikey is invalid or missing."})
+            return
+        if params.get("function") != ["GLOBAL_QUOTE"]:
+            self._json(200, {"Error Message": "Invalid API call."})
+            return
+
+        simbolo = params.get("symbol", [""])[0]
+        self._json(200, {"Global Quote": self.server.dataset.cotizaciones.get(simbolo, {})})
+
+    def _json(self, status: int, data: dict):
+        """Responde con un cuerpo JSON."""
+        self._responder(status, json.dumps(data).encode(), "application/json")
+
+    def _responder(self, status: int, cuerpo: bytes, content_type: str):
+        """Envía la respuesta completa con Content-Length."""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        """Sin log por petición."""
+        pass
+
+
+def render_sofipos(sofipos: list[dict]) -> bytes:
+    """Página de tasas.mx con la tabla de SOFIPOs y una columna por plazo."""
+    plazos = list(sofipos[0]["plazos"]) if sofipos else []
+    encabezado = "".join(f"<th>{plazo} días</th>" for plazo in plazos)
+    filas = "\n".join(
+        f"<tr><td>{escape(s['nombre'])}</td><td>{s['gat_nominal']}</td><td>{s['gat_real']}</td>"
+        + "".join(f"<td>{s['plazos'][plazo]}</td>" for plazo in plazos)
+        + "</tr>"
+        for s in sofipos
+    )
+    return (
+        "<html><body><table>\n"
+        f"<tr><th>SOFIPO</th><th>GAT nominal</th><th>GAT real</th>{encabezado}</tr>\n"
+        f"{filas}\n"
+        "</table></body></html>"
+    ).encode()
+
+
+class ServidorLocal(ThreadingHTTPServer):
+    """
+    Servidor local de las tres fuentes.
+
+    Args:
+        dataset: Datos a servir
+        host: Interfaz
+        puerto: Puerto (0 = uno libre)
+        latencia: Segundos de espera antes de cada respuesta
+    """
+
+    daemon_threads = True
+
+    def __init__(self, dataset: Dataset, host: str = "127.0.0.1", puerto: int = 0, latencia: float = 0.0):
+        super().__init__((host, puerto), _Handler)
+        self.dataset = dataset
+        self.latencia = latencia
+        self.html_sofipos = render_sofipos(dataset.sofipos)
+        self._hilo: threading.Thread | None = None
+
+    @property
+    def urls(self) -> dict[str, str]:
+        """Variables de configuración que apuntan a este servidor."""
+        host, puerto = self.server_address[:2]
+        base = f"http://{host}:{puerto}"
+        return {
+            "BANXICO_BASE_URL": base + PREFIJO_BANXICO,
+            "ALPHA_VANTAGE_BASE_URL": base + PREFIJO_ALPHA_VANTAGE,
+            "SOFIPOS_URL": base + RUTA_SOFIPOS,
+        }
+
+    def iniciar(self) -> None:
+        """Atiende peticiones en un hilo de fondo."""
+        self._hilo = threading.Thread(target=self.serve_forever, name="servidor-local", daemon=True)
+        self._hilo.start()
+
+    def detener(self) -> None:
+        """Detiene el servidor y libera el puerto."""
+        self.shutdown()
+        self.server_close()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidores locales de Banxico, Alpha Vantage y tasas.mx")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8900)
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latencia por respuesta")
+    parser.add_argument("--anios", type=int, default=30, help="Años de historia de CETES")
+    parser.add_argument("--tickers", type=int, default=2000, help="Tickers sintéticos")
+    parser.add_argument("--sofipos", type=int, default=100, help="SOFIPOs en la tabla")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    dataset = generar_dataset(args.anios, args.tickers, args.sofipos, args.semilla)
+    print(f"Datos generados en {time.perf_counter() - inicio:.2f} s")
+
+    servidor = ServidorLocal(dataset, args.host, args.puerto, args.latencia_ms / 1000)
+    for nombre, url in servidor.urls.items():
+        print(f"{nombre}={url}")
+
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
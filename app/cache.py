@@ -0,0 +1,238 @@
+"""
+Caché de respuestas con stale-while-revalidate.
+
+Para las rutas más consultadas (comparar, fondos/top, sofipos/top), por
+proceso, con clave (ruta, parámetros):
+
+- Dentro de su TTL (CACHE_TTL_*), la respuesta sale de memoria.
+- Vencida pero dentro de CACHE_STALE_SECONDS, se sirve la respuesta
+  anterior y se recalcula en segundo plano (un solo recálculo por clave).
+- Sin entrada o más vieja, se consulta en la petición con single-flight:
+  una estampida de peticiones iguales hace una sola consulta.
+
+La caché se calienta al arrancar (variantes por defecto de cada ruta) y
+después de cada commit de un collector: la notificación de la fuente
+(LISTEN del broadcaster) marca como vencidas las entradas que dependen
+de ella y las recalcula en segundo plano, así que ninguna petición paga
+la consulta en frío. Las notificaciones de un mismo collector (una por
+lote) se agrupan durante CACHE_WARM_DELAY_SECONDS.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import psycopg
+from loguru import logger
+from starlette.requests import Request
+
+from app.config import get_settings
+from app.database import get_read_connection
+from app.metrics import RESPONSE_CACHE
+from app.singleflight import coalesce
+from app.stream import broadcaster
+
+
+Consulta = Callable[[psycopg.Connection], Any]
+
+# Fuentes (canal de notificaciones de los collectors) de las que depende
+# cada ruta cacheada
+DEPENDENCIAS = {
+    "comparar": {"cetes", "inflacion", "sofipos", "fondos", "tipo_cambio"},
+    "fondos_top": {"fondos", "tipo_cambio"},
+    "sofipos_top": {"sofipos"},
+    "status_fuentes": set(),  # Sólo TTL: las ejecuciones no se notifican
+}
+
+
+def ttl_ruta(ruta: str) -> float:
+    """Segundos que una respuesta de la ruta se sirve sin recalcular."""
+    settings = get_settings()
+    return {
+        "comparar": settings.CACHE_TTL_COMPARAR,
+        "fondos_top": settings.CACHE_TTL_FONDOS_TOP,
+        "sofipos_top": settings.CACHE_TTL_SOFIPOS_TOP,
+        "status_fuentes": settings.CACHE_TTL_STATUS,
+    }[ruta]
+
+
+@dataclass
+class _Entrada:
+    """Respuesta cacheada y la consulta que la produce."""
+    valor: Any
+    consulta: Consulta
+    creada: float
+    vencida: bool = False  # Hay datos nuevos de una fuente de la que depende
+
+
+class CacheRespuestas:
+    """LRU de respuestas por (ruta, parámetros) con recálculo en segundo plano."""
+
+    def __init__(self, max_entradas: int, workers: int):
+        self.max_entradas = max_entradas
+        self._entradas: OrderedDict[tuple, _Entrada] = OrderedDict()
+        self._lock = threading.Lock()
+        self._en_recalculo: set[tuple] = set()
+        # Aumenta con cada notificación: un cálculo iniciado antes de datos
+        # nuevos se guarda ya vencido
+        self._generacion = 0
+        self._fuentes_pendientes: set[str] = set()
+        self._timer: threading.Timer | None = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cache")
+
+    def obtener(self, clave: tuple, request: Request, consulta: Consulta) -> Any:
+        """Respuesta de la clave: fresca, obsoleta (y se recalcula) o consultada ahora."""
+        ruta = clave[0]
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+
+        if entrada is not None:
+            edad = time.monotonic() - entrada.creada
+            ttl = ttl_ruta(ruta)
+            if edad < ttl and not entrada.vencida:
+                RESPONSE_CACHE.labels(ruta, "hit").inc()
+                return entrada.valor
+            if edad < ttl + get_settings().CACHE_STALE_SECONDS:
+                RESPONSE_CACHE.labels(ruta, "stale").inc()
+                self.recalcular(clave, consulta)
+                return entrada.valor
+
+        RESPONSE_CACHE.labels(ruta, "miss").inc()
+        generacion = self._generacion
+        valor = coalesce(clave, request, consulta)
+        self._guardar(clave, valor, consulta, generacion)
+        return valor
+
+    def _guardar(self, clave: tuple, valor: Any, consulta: Consulta, generacion: int) -> None:
+        with self._lock:
+            vencida = generacion != self._generacion
+            self._entradas[clave] = _Entrada(valor, consulta, time.monotonic(), vencida)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def recalcular(self, clave: tuple, consulta: Consulta) -> None:
+        """Recalcula la clave en segundo plano (si no se está recalculando ya)."""
+        with self._lock:
+            if clave in self._en_recalculo:
+                return
+            self._en_recalculo.add(clave)
+        self._executor.submit(self._recalcular, clave, consulta)
+
+    def _recalcular(self, clave: tuple, consulta: Consulta) -> None:
+        generacion = self._generacion
+        try:
+            with get_read_connection() as db:
+                valor = consulta(db)
+            self._guardar(clave, valor, consulta, generacion)
+        except Exception as e:
+            # Se sigue sirviendo el valor anterior hasta el siguiente intento
+            logger.error(f"Caché: error recalculando {clave}: {e}")
+        finally:
+            with self._lock:
+                self._en_recalculo.discard(clave)
+
+    def datos_nuevos(self, fuente: str) -> None:
+        """
+        Una fuente confirmó datos nuevos: vence sus entradas y programa su
+        recálculo (agrupando las notificaciones de CACHE_WARM_DELAY_SECONDS).
+        """
+        rutas = {ruta for ruta, fuentes in DEPENDENCIAS.items() if fuente in fuentes}
+        if not rutas:
+            return
+        with self._lock:
+            self._generacion += 1
+            for clave, entrada in self._entradas.items():
+                if clave[0] in rutas:
+                    entrada.vencida = True
+            self._fuentes_pendientes.add(fuente)
+            if self._timer is None:
+                self._timer = threading.Timer(get_settings().CACHE_WARM_DELAY_SECONDS, self._calentar_vencidas)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _calentar_vencidas(self) -> None:
+        """Recalcula todas las entradas vencidas por datos nuevos."""
+        with self._lock:
+            self._timer = None
+            fuentes, self._fuentes_pendientes = self._fuentes_pendientes, set()
+            vencidas = [(clave, e.consulta) for clave, e in self._entradas.items() if e.vencida]
+        logger.info(f"Caché: datos nuevos de {sorted(fuentes)}; recalculando {len(vencidas)} respuestas")
+        for clave, consulta in vencidas:
+            self.recalcular(clave, consulta)
+
+    def calentar(self, variantes: dict[tuple, Consulta]) -> None:
+        """Calcula en segundo plano las variantes que todavía no están en caché."""
+        for clave, consulta in variantes.items():
+            if clave not in self._entradas:
+                self.recalcular(clave, consulta)
+
+    def cerrar(self) -> None:
+        """Cancela el recálculo programado y espera los que están en curso."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_cache: CacheRespuestas | None = None
+
+
+def cached(clave: tuple, request: Request, consulta: Consulta) -> Any:
+    """
+    Consulta de router a través de la caché de respuestas.
+
+    Args:
+        clave: (ruta, parámetros...), con la ruta en DEPENDENCIAS
+        request: Petición actual (para métricas y perfilado)
+        consulta: Función que recibe la conexión y regresa el resultado
+
+    Returns:
+        Resultado compartido entre peticiones: no debe modificarse
+    """
+    if _cache is None:
+        return coalesce(clave, request, consulta)
+    return _cache.obtener(clave, request, consulta)
+
+
+def variantes_iniciales() -> dict[tuple, Consulta]:
+    """Claves y consultas por defecto de cada ruta cacheada (sin as_of)."""
+    from app.routers.comparar import construir_comparacion
+    from app.routers.fondos import consultar_top_fondos
+    from app.routers.sofipos import consultar_top_sofipos
+    from app.schemas.fondos import Moneda
+    from app.snapshot import TOP_SNAPSHOT
+
+    variantes: dict[tuple, Consulta] = {
+        ("sofipos_top", None): lambda db: consultar_top_sofipos(db, TOP_SNAPSHOT),
+    }
+    for moneda in Moneda:
+        variantes[("comparar", None, moneda)] = lambda db, m=moneda: construir_comparacion(db, None, m)
+        variantes[("fondos_top", None, moneda)] = lambda db, m=moneda: consultar_top_fondos(db, TOP_SNAPSHOT, None, m)
+    return variantes
+
+
+def start_cache() -> None:
+    """Crea la caché, la calienta y la suscribe a los commits de los collectors."""
+    global _cache
+    settings = get_settings()
+    if not settings.ENABLE_RESPONSE_CACHE or _cache is not None:
+        return
+    _cache = CacheRespuestas(settings.CACHE_MAX_ENTRIES, settings.CACHE_REFRESH_WORKERS)
+    _cache.calentar(variantes_iniciales())
+    broadcaster.escuchar(_cache.datos_nuevos)
+
+
+def stop_cache() -> None:
+    """Detiene los recálculos y descarta la caché."""
+    global _cache
+    if _cache is not None:
+        broadcaster.dejar_de_escuchar(_cache.datos_nuevos)
+        _cache.cerrar()
+        _cache = None
@@ -0,0 +1,371 @@
+"""
+Detección de valores anómalos antes de guardarlos.
+
+Cada lote del pipeline se compara contra una ventana de los valores más
+recientes de cada serie (plazo de CETES, ticker o SOFIPO). La ventana de
+todas las series del lote se obtiene con una sola consulta (un LATERAL
+con LIMIT por serie sobre el índice (serie, fecha)) y las pruebas se
+hacen en una sola pasada de NumPy sobre el lote completo:
+
+- z-score: |valor - media| / desviación de la ventana, para registros
+  posteriores al último guardado y series con al menos MIN_OBSERVACIONES.
+- salto: cambio relativo contra el valor anterior válido de la serie (el
+  del lote, o el último guardado para el primer registro de cada serie).
+
+Los registros sospechosos se guardan en la tabla cuarentena en la misma
+transacción del lote y no llegan a la tabla destino.
+
+Un cambio de nivel real (ej. una SOFIPO que baja su GAT y la mantiene)
+falla las mismas pruebas todos los días, porque la ventana sólo tiene
+valores guardados. Por eso la consulta de la ventana trae también los
+valores en cuarentena posteriores al último guardado: cuando
+ANOMALY_CONFIRMACIONES sospechosos consecutivos coinciden entre sí (a
+TOLERANCIA_NIVEL de su media), el nivel se da por confirmado, se aceptan
+y se liberan los que estaban en cuarentena. Un valor normal entre ellos
+rompe la racha (era un pico). Los registros en cuarentena también se
+liberan a mano (app.collectors.cuarentena, POST /api/admin/cuarentena/liberar).
+"""
+
+import json
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+import psycopg
+from loguru import logger
+from psycopg import sql
+
+from app.config import get_settings
+
+
+# Observaciones mínimas de la ventana para calcular z-score
+MIN_OBSERVACIONES = 5
+
+# Piso de la desviación, relativo a la media: evita z-scores enormes en
+# series que casi no cambian (ej. GAT de SOFIPOs)
+PISO_DESVIACION = 0.02
+
+# Rango máximo, relativo a su media, de los sospechosos consecutivos que
+# confirman un nivel nuevo
+TOLERANCIA_NIVEL = 0.05
+
+
+@dataclass
+class Ventana:
+    """Historia reciente de una serie."""
+    valores: list[float]  # Valores guardados, del más antiguo al más reciente
+    ultima: date  # Fecha del último valor guardado
+    # (id, fecha, valor) en cuarentena sin liberar posteriores a `ultima`, por fecha
+    cuarentena: list[tuple[int, date, float]] = field(default_factory=list)
+
+
+class FiltroAnomalias:
+    """
+    Separa los registros sospechosos de un lote.
+
+    Args:
+        tabla: Tabla destino
+        serie: Columna que identifica la serie
+        valor: Columna numérica que se revisa
+        fecha: Columna de fecha
+        umbral_salto: Cambio relativo máximo contra el valor anterior
+        ventana: Valores recientes por serie (default ANOMALY_WINDOW)
+        umbral_z: z-score máximo (default ANOMALY_ZSCORE)
+        confirmaciones: Sospechosos consecutivos que confirman un nivel
+            nuevo (default ANOMALY_CONFIRMACIONES; 0 = nunca)
+    """
+
+    def __init__(
+        self,
+        tabla: str,
+        serie: str,
+        valor: str,
+        fecha: str,
+        umbral_salto: float,
+        ventana: int | None = None,
+        umbral_z: float | None = None,
+        confirmaciones: int | None = None,
+    ):
+        settings = get_settings()
+        self.tabla = tabla
+        self.serie = serie
+        self.valor = valor
+        self.fecha = fecha
+        self.umbral_salto = umbral_salto
+        self.ventana = ventana or settings.ANOMALY_WINDOW
+        self.umbral_z = umbral_z or settings.ANOMALY_ZSCORE
+        self.confirmaciones = settings.ANOMALY_CONFIRMACIONES if confirmaciones is None else confirmaciones
+
+        # Una fila por fecha en cuarentena (la misma fecha se vuelve a
+        # revisar en cada ejecución que la pide)
+        self._consulta_ventana = sql.SQL("""
+            SELECT s.serie, w.valores, w.ultima, q.ids, q.fechas, q.valores AS valores_cuarentena
+            FROM unnest(%(series)s::{tipo}[]) AS s(serie)
+            CROSS JOIN LATERAL (
+                SELECT array_agg(u.valor ORDER BY u.fecha) AS valores, max(u.fecha) AS ultima
+                FROM (
+                    SELECT {valor}::float8 AS valor, {fecha} AS fecha
+                    FROM {tabla}
+                    WHERE {serie} = s.serie AND {valor} IS NOT NULL
+                    ORDER BY {fecha} DESC
+                    LIMIT %(ventana)s
+                ) u
+            ) w
+            CROSS JOIN LATERAL (
+                SELECT array_agg(c.id ORDER BY c.fecha) AS ids,
+                       array_agg(c.fecha ORDER BY c.fecha) AS fechas,
+                       array_agg(c.valor ORDER BY c.fecha) AS valores
+                FROM (
+                    SELECT DISTINCT ON (fecha) id, fecha, valor::float8 AS valor
+                    FROM cuarentena
+                    WHERE tabla = %(nombre_tabla)s AND serie = s.serie::text
+                      AND liberado_at IS NULL AND valor IS NOT NULL AND fecha > w.ultima
+                    ORDER BY fecha DESC, id DESC
+                    LIMIT %(confirmaciones)s
+                ) c
+            ) q
+            WHERE w.valores IS NOT NULL
+        """)
+        self._identificadores = dict(
+            valor=sql.Identifier(valor),
+            fecha=sql.Identifier(fecha),
+            tabla=sql.Identifier(tabla),
+            serie=sql.Identifier(serie),
+        )
+
+    def _ventanas(self, conn: psycopg.Connection, series: list) -> dict[object, Ventana]:
+        """Valores recientes, última fecha y valores en cuarentena de cada serie (una consulta)."""
+        # El arreglo lleva el tipo de la columna para que el LATERAL use su índice
+        tipo = sql.SQL("text" if isinstance(series[0], str) else "int")
+        consulta = self._consulta_ventana.format(tipo=tipo, **self._identificadores)
+        with conn.cursor() as cur:
+            cur.execute(consulta, {
+                "series": series,
+                "ventana": self.ventana,
+                "nombre_tabla": self.tabla,
+                "confirmaciones": max(self.confirmaciones, 1),
+            })
+            return {
+                row["serie"]: Ventana(
+                    row["valores"],
+                    row["ultima"],
+                    list(zip(row["ids"] or [], row["fechas"] or [], row["valores_cuarentena"] or [])),
+                )
+                for row in cur.fetchall()
+            }
+
+    def separar(self, conn: psycopg.Connection, registros: list[dict]) -> tuple[list[dict], list[tuple[dict, str]]]:
+        """
+        Revisa un lote completo.
+
+        Los registros en cuarentena que confirman un nivel nuevo junto con
+        el lote se liberan (en la transacción actual, sin commit) y se
+        regresan entre los aceptados.
+
+        Returns:
+            (registros aceptados, [(registro sospechoso, motivo)])
+        """
+        if not registros:
+            return [], []
+
+        series = list(dict.fromkeys(r[self.serie] for r in registros))
+        aceptados, sospechosos, liberar = self.clasificar(registros, self._ventanas(conn, series))
+        if liberar:
+            aceptados += self.recuperar(conn, liberar, "nivel confirmado")
+        return aceptados, sospechosos
+
+    def clasificar(
+        self, registros: list[dict], ventanas: dict[object, Ventana]
+    ) -> tuple[list[dict], list[tuple[dict, str]], list[int]]:
+        """
+        Pruebas del lote contra las ventanas de sus series (sin base de datos).
+
+        Returns:
+            (registros aceptados, [(registro sospechoso, motivo)],
+             ids en cuarentena que confirman un nivel nuevo)
+        """
+        if not registros:
+            return [], [], []
+
+        claves = [r[self.serie] for r in registros]
+        series = list(dict.fromkeys(claves))
+
+        # Estadísticas de la ventana por serie
+        n_series = len(series)
+        media = np.full(n_series, np.nan)
+        desviacion = np.full(n_series, np.nan)
+        ultimo = np.full(n_series, np.nan)
+        ultima_fecha = np.full(n_series, np.datetime64("NaT"), dtype="datetime64[D]")
+        observaciones = np.zeros(n_series, dtype=np.int64)
+        for i, s in enumerate(series):
+            if s in ventanas:
+                arr = np.asarray(ventanas[s].valores, dtype=np.float64)
+                media[i] = arr.mean()
+                desviacion[i] = arr.std(ddof=1) if len(arr) > 1 else 0.0
+                ultimo[i] = arr[-1]
+                ultima_fecha[i] = ventanas[s].ultima
+                observaciones[i] = len(arr)
+
+        # Lote como arreglos
+        codigo = {s: i for i, s in enumerate(series)}
+        idx = np.fromiter((codigo[c] for c in claves), dtype=np.int64, count=len(claves))
+        valor = np.array(
+            [np.nan if r.get(self.valor) is None else float(r[self.valor]) for r in registros]
+        )
+        fecha = np.array([r[self.fecha] for r in registros], dtype="datetime64[D]")
+
+        # z-score contra la ventana (sólo registros nuevos de series con historia)
+        piso = PISO_DESVIACION * np.abs(media[idx])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = np.abs(valor - media[idx]) / np.fmax(desviacion[idx], piso)
+        aplica_z = (observaciones[idx] >= MIN_OBSERVACIONES) & (fecha >= ultima_fecha[idx])
+        sospechoso_z = aplica_z & (z > self.umbral_z)
+
+        # Salto contra el valor anterior de la serie, en orden de fecha.
+        # Los registros que ya fallaron el z-score no cuentan como anteriores.
+        orden = np.lexsort((fecha, idx))
+        serie_ord = idx[orden]
+        valor_ord = np.where(sospechoso_z[orden], np.nan, valor[orden])
+        inicio = np.ones(len(registros), dtype=bool)
+        inicio[1:] = serie_ord[1:] != serie_ord[:-1]
+
+        # Al inicio de cada serie va el último valor guardado, si el registro
+        # es posterior a él
+        semilla = np.where(fecha[orden] >= ultima_fecha[serie_ord], ultimo[serie_ord], np.nan)
+        previo = np.where(inicio, semilla, np.concatenate(([np.nan], valor_ord[:-1])))
+
+        # Último valor válido anterior, sin cruzar de una serie a otra
+        posicion = np.where(np.isnan(previo) & ~inicio, 0, np.arange(len(previo)))
+        previo = previo[np.maximum.accumulate(posicion)]
+
+        anterior = np.empty(len(registros))
+        anterior[orden] = previo
+        with np.errstate(invalid="ignore", divide="ignore"):
+            salto = np.abs(valor - anterior) / np.abs(anterior)
+        sospechoso_salto = salto > self.umbral_salto
+
+        confirmado, liberar = self._confirmar_niveles(
+            series, ventanas, idx, valor, fecha, ultima_fecha, sospechoso_z | sospechoso_salto
+        )
+
+        aceptados = []
+        sospechosos = []
+        for i, registro in enumerate(registros):
+            if confirmado[i]:
+                aceptados.append(registro)
+            elif sospechoso_z[i]:
+                sospechosos.append((registro, f"z-score {z[i]:.1f} (media {media[idx[i]]:.4g})"))
+            elif sospechoso_salto[i]:
+                sospechosos.append((registro, f"salto {salto[i]:.0%} (anterior {anterior[i]:.4g})"))
+            else:
+                aceptados.append(registro)
+
+        if confirmado.any() or liberar:
+            logger.info(
+                f"{self.tabla}: nivel nuevo confirmado en {self.serie}="
+                f"{sorted({str(claves[i]) for i in np.flatnonzero(confirmado)})}: "
+                f"{int(confirmado.sum())} registros del lote y {len(liberar)} en cuarentena aceptados"
+            )
+        return aceptados, sospechosos, liberar
+
+    def _confirmar_niveles(
+        self,
+        series: list,
+        ventanas: dict[object, Ventana],
+        idx: np.ndarray,
+        valor: np.ndarray,
+        fecha: np.ndarray,
+        ultima_fecha: np.ndarray,
+        sospechoso: np.ndarray,
+    ) -> tuple[np.ndarray, list[int]]:
+        """
+        Busca rachas de `confirmaciones` sospechosos consecutivos (en
+        cuarentena y en el lote, por fecha) que coinciden entre sí.
+
+        Returns:
+            (registros del lote confirmados, ids en cuarentena confirmados)
+        """
+        confirmado = np.zeros(len(idx), dtype=bool)
+        liberar: list[int] = []
+        if self.confirmaciones < 2 or not sospechoso.any():
+            return confirmado, liberar
+
+        nuevos = (fecha >= ultima_fecha[idx]) | np.isnat(ultima_fecha[idx])
+        for s in np.unique(idx[sospechoso]):
+            # Observaciones posteriores a lo guardado, una por fecha; el
+            # lote reemplaza a la cuarentena en la misma fecha
+            eventos = {}
+            ventana = ventanas.get(series[s])
+            for id_cuarentena, f, v in ventana.cuarentena if ventana else []:
+                eventos[np.datetime64(f, "D")] = (v, True, ("cuarentena", id_cuarentena))
+            for i in np.flatnonzero((idx == s) & nuevos & ~np.isnan(valor)):
+                eventos[fecha[i]] = (valor[i], bool(sospechoso[i]), ("lote", int(i)))
+
+            racha = []
+            for f in sorted(eventos):
+                v, es_sospechoso, origen = eventos[f]
+                if not es_sospechoso:
+                    racha = []
+                    continue
+                racha.append((v, origen))
+                ultimos = racha[-self.confirmaciones:]
+                valores = np.array([x for x, _ in ultimos])
+                if len(ultimos) == self.confirmaciones and np.ptp(valores) <= TOLERANCIA_NIVEL * abs(valores.mean()):
+                    for _, (tipo, ref) in ultimos:
+                        if tipo == "lote":
+                            confirmado[ref] = True
+                        elif ref not in liberar:
+                            liberar.append(ref)
+
+        return confirmado, liberar
+
+    def recuperar(self, conn: psycopg.Connection, ids: list[int], motivo: str) -> list[dict]:
+        """
+        Saca registros de la cuarentena (sin commit) y los regresa con los
+        tipos de la tabla destino, listos para el loader. Las copias de la
+        misma serie y fecha también se marcan como liberadas.
+        """
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("""
+                SELECT c.registro AS _registro, r.*
+                FROM cuarentena c
+                CROSS JOIN LATERAL jsonb_populate_record(NULL::{tabla}, c.registro) r
+                WHERE c.id = ANY(%s) AND c.tabla = %s AND c.liberado_at IS NULL
+                ORDER BY c.fecha
+                FOR UPDATE OF c
+            """).format(tabla=self._identificadores["tabla"]), (ids, self.tabla))
+            filas = cur.fetchall()
+            cur.execute("""
+                UPDATE cuarentena c SET liberado_at = NOW(), liberado_por = %s
+                FROM cuarentena o
+                WHERE o.id = ANY(%s) AND c.tabla = o.tabla AND c.serie = o.serie
+                  AND c.fecha = o.fecha AND c.liberado_at IS NULL
+            """, (motivo, ids))
+
+        # Los valores con el tipo de su columna (fechas, numeric); el resto
+        # del registro (ej. plazos de una SOFIPO) tal como se guardó
+        return [
+            {**fila["_registro"], **{k: fila[k] for k in fila["_registro"] if k in fila}}
+            for fila in filas
+        ]
+
+    def poner_en_cuarentena(self, conn: psycopg.Connection, fuente: str, sospechosos: list[tuple[dict, str]]) -> None:
+        """Guarda los registros sospechosos en la tabla cuarentena (sin commit)."""
+        with conn.cursor() as cur:
+            with cur.copy(
+                "COPY cuarentena (fuente, tabla, serie, fecha, valor, motivo, registro) FROM STDIN"
+            ) as copy:
+                for registro, motivo in sospechosos:
+                    copy.write_row([
+                        fuente,
+                        self.tabla,
+                        str(registro[self.serie]),
+                        registro[self.fecha],
+                        registro.get(self.valor),
+                        motivo,
+                        json.dumps(registro, default=str),
+                    ])
+
+        logger.warning(f"{fuente}: {len(sospechosos)} registros en cuarentena")
+        for registro, motivo in sospechosos[:10]:
+            logger.warning(f"  {self.serie}={registro[self.serie]} {registro[self.fecha]}: {motivo}")
@@ -6,16 +6,32 @@ Series de CETES:
 - SF43939: CETES 91 días
 - SF43942: CETES 182 días
 - SF43945: CETES 364 días
+
+Tipo de cambio:
+- SF43718: FIX USD/MXN (diario)
+
+Inflación:
+- SP1: INPC (mensual)
+- SP68257: UDI (diaria)
 """
 
-from datetime import datetime, timedelta
+import asyncio
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+from typing import Iterator
 
+import psycopg
 import requests
 from loguru import logger
 
+from app.collectors.anomalias import FiltroAnomalias
+from app.collectors.cliente_http import get_http_client
+from app.collectors.divisas import MONEDA_USD, actualizar_fondos_mxn
+from app.collectors.ejecuciones import ejecucion, ejecucion_async, registrar_respuesta
+from app.collectors.inflacion import INPC, UDI, actualizar_cetes_reales, calcular_tasas_reales
+from app.collectors.pipeline import BulkLoader, Pipeline
 from app.config import settings
-from app.database import get_connection
+from app.metrics import track_external_call
 
 
 # Series de CETES en Banxico SIE
@@ -26,22 +42,136 @@ CETES_SERIES = {
     364: "SF43945",
 }
 
-BASE_URL = "https://www.banxico.org.mx/SieAPIRest/service/v1/series"
+class CetesLoader(BulkLoader):
+    """Carga subastas con su inflación y tasa real calculadas para todo el lote."""
+
+    def load(self, conn: psycopg.Connection, registros: list[dict]) -> tuple[int, list[dict]]:
+        calcular_tasas_reales(conn, registros)
+        return super().load(conn, registros)
+
+
+CETES_LOADER = CetesLoader(
+    "cetes",
+    ["plazo", "tasa", "fecha_subasta", "inflacion", "tasa_real"],
+    on_conflict="ON CONFLICT (plazo, fecha_subasta) DO NOTHING",
+    returning="plazo, tasa, tasa_real, fecha_subasta AS fecha",
+)
+
+# Anomalías: z-score contra la ventana o salto de más de 25% contra la subasta anterior
+CETES_FILTRO = FiltroAnomalias("cetes", "plazo", "tasa", "fecha_subasta", umbral_salto=0.25)
+
+# Tipo de cambio FIX (pesos por dólar)
+SERIE_FIX = "SF43718"
+
+
+class TipoCambioLoader(BulkLoader):
+    """
+    Carga el FIX y, en la misma transacción, recalcula las columnas en
+    pesos de los fondos desde la primera fecha nueva.
+    """
+
+    def load(self, conn: psycopg.Connection, registros: list[dict]) -> tuple[int, list[dict]]:
+        afectados, filas = super().load(conn, registros)
+        if filas:
+            actualizados = actualizar_fondos_mxn(conn, min(f["fecha"] for f in filas))
+            logger.info(f"Tipo de cambio: {actualizados} registros de fondos recalculados en pesos")
+        return afectados, filas
+
+
+TIPO_CAMBIO_LOADER = TipoCambioLoader(
+    "tipo_cambio",
+    ["moneda", "fecha", "tipo_cambio"],
+    on_conflict="""
+        ON CONFLICT (moneda, fecha) DO UPDATE SET tipo_cambio = EXCLUDED.tipo_cambio
+        WHERE tipo_cambio.tipo_cambio IS DISTINCT FROM EXCLUDED.tipo_cambio
+    """,
+    returning="moneda, tipo_cambio, fecha",
+)
+
+# El peso tiene episodios de alta volatilidad: z-score más holgado y salto
+# de más de 10% en un día
+TIPO_CAMBIO_FILTRO = FiltroAnomalias(
+    "tipo_cambio", "moneda", "tipo_cambio", "fecha", umbral_salto=0.1, umbral_z=8.0
+)
+
+
+# Índices de inflación en Banxico SIE
+INFLACION_SERIES = {
+    INPC: "SP1",
+    UDI: "SP68257",
+}
+
+
+class IndicesLoader(BulkLoader):
+    """
+    Carga INPC/UDI y, en la misma transacción, recalcula la tasa real de
+    las subastas desde la primera fecha nueva.
+    """
+
+    def load(self, conn: psycopg.Connection, registros: list[dict]) -> tuple[int, list[dict]]:
+        afectados, filas = super().load(conn, registros)
+        if filas:
+            actualizados = actualizar_cetes_reales(conn, min(f["fecha"] for f in filas))
+            logger.info(f"Inflación: {actualizados} subastas de CETES recalculadas")
+        return afectados, filas
+
+
+INDICES_LOADER = IndicesLoader(
+    "indices_inflacion",
+    ["indice", "fecha", "valor"],
+    on_conflict="""
+        ON CONFLICT (indice, fecha) DO UPDATE SET valor = EXCLUDED.valor
+        WHERE indices_inflacion.valor IS DISTINCT FROM EXCLUDED.valor
+    """,
+    returning="indice, valor, fecha",
+)
+
+# Los índices sólo crecen poco a poco: salto de más de 5% contra el anterior
+INDICES_FILTRO = FiltroAnomalias("indices_inflacion", "indice", "valor", "fecha", umbral_salto=0.05)
+
+
+def parse_fecha_dato(fecha: str, dato: str) -> tuple[date, Decimal] | None:
+    """
+    Convierte una observación de Banxico SIE (fecha dd/mm/yyyy y dato).
+
+    Returns:
+        (fecha, valor) o None si no hay dato (N/E)
+    """
+    if not fecha or not dato or dato == "N/E":
+        return None
+    return datetime.strptime(fecha, "%d/%m/%Y").date(), Decimal(dato.replace(",", ""))
 
 
 class BanxicoCollector:
     """Recopilador de datos de CETES desde Banxico."""
 
-    def __init__(self, api_key: str | None = None):
+    def __init__(self, api_key: str | None = None, base_url: str | None = None):
         self.api_key = api_key or settings.BANXICO_API_KEY
         if not self.api_key:
             raise ValueError("BANXICO_API_KEY no configurada")
 
+        self.base_url = base_url or settings.BANXICO_BASE_URL
+
         self.headers = {
             "Bmx-Token": self.api_key,
             "Accept": "application/json",
         }
 
+    def _url_serie(self, serie_id: str, dias: int) -> str:
+        """URL de los datos de una serie de los últimos `dias` días."""
+        fecha_fin = datetime.now()
+        fecha_inicio = fecha_fin - timedelta(days=dias)
+        return f"{self.base_url}/{serie_id}/datos/{fecha_inicio:%Y-%m-%d}/{fecha_fin:%Y-%m-%d}"
+
+    def _datos_serie(self, serie_id: str, data: dict) -> list[dict]:
+        """Extrae las observaciones de la respuesta de Banxico SIE."""
+        series = data.get("bmx", {}).get("series", [])
+        if not series:
+            logger.warning(f"No hay datos para serie {serie_id}")
+            return []
+
+        return series[0].get("datos", [])
+
     def fetch_serie(self, serie_id: str, dias: int = 30) -> list[dict]:
         """
         Obtiene datos de una serie de Banxico.
@@ -53,103 +183,165 @@ class BanxicoCollector:
         Returns:
             Lista de registros con fecha y valor
         """
-        fecha_fin = datetime.now()
-        fecha_inicio = fecha_fin - timedelta(days=dias)
+        url = self._url_serie(serie_id, dias)
+        logger.debug(f"Consultando Banxico: {url}")
 
-        url = f"{BASE_URL}/{serie_id}/datos/{fecha_inicio:%Y-%m-%d}/{fecha_fin:%Y-%m-%d}"
+        with track_external_call("banxico"):
+            response = requests.get(url, headers=self.headers, timeout=30)
+        registrar_respuesta("banxico", response.content)
+        response.raise_for_status()
+
+        return self._datos_serie(serie_id, response.json())
 
+    async def fetch_serie_async(self, serie_id: str, dias: int = 30) -> list[dict]:
+        """Como fetch_serie, con el cliente async compartido."""
+        url = self._url_serie(serie_id, dias)
         logger.debug(f"Consultando Banxico: {url}")
 
-        response = requests.get(url, headers=self.headers, timeout=30)
+        with track_external_call("banxico"):
+            response = await get_http_client().get(url, headers=self.headers)
+        registrar_respuesta("banxico", response.content)
         response.raise_for_status()
 
-        data = response.json()
-
-        # Extraer datos de la respuesta
-        series = data.get("bmx", {}).get("series", [])
-        if not series:
-            logger.warning(f"No hay datos para serie {serie_id}")
-            return []
+        return self._datos_serie(serie_id, response.json())
 
-        datos = series[0].get("datos", [])
-        return datos
+    def parse_serie(self, elemento: tuple[int, str], datos: list[dict]) -> Iterator[dict]:
+        """Convierte los datos de una serie en registros por plazo."""
+        plazo, _ = elemento
+        logger.info(f"CETES {plazo} días: {len(datos)} registros obtenidos")
+        for registro in datos:
+            yield {"plazo": plazo, "fecha": registro.get("fecha", ""), "dato": registro.get("dato", "")}
 
-    def fetch_all_cetes(self, dias: int = 30) -> dict[int, list[dict]]:
+    def validate_registro(self, registro: dict) -> dict | None:
         """
-        Obtiene datos de todas las series de CETES.
+        Convierte fecha (dd/mm/yyyy) y dato a tipos de la tabla cetes.
 
         Returns:
-            Diccionario {plazo: [datos]}
+            Registro para la tabla o None si no hay dato (N/E)
         """
-        resultados = {}
-
-        for plazo, serie_id in CETES_SERIES.items():
-            try:
-                datos = self.fetch_serie(serie_id, dias)
-                resultados[plazo] = datos
-                logger.info(f"CETES {plazo} días: {len(datos)} registros obtenidos")
-            except requests.RequestException as e:
-                logger.error(f"Error obteniendo CETES {plazo} días: {e}")
-                resultados[plazo] = []
+        observacion = parse_fecha_dato(registro["fecha"], registro["dato"])
+        if observacion is None:
+            return None
+
+        fecha, tasa = observacion
+        return {"plazo": registro["plazo"], "tasa": tasa, "fecha_subasta": fecha}
+
+    def parse_tipo_cambio(self, serie_id: str, datos: list[dict]) -> Iterator[dict]:
+        """Convierte los datos del FIX en registros de tipo_cambio."""
+        logger.info(f"FIX USD/MXN: {len(datos)} registros obtenidos")
+        for registro in datos:
+            yield {"fecha": registro.get("fecha", ""), "dato": registro.get("dato", "")}
+
+    def validate_tipo_cambio(self, registro: dict) -> dict | None:
+        """Convierte fecha y dato del FIX a tipos de la tabla tipo_cambio."""
+        observacion = parse_fecha_dato(registro["fecha"], registro["dato"])
+        if observacion is None:
+            return None
+
+        fecha, tipo_cambio = observacion
+        return {"moneda": MONEDA_USD, "fecha": fecha, "tipo_cambio": tipo_cambio}
+
+    def _pipeline_tipo_cambio(self, fetch) -> Pipeline:
+        """Pipeline del FIX con el fetch dado (síncrono o async)."""
+        return Pipeline(
+            "banxico_fix",
+            fetch=fetch,
+            parse=self.parse_tipo_cambio,
+            validate=self.validate_tipo_cambio,
+            loader=TIPO_CAMBIO_LOADER,
+            filtro=TIPO_CAMBIO_FILTRO,
+            notifica="tipo_cambio",
+        )
+
+    def collect_tipo_cambio(self, dias: int = 30) -> int:
+        """
+        Recopila y guarda el FIX USD/MXN.
 
-        return resultados
+        Args:
+            dias: Días hacia atrás para consultar
 
-    def save_to_db(self, plazo: int, datos: list[dict]) -> int:
+        Returns:
+            Registros insertados o actualizados
+        """
+        pipeline = self._pipeline_tipo_cambio(lambda serie_id: self.fetch_serie(serie_id, dias))
+        return pipeline.run([SERIE_FIX])
+
+    async def collect_tipo_cambio_async(self, dias: int = 30) -> int:
+        """Como collect_tipo_cambio, dentro del event loop."""
+        pipeline = self._pipeline_tipo_cambio(lambda serie_id: self.fetch_serie_async(serie_id, dias))
+        return await pipeline.run_async([SERIE_FIX])
+
+    def parse_indice(self, elemento: tuple[str, str], datos: list[dict]) -> Iterator[dict]:
+        """Convierte los datos de INPC o UDI en registros de indices_inflacion."""
+        indice, _ = elemento
+        logger.info(f"{indice}: {len(datos)} registros obtenidos")
+        for registro in datos:
+            yield {"indice": indice, "fecha": registro.get("fecha", ""), "dato": registro.get("dato", "")}
+
+    def validate_indice(self, registro: dict) -> dict | None:
+        """Convierte fecha y dato de un índice a tipos de la tabla indices_inflacion."""
+        observacion = parse_fecha_dato(registro["fecha"], registro["dato"])
+        if observacion is None:
+            return None
+
+        fecha, valor = observacion
+        return {"indice": registro["indice"], "fecha": fecha, "valor": valor}
+
+    def _pipeline_inflacion(self, fetch) -> Pipeline:
+        """Pipeline de INPC/UDI con el fetch dado (síncrono o async)."""
+        return Pipeline(
+            "banxico_inflacion",
+            fetch=fetch,
+            parse=self.parse_indice,
+            validate=self.validate_indice,
+            loader=INDICES_LOADER,
+            filtro=INDICES_FILTRO,
+            notifica="inflacion",
+        )
+
+    def collect_inflacion(self, dias: int = 30) -> int:
         """
-        Guarda los datos de CETES en la base de datos.
+        Recopila y guarda el INPC y la UDI.
+
+        Se piden 400 días más que los de CETES: la inflación anual de una
+        subasta necesita el índice de un año antes (y el INPC se publica
+        con retraso).
 
         Args:
-            plazo: Plazo en días (28, 91, 182, 364)
-            datos: Lista de registros de Banxico
+            dias: Días hacia atrás de las subastas a cubrir
 
         Returns:
-            Número de registros insertados
+            Registros insertados o actualizados
         """
-        if not datos:
-            return 0
-
-        insertados = 0
-
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                for registro in datos:
-                    # Parsear fecha (formato: dd/mm/yyyy)
-                    fecha_str = registro.get("fecha", "")
-                    valor_str = registro.get("dato", "")
-
-                    if not fecha_str or valor_str == "N/E":
-                        continue
-
-                    try:
-                        fecha = datetime.strptime(fecha_str, "%d/%m/%Y").date()
-                        tasa = Decimal(valor_str)
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Error parseando registro: {registro} - {e}")
-                        continue
-
-                    # Insertar con ON CONFLICT para evitar duplicados
-                    try:
-                        cur.execute("""
-                            INSERT INTO cetes (plazo, tasa, fecha_subasta)
-                            VALUES (%s, %s, %s)
-                            ON CONFLICT (plazo, fecha_subasta) DO NOTHING
-                        """, (plazo, tasa, fecha))
-
-                        if cur.rowcount > 0:
-                            insertados += 1
-                    except Exception as e:
-                        logger.error(f"Error insertando CETES: {e}")
-                        conn.rollback()
-                        continue
-
-                conn.commit()
-
-        logger.info(f"CETES {plazo} días: {insertados} registros nuevos insertados")
-        return insertados
+        pipeline = self._pipeline_inflacion(lambda elemento: self.fetch_serie(elemento[1], dias + 400))
+        return pipeline.run(INFLACION_SERIES.items())
+
+    async def collect_inflacion_async(self, dias: int = 30) -> int:
+        """Como collect_inflacion, dentro del event loop."""
+        pipeline = self._pipeline_inflacion(
+            lambda elemento: self.fetch_serie_async(elemento[1], dias + 400)
+        )
+        return await pipeline.run_async(INFLACION_SERIES.items())
+
+    def _pipeline_cetes(self, fetch) -> Pipeline:
+        """Pipeline de CETES con el fetch dado (síncrono o async)."""
+        return Pipeline(
+            "banxico",
+            fetch=fetch,
+            parse=self.parse_serie,
+            validate=self.validate_registro,
+            loader=CETES_LOADER,
+            filtro=CETES_FILTRO,
+            notifica="cetes",
+        )
 
     def collect(self, dias: int = 30) -> int:
         """
-        Recopila y guarda todos los datos de CETES.
+        Recopila y guarda todos los datos de CETES, la inflación y el tipo de
+        cambio FIX.
+
+        La inflación se guarda primero para calcular la tasa real de las
+        subastas nuevas al insertarlas.
 
         Args:
             dias: Días hacia atrás para consultar
@@ -157,17 +349,46 @@ class BanxicoCollector:
         Returns:
             Total de registros insertados
         """
-        logger.info("Iniciando recopilación de CETES...")
+        with ejecucion("banxico"):
+            inflacion = self.collect_inflacion(dias)
+            logger.info(f"Recopilación de INPC/UDI completada: {inflacion} registros nuevos")
+
+            logger.info("Iniciando recopilación de CETES...")
+            pipeline = self._pipeline_cetes(lambda elemento: self.fetch_serie(elemento[1], dias))
+            total_insertados = pipeline.run(CETES_SERIES.items())
+            logger.info(f"Recopilación de CETES completada: {total_insertados} registros nuevos")
+
+            tipo_cambio = self.collect_tipo_cambio(dias)
+            logger.info(f"Recopilación del FIX completada: {tipo_cambio} registros nuevos")
+        return inflacion + total_insertados + tipo_cambio
+
+    async def _collect_cetes_async(self, dias: int) -> int:
+        """Inflación y después CETES (la tasa real necesita la inflación)."""
+        inflacion = await self.collect_inflacion_async(dias)
+        logger.info(f"Recopilación de INPC/UDI completada: {inflacion} registros nuevos")
+
+        pipeline = self._pipeline_cetes(lambda elemento: self.fetch_serie_async(elemento[1], dias))
+        total_insertados = await pipeline.run_async(CETES_SERIES.items())
+        logger.info(f"Recopilación de CETES completada: {total_insertados} registros nuevos")
+        return inflacion + total_insertados
 
-        todos_los_datos = self.fetch_all_cetes(dias)
-        total_insertados = 0
+    async def collect_async(self, dias: int = 30) -> int:
+        """
+        Como collect, dentro del event loop.
 
-        for plazo, datos in todos_los_datos.items():
-            insertados = self.save_to_db(plazo, datos)
-            total_insertados += insertados
+        El FIX no depende de las otras series: se recopila al mismo tiempo
+        que la inflación y los CETES.
 
-        logger.info(f"Recopilación de CETES completada: {total_insertados} registros nuevos")
-        return total_insertados
+        Returns:
+            Total de registros insertados
+        """
+        async with ejecucion_async("banxico"):
+            cetes, tipo_cambio = await asyncio.gather(
+                self._collect_cetes_async(dias),
+                self.collect_tipo_cambio_async(dias),
+            )
+        logger.info(f"Recopilación del FIX completada: {tipo_cambio} registros nuevos")
+        return cetes + tipo_cambio
 
 
 def run_collector():
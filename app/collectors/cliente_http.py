@@ -0,0 +1,43 @@
+"""
+Cliente HTTP asíncrono compartido por los collectors.
+
+Las versiones async de los collectors (collect_async, scrape_async) usan un
+solo httpx.AsyncClient por proceso: sus conexiones keep-alive se reutilizan
+entre fuentes y entre ejecuciones, y las esperas de red no ocupan hilos.
+
+El cliente se crea en el primer uso y lo cierra (close_http_client) el
+proceso que ejecuta los collectors al terminar: el worker de la cola
+(app.collectors.worker), refresh.main() o el benchmark de ingesta. La API
+no ejecuta collectors (sólo encola jobs), así que no lo crea.
+"""
+
+import httpx
+
+from app.config import get_settings
+
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Cliente compartido (se crea en el primer uso)."""
+    global _client
+    if _client is None or _client.is_closed:
+        settings = get_settings()
+        _client = httpx.AsyncClient(
+            timeout=settings.COLLECTOR_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.COLLECTOR_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.COLLECTOR_HTTP_MAX_CONNECTIONS,
+            ),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    """Cierra el cliente compartido y sus conexiones."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,175 @@
+"""
+Cola de recopilaciones en PostgreSQL (tabla collector_jobs).
+
+La API sólo encola (encolar_job); los procesos de app.collectors.worker
+toman los jobs con SELECT ... FOR UPDATE SKIP LOCKED, así que varios
+workers drenan la cola sin tomar dos veces el mismo job ni bloquearse
+entre sí.
+
+Estados: pendiente -> en_curso -> completado | error. Hay a lo más un
+job activo (pendiente o en curso) por fuente: lo garantiza el índice
+único parcial idx_collector_jobs_activo, no una consulta previa. Mientras
+corre, el worker actualiza latido_at cada JOB_HEARTBEAT_SECONDS
+(latir_job); un job en_curso sin latido en JOB_TIMEOUT_SECONDS (worker
+caído) se devuelve a pendiente (recuperar_vencidos), hasta
+JOB_MAX_INTENTOS intentos.
+
+Todas las funciones hacen commit de su propia transacción. El módulo no
+importa collectors ni el cliente HTTP: lo usan la API y el scheduler.
+"""
+
+import psycopg
+from psycopg.types.json import Jsonb
+
+from app.config import get_settings
+
+
+# Fuentes que se pueden recopilar (POST /api/admin/collect/{fuente})
+FUENTES = ("banxico", "etfs", "sofipos")
+
+ESTADO_COMPLETADO = "completado"
+ESTADO_ERROR = "error"
+
+COLUMNAS_JOB = """
+    id, fuente, parametros, estado, intentos, worker, insertados, error,
+    created_at, iniciado_at, latido_at, terminado_at,
+    EXTRACT(EPOCH FROM terminado_at - iniciado_at)::float8 AS duracion_segundos
+"""
+
+
+def parametros_fuente(fuente: str, dias: int = 30) -> dict:
+    """Parámetros del job de una fuente (sólo Banxico recibe días)."""
+    return {"dias": dias} if fuente == "banxico" else {}
+
+
+def encolar_job(conn: psycopg.Connection, fuente: str, parametros: dict) -> dict:
+    """
+    Encola una recopilación.
+
+    Si la fuente ya tiene un job pendiente o en curso, regresa ese en lugar
+    de encolar otro. Dos llamadas simultáneas chocan en el índice único
+    (ON CONFLICT DO NOTHING), así que sólo una inserta.
+    """
+    with conn.cursor() as cur:
+        while True:
+            cur.execute(f"""
+                INSERT INTO collector_jobs (fuente, parametros)
+                VALUES (%s, %s)
+                ON CONFLICT (fuente) WHERE estado IN ('pendiente', 'en_curso') DO NOTHING
+                RETURNING {COLUMNAS_JOB}
+            """, (fuente, Jsonb(parametros)))
+            job = cur.fetchone()
+            if job is None:
+                cur.execute(f"""
+                    SELECT {COLUMNAS_JOB} FROM collector_jobs
+                    WHERE fuente = %s AND estado IN ('pendiente', 'en_curso')
+                """, (fuente,))
+                job = cur.fetchone()
+            # None: el job activo terminó entre el INSERT y el SELECT; se reintenta
+            if job is not None:
+                break
+    conn.commit()
+    return job
+
+
+def obtener_job(conn: psycopg.Connection, job_id: int) -> dict | None:
+    """Estado, duración y registros de un job."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {COLUMNAS_JOB} FROM collector_jobs WHERE id = %s", (job_id,))
+        return cur.fetchone()
+
+
+def reclamar_job(conn: psycopg.Connection, worker: str) -> dict | None:
+    """
+    Toma el job pendiente más antiguo que no tenga otro worker.
+
+    Returns:
+        El job ya marcado en_curso, o None si la cola está vacía
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            UPDATE collector_jobs SET
+                estado = 'en_curso',
+                intentos = intentos + 1,
+                worker = %s,
+                iniciado_at = NOW(),
+                latido_at = NOW(),
+                terminado_at = NULL,
+                error = NULL
+            WHERE id = (
+                SELECT id FROM collector_jobs
+                WHERE estado = 'pendiente'
+                ORDER BY created_at
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {COLUMNAS_JOB}
+        """, (worker,))
+        job = cur.fetchone()
+    conn.commit()
+    return job
+
+
+def terminar_job(
+    conn: psycopg.Connection,
+    job_id: int,
+    worker: str,
+    insertados: int | None,
+    error: str | None = None,
+) -> bool:
+    """
+    Marca un job como completado (o error).
+
+    Returns:
+        False si el job ya no era de este worker (se recuperó por vencido)
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE collector_jobs SET
+                estado = %s, insertados = %s, error = %s, terminado_at = NOW()
+            WHERE id = %s AND worker = %s AND estado = 'en_curso'
+        """, (ESTADO_ERROR if error else ESTADO_COMPLETADO, insertados, error, job_id, worker))
+        actualizado = cur.rowcount == 1
+    conn.commit()
+    return actualizado
+
+
+def latir_job(conn: psycopg.Connection, job_id: int, worker: str) -> bool:
+    """
+    Heartbeat: confirma que el worker sigue ejecutando el job.
+
+    Returns:
+        False si el job ya no era de este worker (se recuperó por vencido)
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE collector_jobs SET latido_at = NOW()
+            WHERE id = %s AND worker = %s AND estado = 'en_curso'
+        """, (job_id, worker))
+        actualizado = cur.rowcount == 1
+    conn.commit()
+    return actualizado
+
+
+def recuperar_vencidos(conn: psycopg.Connection) -> int:
+    """
+    Devuelve a pendiente los jobs en_curso sin heartbeat en
+    JOB_TIMEOUT_SECONDS (worker caído); con JOB_MAX_INTENTOS agotados
+    quedan en error.
+
+    Returns:
+        Jobs recuperados
+    """
+    settings = get_settings()
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE collector_jobs SET
+                estado = CASE WHEN intentos >= %(max_intentos)s THEN 'error' ELSE 'pendiente' END,
+                error = 'Sin respuesta del worker ' || COALESCE(worker, ''),
+                terminado_at = CASE WHEN intentos >= %(max_intentos)s THEN NOW() END
+            WHERE estado = 'en_curso'
+              AND COALESCE(latido_at, iniciado_at) < NOW() - make_interval(secs => %(timeout)s)
+        """, {"max_intentos": settings.JOB_MAX_INTENTOS, "timeout": settings.JOB_TIMEOUT_SECONDS})
+        recuperados = cur.rowcount
+    conn.commit()
+    return recuperados
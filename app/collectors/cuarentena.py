@@ -0,0 +1,103 @@
+"""
+Revisión de la tabla cuarentena (registros detenidos por FiltroAnomalias).
+
+Un registro revisado que resulta correcto se libera: se carga a su tabla
+destino con el mismo loader que usa su collector (tasa real de CETES,
+columnas en pesos de los fondos, plazos de SOFIPOs) y se notifica como
+dato nuevo. Los niveles nuevos que se confirman solos no necesitan esto:
+los libera el propio filtro (ver app.collectors.anomalias).
+
+Uso:
+    POST /api/admin/cuarentena/liberar  [ids]
+"""
+
+from dataclasses import dataclass
+
+import psycopg
+
+from app.collectors.anomalias import FiltroAnomalias
+from app.collectors.pipeline import BulkLoader
+from app.database import notify_update
+
+
+@dataclass(frozen=True)
+class DestinoCuarentena:
+    """Cómo se carga un registro liberado de una tabla."""
+    loader: BulkLoader
+    filtro: FiltroAnomalias
+    notifica: str
+
+
+def destinos() -> dict[str, DestinoCuarentena]:
+    """Destino de cada tabla con filtro de anomalías."""
+    # Al usarse: los collectors importan el cliente HTTP
+    from app.collectors.banxico_collector import (
+        CETES_FILTRO,
+        CETES_LOADER,
+        INDICES_FILTRO,
+        INDICES_LOADER,
+        TIPO_CAMBIO_FILTRO,
+        TIPO_CAMBIO_LOADER,
+    )
+    from app.collectors.etf_collector import ETFS_FILTRO, ETFS_LOADER
+    from app.collectors.sofipo_scraper import SOFIPOS_FILTRO, SOFIPOS_LOADER
+
+    return {
+        "cetes": DestinoCuarentena(CETES_LOADER, CETES_FILTRO, "cetes"),
+        "tipo_cambio": DestinoCuarentena(TIPO_CAMBIO_LOADER, TIPO_CAMBIO_FILTRO, "tipo_cambio"),
+        "indices_inflacion": DestinoCuarentena(INDICES_LOADER, INDICES_FILTRO, "inflacion"),
+        "fondos_etfs": DestinoCuarentena(ETFS_LOADER, ETFS_FILTRO, "fondos"),
+        "sofipos": DestinoCuarentena(SOFIPOS_LOADER, SOFIPOS_FILTRO, "sofipos"),
+    }
+
+
+def listar_cuarentena(
+    conn: psycopg.Connection, fuente: str | None, pendientes: bool, limit: int
+) -> list[dict]:
+    """Registros en cuarentena, más recientes primero (sólo los sin liberar, si se indica)."""
+    query = """
+        SELECT id, fuente, tabla, serie, fecha, valor, motivo, registro, created_at, liberado_at, liberado_por
+        FROM cuarentena
+        WHERE (fuente = %(fuente)s OR %(fuente)s::text IS NULL)
+          AND (liberado_at IS NULL OR NOT %(pendientes)s)
+        ORDER BY created_at DESC, id DESC
+        LIMIT %(limit)s
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, {"fuente": fuente, "pendientes": pendientes, "limit": limit})
+        return cur.fetchall()
+
+
+def liberar_cuarentena(conn: psycopg.Connection, ids: list[int]) -> dict[str, int]:
+    """
+    Carga registros en cuarentena a su tabla destino (una transacción).
+
+    Los ids ya liberados o inexistentes se ignoran.
+
+    Returns:
+        {"liberados": registros sacados de la cuarentena, "insertados": filas cargadas}
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT DISTINCT tabla FROM cuarentena WHERE id = ANY(%s) AND liberado_at IS NULL", (ids,)
+        )
+        tablas = [fila["tabla"] for fila in cur.fetchall()]
+
+    por_tabla = destinos()
+    liberados = insertados = 0
+    try:
+        for tabla in tablas:
+            destino = por_tabla[tabla]
+            registros = destino.filtro.recuperar(conn, ids, "admin")
+            if not registros:
+                continue
+            afectados, filas = destino.loader.load(conn, registros)
+            if filas:
+                notify_update(conn, destino.notifica, filas)
+            liberados += len(registros)
+            insertados += afectados
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"liberados": liberados, "insertados": insertados}
@@ -0,0 +1,178 @@
+"""
+Conversión de precios y rendimientos de fondos/ETFs a pesos.
+
+Los ETFs cotizan en dólares; al guardarlos se calculan sus equivalentes en
+pesos con el tipo de cambio FIX (tabla tipo_cambio), para que la API los
+sirva sin convertir en cada petición. La alineación de fechas es un as-of
+join vectorizado (np.searchsorted): cada registro toma el último FIX
+publicado hasta su fecha.
+
+- precio_mxn = precio * FIX
+- rendimiento en pesos = (1 + r) * FIX / FIX de referencia - 1, donde la
+  referencia es el FIX anterior (cambio diario, rendimiento_ytd) o el de
+  hace un año (rendimiento_anual)
+
+Si el FIX de una fecha llega después que los precios, al guardarlo se
+recalculan los fondos desde esa fecha (actualizar_fondos_mxn).
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import psycopg
+
+from app.columnar import fetch_columns
+
+
+MONEDA_USD = "USD"
+
+# Días máximos entre la fecha de un registro y el FIX que se le aplica
+# (fines de semana y días festivos)
+MAX_DIAS_TIPO_CAMBIO = 5
+
+COLUMNAS_MXN = ("tipo_cambio", "precio_mxn", "rendimiento_anual_mxn", "rendimiento_ytd_mxn")
+
+
+def cargar_tipo_cambio(conn: psycopg.Connection, desde: date, hasta: date) -> tuple[np.ndarray, np.ndarray]:
+    """
+    FIX USD/MXN entre dos fechas.
+
+    Returns:
+        (fechas datetime64[D] ordenadas, tipo de cambio float64)
+    """
+    datos = fetch_columns(
+        conn,
+        """
+            SELECT fecha, tipo_cambio FROM tipo_cambio
+            WHERE moneda = %s AND fecha BETWEEN %s AND %s
+            ORDER BY fecha
+        """,
+        (MONEDA_USD, desde, hasta),
+        {"fecha": "date32", "tipo_cambio": "float64"},
+        orden="q.fecha",
+    )
+    fechas = np.array(datos["fecha"], dtype="int64").astype("datetime64[D]")
+    return fechas, np.array(datos["tipo_cambio"], dtype=np.float64)
+
+
+def valores_as_of(
+    fechas: np.ndarray,
+    serie_fechas: np.ndarray,
+    serie: np.ndarray,
+    desfase: int = 0,
+    max_dias: int = MAX_DIAS_TIPO_CAMBIO,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Índice y valor de la última observación de una serie hasta cada fecha
+    (menos desfase días).
+
+    Args:
+        fechas: Fechas a alinear (datetime64[D])
+        serie_fechas: Fechas de la serie, ordenadas
+        serie: Valores de la serie
+        desfase: Días hacia atrás desde cada fecha
+        max_dias: Antigüedad máxima de la observación
+
+    Returns:
+        (índice en la serie, valor o NaN si no hay observación reciente)
+    """
+    objetivo = fechas - np.timedelta64(desfase, "D")
+    idx = np.searchsorted(serie_fechas, objetivo, side="right") - 1
+    seguro = np.clip(idx, 0, None)
+    valido = (idx >= 0) & ((objetivo - serie_fechas[seguro]) <= np.timedelta64(max_dias, "D"))
+    return idx, np.where(valido, serie[seguro], np.nan)
+
+
+def _columna(registros: list[dict], campo: str) -> np.ndarray:
+    """Columna numérica de los registros (None -> NaN)."""
+    return np.array(
+        [np.nan if r.get(campo) is None else float(r[campo]) for r in registros],
+        dtype=np.float64,
+    )
+
+
+def _a_decimal(valor: float, decimales: int) -> float | None:
+    """Redondea para la columna DECIMAL (NaN -> None)."""
+    return None if np.isnan(valor) else round(float(valor), decimales)
+
+
+def convertir_a_mxn(conn: psycopg.Connection, registros: list[dict]) -> None:
+    """
+    Agrega a cada registro sus columnas en pesos (COLUMNAS_MXN).
+
+    Los registros necesitan fecha_actualizacion, precio_actual,
+    rendimiento_anual y rendimiento_ytd (en dólares, rendimientos en %).
+    Sin FIX para la fecha, las columnas quedan en None.
+    """
+    if not registros:
+        return
+
+    fechas = np.array([r["fecha_actualizacion"] for r in registros], dtype="datetime64[D]")
+    desde = fechas.min().astype(date) - timedelta(days=366 + MAX_DIAS_TIPO_CAMBIO)
+    fx_fechas, fx = cargar_tipo_cambio(conn, desde, fechas.max().astype(date))
+    if not len(fx):
+        for registro in registros:
+            registro.update(dict.fromkeys(COLUMNAS_MXN))
+        return
+
+    idx, tc = valores_as_of(fechas, fx_fechas, fx)
+    # FIX anterior al que se aplica (referencia del cambio diario)
+    tc_anterior = np.where(idx >= 1, fx[np.clip(idx - 1, 0, None)], np.nan)
+    _, tc_anio = valores_as_of(fechas, fx_fechas, fx, desfase=365)
+
+    precio = _columna(registros, "precio_actual")
+    anual = _columna(registros, "rendimiento_anual")
+    diario = _columna(registros, "rendimiento_ytd")
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precio_mxn = precio * tc
+        anual_mxn = ((1 + anual / 100) * tc / tc_anio - 1) * 100
+        diario_mxn = ((1 + diario / 100) * tc / tc_anterior - 1) * 100
+
+    for i, registro in enumerate(registros):
+        registro["tipo_cambio"] = _a_decimal(tc[i], 4)
+        registro["precio_mxn"] = _a_decimal(precio_mxn[i], 2)
+        registro["rendimiento_anual_mxn"] = _a_decimal(anual_mxn[i], 2)
+        registro["rendimiento_ytd_mxn"] = _a_decimal(diario_mxn[i], 2)
+
+
+def actualizar_fondos_mxn(conn: psycopg.Connection, desde: date) -> int:
+    """
+    Recalcula las columnas en pesos de los fondos desde una fecha, dentro
+    de la transacción actual (sin commit).
+
+    Returns:
+        Registros actualizados
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, fecha_actualizacion, precio_actual, rendimiento_anual, rendimiento_ytd
+            FROM fondos_etfs
+            WHERE fecha_actualizacion >= %s
+        """, (desde,))
+        filas = cur.fetchall()
+        if not filas:
+            return 0
+
+        convertir_a_mxn(conn, filas)
+
+        cur.execute("""
+            CREATE TEMP TABLE _fondos_mxn (
+                id INTEGER, tipo_cambio NUMERIC, precio_mxn NUMERIC,
+                rendimiento_anual_mxn NUMERIC, rendimiento_ytd_mxn NUMERIC
+            ) ON COMMIT DROP
+        """)
+        with cur.copy(f"COPY _fondos_mxn (id, {', '.join(COLUMNAS_MXN)}) FROM STDIN") as copy:
+            for fila in filas:
+                copy.write_row([fila["id"], *(fila[c] for c in COLUMNAS_MXN)])
+
+        cur.execute("""
+            UPDATE fondos_etfs f SET
+                tipo_cambio = m.tipo_cambio,
+                precio_mxn = m.precio_mxn,
+                rendimiento_anual_mxn = m.rendimiento_anual_mxn,
+                rendimiento_ytd_mxn = m.rendimiento_ytd_mxn
+            FROM _fondos_mxn m
+            WHERE f.id = m.id
+        """)
+        return cur.rowcount
@@ -0,0 +1,259 @@
+"""
+Registro persistente de las ejecuciones de los collectors.
+
+Cada recopilación completa (BanxicoCollector.collect, ETFCollector.collect,
+SofipoScraper.collect/scrape y sus versiones async) corre dentro de
+`ejecucion(fuente)`. Mientras dura, las llamadas HTTP de la fuente
+(registrar_respuesta) y los registros y errores por etapa de sus
+pipelines (registrar_pipeline) se acumulan en la ejecución actual (un
+ContextVar, que heredan las tareas de asyncio y los hilos de fetch del
+pipeline). Al terminar se guarda una fila en collector_runs y se
+actualiza la marca de agua de la fuente en collector_watermarks, en la
+misma transacción.
+
+Estado de una ejecución: error si lanzó una excepción o si fallaron
+peticiones y no se insertó ningún registro (el pipeline no propaga los
+errores de cada elemento); parcial si hubo errores en alguna etapa pero
+se insertaron registros; ok en otro caso. Sólo ok y parcial cuentan como
+último éxito de la fuente.
+
+La marca de agua (última ejecución, último éxito y fecha del dato más
+reciente) tiene una fila por fuente: /api/status/fuentes la lee sin
+recorrer el historial. collector_runs conserva el historial para
+tendencias (duración, llamadas, bytes y registros por segundo).
+"""
+
+import asyncio
+import os
+import socket
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Iterator
+
+import psycopg
+from loguru import logger
+from psycopg.types.json import Jsonb
+
+from app.database import get_connection
+from app.metrics import EXTERNAL_API_BYTES
+
+
+# Fecha del dato más reciente de cada fuente (se calcula al final de cada
+# ejecución, no en cada consulta de estado)
+ULTIMO_DATO_SQL = {
+    "banxico": "SELECT MAX(fecha_subasta) FROM cetes",
+    "etfs": "SELECT MAX(fecha_actualizacion) FROM fondos_etfs",
+    "sofipos": "SELECT MAX(fecha_actualizacion) FROM sofipos",
+}
+
+COLUMNAS_EJECUCION = """
+    id, fuente, proceso, iniciado_at, terminado_at, duracion_segundos,
+    llamadas_http, bytes_recibidos, insertados, estado, errores, error,
+    insertados / NULLIF(duracion_segundos, 0) AS registros_por_segundo
+"""
+
+
+@dataclass
+class Ejecucion:
+    """Contadores de una recopilación en curso."""
+    fuente: str
+    llamadas_http: int = 0
+    bytes_recibidos: int = 0
+    insertados: int = 0
+    errores: dict[str, int] = field(default_factory=dict)  # Por etapa de los pipelines
+    error: str | None = None
+    _inicio: float = field(default_factory=time.perf_counter)
+    # Los fetch síncronos del pipeline cuentan desde varios hilos
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def estado(self) -> str:
+        """ok, parcial (errores en alguna etapa) o error."""
+        if self.error:
+            return "error"
+        return "parcial" if any(self.errores.values()) else "ok"
+
+    def cerrar(self) -> None:
+        """Sin excepción, pero sin registros y con peticiones fallidas: la ejecución falló."""
+        fallidas = self.errores.get("fetch", 0)
+        if self.error is None and fallidas and not self.insertados:
+            self.error = f"{fallidas} peticiones fallidas y ningún registro insertado"
+
+
+_actual: ContextVar[Ejecucion | None] = ContextVar("ejecucion_collector", default=None)
+
+
+def registrar_respuesta(fuente: str, contenido: bytes) -> None:
+    """Cuenta una respuesta HTTP de la fuente en la ejecución actual."""
+    EXTERNAL_API_BYTES.labels(fuente).inc(len(contenido))
+    actual = _actual.get()
+    if actual is not None:
+        with actual._lock:
+            actual.llamadas_http += 1
+            actual.bytes_recibidos += len(contenido)
+
+
+def registrar_pipeline(insertados: int, errores: dict[str, int]) -> None:
+    """Suma los registros y los errores por etapa de un pipeline a la ejecución actual (si hay)."""
+    actual = _actual.get()
+    if actual is not None:
+        with actual._lock:
+            actual.insertados += insertados
+            for etapa, n in errores.items():
+                if n:
+                    actual.errores[etapa] = actual.errores.get(etapa, 0) + n
+
+
+def guardar_ejecucion(conn: psycopg.Connection, ejecucion: Ejecucion) -> int:
+    """
+    Guarda la ejecución y actualiza la marca de agua de su fuente.
+
+    Returns:
+        id de la fila en collector_runs
+    """
+    duracion = time.perf_counter() - ejecucion._inicio
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO collector_runs (
+                fuente, proceso, iniciado_at, terminado_at, duracion_segundos,
+                llamadas_http, bytes_recibidos, insertados, estado, errores, error
+            )
+            VALUES (%(fuente)s, %(proceso)s, NOW() - make_interval(secs => %(duracion)s), NOW(), %(duracion)s,
+                    %(llamadas)s, %(bytes)s, %(insertados)s, %(estado)s, %(errores)s, %(error)s)
+            RETURNING id
+        """, {
+            "fuente": ejecucion.fuente,
+            "proceso": f"{socket.gethostname()}:{os.getpid()}",
+            "duracion": duracion,
+            "llamadas": ejecucion.llamadas_http,
+            "bytes": ejecucion.bytes_recibidos,
+            "insertados": ejecucion.insertados,
+            "estado": ejecucion.estado,
+            "errores": Jsonb(ejecucion.errores),
+            "error": ejecucion.error,
+        })
+        run_id = cur.fetchone()["id"]
+
+        ultimo_dato = ULTIMO_DATO_SQL.get(ejecucion.fuente, "SELECT NULL::date")
+        cur.execute(f"""
+            INSERT INTO collector_watermarks (
+                fuente, ultima_ejecucion_id, ultima_ejecucion_at, ultimo_exito_at, ultimo_error, ultimo_dato
+            )
+            VALUES (%(fuente)s, %(id)s, NOW(), CASE WHEN %(error)s::text IS NULL THEN NOW() END,
+                    %(error)s, ({ultimo_dato}))
+            ON CONFLICT (fuente) DO UPDATE SET
+                ultima_ejecucion_id = EXCLUDED.ultima_ejecucion_id,
+                ultima_ejecucion_at = EXCLUDED.ultima_ejecucion_at,
+                ultimo_exito_at = COALESCE(EXCLUDED.ultimo_exito_at, collector_watermarks.ultimo_exito_at),
+                ultimo_error = EXCLUDED.ultimo_error,
+                ultimo_dato = COALESCE(EXCLUDED.ultimo_dato, collector_watermarks.ultimo_dato)
+        """, {"fuente": ejecucion.fuente, "id": run_id, "error": ejecucion.error})
+    conn.commit()
+    return run_id
+
+
+def _guardar(ejecucion: Ejecucion) -> None:
+    """Guarda la ejecución; un error aquí no cambia el resultado del collector."""
+    ejecucion.cerrar()
+    try:
+        with get_connection() as conn:
+            guardar_ejecucion(conn, ejecucion)
+    except psycopg.Error as e:
+        logger.error(f"No se pudo guardar la ejecución de {ejecucion.fuente}: {e}")
+        return
+    mensaje = (
+        f"Ejecución {ejecucion.fuente} ({ejecucion.estado}): {ejecucion.insertados} registros, "
+        f"{ejecucion.llamadas_http} llamadas HTTP ({ejecucion.bytes_recibidos} bytes)"
+    )
+    if ejecucion.error:
+        logger.warning(f"{mensaje}: {ejecucion.error}")
+    else:
+        logger.info(mensaje)
+
+
+@contextmanager
+def ejecucion(fuente: str) -> Iterator[Ejecucion]:
+    """
+    Registra una recopilación completa de la fuente.
+
+    Dentro de otra ejecución (ej. un collect que llama a otro) no crea
+    una nueva: los contadores van a la de afuera.
+    """
+    if _actual.get() is not None:
+        yield _actual.get()
+        return
+
+    actual = Ejecucion(fuente)
+    token = _actual.set(actual)
+    try:
+        yield actual
+    except BaseException as e:
+        actual.error = str(e) or type(e).__name__
+        raise
+    finally:
+        _actual.reset(token)
+        _guardar(actual)
+
+
+@asynccontextmanager
+async def ejecucion_async(fuente: str) -> AsyncIterator[Ejecucion]:
+    """Como ejecucion, guardando fuera del event loop."""
+    if _actual.get() is not None:
+        yield _actual.get()
+        return
+
+    actual = Ejecucion(fuente)
+    token = _actual.set(actual)
+    try:
+        yield actual
+    except BaseException as e:
+        actual.error = str(e) or type(e).__name__
+        raise
+    finally:
+        _actual.reset(token)
+        await asyncio.to_thread(_guardar, actual)
+
+
+def consultar_watermarks(conn: psycopg.Connection) -> dict:
+    """
+    Marca de agua de cada fuente y la hora de la base de datos.
+
+    Returns:
+        {"ahora": NOW() de PostgreSQL, "fuentes": [filas de collector_watermarks]}
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT fuente, ultima_ejecucion_at, ultimo_exito_at, ultimo_error, ultimo_dato,
+                   NOW()::timestamp AS ahora
+            FROM collector_watermarks
+            ORDER BY fuente
+        """, prepare=True)
+        filas = cur.fetchall()
+        if not filas:
+            cur.execute("SELECT NOW()::timestamp AS ahora")
+            return {"ahora": cur.fetchone()["ahora"], "fuentes": []}
+    return {"ahora": filas[0]["ahora"], "fuentes": filas}
+
+
+def listar_ejecuciones(
+    conn: psycopg.Connection, fuente: str | None, desde: datetime | None, limit: int
+) -> list[dict]:
+    """Ejecuciones más recientes primero (de una fuente y desde una fecha, si se indican)."""
+    query = f"SELECT {COLUMNAS_EJECUCION} FROM collector_runs WHERE 1=1"
+    params: list = []
+    if fuente:
+        query += " AND fuente = %s"
+        params.append(fuente)
+    if desde:
+        query += " AND iniciado_at >= %s"
+        params.append(desde)
+    query += " ORDER BY iniciado_at DESC LIMIT %s"
+    params.append(limit)
+
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchall()
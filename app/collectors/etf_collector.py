@@ -1,27 +1,44 @@
 """
 Collector para obtener datos de ETFs y fondos usando Alpha Vantage.
 
-Límite gratuito: 25 requests/día
+Límite gratuito: 25 requests/día, contados en la base de datos (tabla
+api_llamadas) para todos los nodos. Los tickers salen de la watchlist en la
+base de datos (app.collectors.watchlist), ordenados por prioridad.
 """
 
+import asyncio
 import time
 from datetime import date
 from decimal import Decimal, InvalidOperation
-from pathlib import Path
-import json
+from typing import Iterator
 
+import httpx
+import psycopg
 import requests
 from loguru import logger
 
+from app.collectors.anomalias import FiltroAnomalias
+from app.collectors.cliente_http import get_http_client
+from app.collectors.divisas import COLUMNAS_MXN, convertir_a_mxn
+from app.collectors.ejecuciones import ejecucion, ejecucion_async, registrar_respuesta
+from app.collectors.pipeline import BulkLoader, DetenerPipeline, Pipeline
+from app.collectors.watchlist import (
+    agotar_llamadas,
+    devolver_llamadas,
+    llamadas_restantes,
+    marcar_actualizados,
+    planificar_etfs,
+    reservar_llamadas,
+)
 from app.config import settings
 from app.database import get_connection
+from app.metrics import track_external_call
 
 
 # Límites de API
 MAX_DAILY_CALLS = 25
-CALLS_FILE = Path(__file__).parent / ".api_calls.json"
 
-# Lista de ETFs a monitorear (limitada a 20 para dejar margen)
+# ETFs con los que se llena la watchlist (tabla etf_watchlist) si está vacía
 ETFS_LIST = [
     # ETFs de Estados Unidos - Índices principales
     {"ticker": "SPY", "nombre": "SPDR S&P 500 ETF", "tipo": "ETF", "mercado": "US"},
@@ -54,59 +71,144 @@ ETFS_LIST = [
     {"ticker": "SCHD", "nombre": "Schwab US Dividend Equity ETF", "tipo": "ETF", "mercado": "US"},
 ]
 
-BASE_URL = "https://www.alphavantage.co/query"
-
-
-class APILimitExceeded(Exception):
+class FondosLoader(BulkLoader):
+    """
+    Carga fondos con sus columnas en pesos calculadas para todo el lote y
+    registra en la watchlist los tickers con precio nuevo.
+    """
+
+    def load(self, conn: psycopg.Connection, registros: list[dict]) -> tuple[int, list[dict]]:
+        # Las cotizaciones de Alpha Vantage están en dólares
+        convertir_a_mxn(conn, registros)
+        cargados, filas = super().load(conn, registros)
+        marcar_actualizados(conn, (f["ticker"] for f in filas))
+        return cargados, filas
+
+
+ETFS_LOADER = FondosLoader(
+    "fondos_etfs",
+    [
+        "ticker", "nombre", "tipo", "mercado", "precio_actual",
+        "rendimiento_anual", "rendimiento_ytd", "fecha_actualizacion",
+        *COLUMNAS_MXN,
+    ],
+    on_conflict="""
+        ON CONFLICT (ticker, fecha_actualizacion) DO UPDATE SET
+            precio_actual = EXCLUDED.precio_actual,
+            rendimiento_anual = EXCLUDED.rendimiento_anual,
+            rendimiento_ytd = EXCLUDED.rendimiento_ytd,
+            tipo_cambio = EXCLUDED.tipo_cambio,
+            precio_mxn = EXCLUDED.precio_mxn,
+            rendimiento_anual_mxn = EXCLUDED.rendimiento_anual_mxn,
+            rendimiento_ytd_mxn = EXCLUDED.rendimiento_ytd_mxn
+    """,
+    returning="ticker, precio_actual, rendimiento_ytd, fecha_actualizacion AS fecha",
+)
+
+# Anomalías: z-score contra la ventana o salto de más de 50% contra el precio anterior
+ETFS_FILTRO = FiltroAnomalias("fondos_etfs", "ticker", "precio_actual", "fecha_actualizacion", umbral_salto=0.5)
+
+
+class APILimitExceeded(DetenerPipeline):
     """Excepción cuando se excede el límite de llamadas."""
     pass
 
 
 class ETFCollector:
-    """Recopilador de datos de ETFs desde Alpha Vantage."""
-
-    def __init__(self, api_key: str | None = None):
+    """
+    Recopilador de datos de ETFs desde Alpha Vantage.
+
+    Args:
+        api_key: API key de Alpha Vantage (default ALPHA_VANTAGE_API_KEY)
+        base_url: URL de la API (default ALPHA_VANTAGE_BASE_URL)
+        limite_diario: Llamadas por día (None = sin límite ni contador,
+            para servidores locales). Cada ejecución sólo hace las llamadas
+            que reservó en api_llamadas al planificar.
+        pausa: Segundos de espera después de cada llamada
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        limite_diario: int | None = MAX_DAILY_CALLS,
+        pausa: float = 1.0,
+    ):
         self.api_key = api_key or settings.ALPHA_VANTAGE_API_KEY
         if not self.api_key:
             raise ValueError("ALPHA_VANTAGE_API_KEY no configurada")
 
-        self.calls_today = self._load_calls_count()
-
-    def _load_calls_count(self) -> int:
-        """Carga el contador de llamadas del día."""
-        try:
-            if CALLS_FILE.exists():
-                data = json.loads(CALLS_FILE.read_text())
-                if data.get("date") == str(date.today()):
-                    return data.get("calls", 0)
-        except Exception:
-            pass
-        return 0
-
-    def _save_calls_count(self):
-        """Guarda el contador de llamadas."""
-        try:
-            data = {"date": str(date.today()), "calls": self.calls_today}
-            CALLS_FILE.write_text(json.dumps(data))
-        except Exception as e:
-            logger.warning(f"Error guardando contador de llamadas: {e}")
+        self.base_url = base_url or settings.ALPHA_VANTAGE_BASE_URL
+        self.limite_diario = limite_diario
+        self.pausa = pausa
+        # Llamadas reservadas para la ejecución en curso y hechas de ellas
+        self.reservadas = 0
+        self.llamadas = 0
+        self.limite_agotado = False
+        self.restantes_hoy: int | None = None  # Al planificar, en todos los nodos
 
     def _check_limit(self):
         """Verifica si se puede hacer otra llamada."""
-        if self.calls_today >= MAX_DAILY_CALLS:
+        if self.limite_diario and self.llamadas >= self.reservadas:
             raise APILimitExceeded(
-                f"Límite de {MAX_DAILY_CALLS} llamadas diarias alcanzado. "
-                f"Reintenta mañana."
+                f"Llamadas reservadas agotadas ({self.reservadas} de {self.limite_diario} diarias)"
             )
 
     def _increment_calls(self):
-        """Incrementa el contador de llamadas."""
-        self.calls_today += 1
-        self._save_calls_count()
+        """Cuenta una llamada hecha."""
+        self.llamadas += 1
+
+    def _pendientes(self) -> int | None:
+        """Llamadas reservadas sin hacer en esta ejecución (None = sin límite)."""
+        if not self.limite_diario:
+            return None
+        return self.reservadas - self.llamadas
 
-    def get_remaining_calls(self) -> int:
-        """Retorna llamadas restantes hoy."""
-        return max(0, MAX_DAILY_CALLS - self.calls_today)
+    def get_remaining_calls(self) -> int | None:
+        """Retorna llamadas restantes hoy en todos los nodos (None = sin límite)."""
+        if not self.limite_diario:
+            return None
+        with get_connection() as conn:
+            return llamadas_restantes(conn, self.limite_diario)
+
+    def _params(self, ticker: str) -> dict:
+        """Parámetros de GLOBAL_QUOTE (precio actual) para un ticker."""
+        return {
+            "function": "GLOBAL_QUOTE",
+            "symbol": ticker,
+            "apikey": self.api_key,
+        }
+
+    def _parse_quote(self, ticker: str, data: dict) -> dict | None:
+        """
+        Interpreta la respuesta de GLOBAL_QUOTE.
+
+        Raises:
+            APILimitExceeded: Alpha Vantage respondió con el aviso de límite
+        """
+        # Verificar errores de API
+        if "Error Message" in data:
+            logger.error(f"Error de API para {ticker}: {data['Error Message']}")
+            return None
+
+        if "Note" in data:
+            logger.warning(f"Límite de API alcanzado: {data['Note']}")
+            self.limite_agotado = True
+            raise APILimitExceeded("Límite de Alpha Vantage alcanzado")
+
+        quote = data.get("Global Quote", {})
+        if not quote:
+            logger.warning(f"Sin datos para {ticker}")
+            return None
+
+        precio = self._to_decimal(quote.get("05. price"))
+        cambio_pct = self._to_decimal(quote.get("10. change percent", "0").replace("%", ""))
+
+        return {
+            "precio_actual": precio,
+            "rendimiento_anual": None,  # GLOBAL_QUOTE no da rendimiento anual
+            "rendimiento_ytd": cambio_pct,  # Usamos cambio diario como aproximación
+        }
 
     def fetch_etf_data(self, ticker: str) -> dict | None:
         """
@@ -121,48 +223,45 @@ class ETFCollector:
         self._check_limit()
 
         try:
-            logger.debug(f"Obteniendo datos de {ticker} (llamadas restantes: {self.get_remaining_calls()})")
-
-            # GLOBAL_QUOTE da precio actual
-            params = {
-                "function": "GLOBAL_QUOTE",
-                "symbol": ticker,
-                "apikey": self.api_key,
-            }
+            logger.debug(f"Obteniendo datos de {ticker} (llamadas reservadas: {self._pendientes()})")
 
-            response = requests.get(BASE_URL, params=params, timeout=30)
-            response.raise_for_status()
+            with track_external_call("etfs"):
+                response = requests.get(self.base_url, params=self._params(ticker), timeout=30)
+            # Alpha Vantage cuenta toda petición que responde, aun con error
             self._increment_calls()
+            registrar_respuesta("etfs", response.content)
+            response.raise_for_status()
 
-            data = response.json()
+            return self._parse_quote(ticker, response.json())
 
-            # Verificar errores de API
-            if "Error Message" in data:
-                logger.error(f"Error de API para {ticker}: {data['Error Message']}")
-                return None
+        except APILimitExceeded:
+            raise
+        except requests.RequestException as e:
+            logger.error(f"Error de red para {ticker}: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Error obteniendo datos de {ticker}: {e}")
+            return None
 
-            if "Note" in data:
-                logger.warning(f"Límite de API alcanzado: {data['Note']}")
-                raise APILimitExceeded("Límite de Alpha Vantage alcanzado")
+    async def fetch_etf_data_async(self, ticker: str) -> dict | None:
+        """Como fetch_etf_data, con el cliente async compartido."""
+        self._check_limit()
 
-            quote = data.get("Global Quote", {})
-            if not quote:
-                logger.warning(f"Sin datos para {ticker}")
-                return None
+        try:
+            logger.debug(f"Obteniendo datos de {ticker} (llamadas reservadas: {self._pendientes()})")
 
-            precio = self._to_decimal(quote.get("05. price"))
-            precio_anterior = self._to_decimal(quote.get("08. previous close"))
-            cambio_pct = self._to_decimal(quote.get("10. change percent", "0").replace("%", ""))
+            with track_external_call("etfs"):
+                response = await get_http_client().get(self.base_url, params=self._params(ticker))
+            # Alpha Vantage cuenta toda petición que responde, aun con error
+            self._increment_calls()
+            registrar_respuesta("etfs", response.content)
+            response.raise_for_status()
 
-            return {
-                "precio_actual": precio,
-                "rendimiento_anual": None,  # GLOBAL_QUOTE no da rendimiento anual
-                "rendimiento_ytd": cambio_pct,  # Usamos cambio diario como aproximación
-            }
+            return self._parse_quote(ticker, response.json())
 
         except APILimitExceeded:
             raise
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error de red para {ticker}: {e}")
             return None
         except Exception as e:
@@ -178,97 +277,158 @@ class ETFCollector:
         except (InvalidOperation, ValueError):
             return None
 
-    def save_to_db(self, etf_info: dict, data: dict) -> bool:
+    @staticmethod
+    def _con_datos(ticker: str, datos: dict | None) -> dict:
         """
-        Guarda datos de un ETF en la base de datos.
+        Un ETF sin datos (error de red o de la API) es una petición fallida:
+        el pipeline la cuenta como error de fetch.
+        """
+        if datos is None:
+            raise ValueError(f"sin datos de {ticker}")
+        return datos
 
-        Args:
-            etf_info: Información del ETF (ticker, nombre, tipo, mercado)
-            data: Datos obtenidos (precio, rendimientos)
+    def fetch_etf(self, etf_info: dict) -> dict:
+        """Obtiene un ETF y hace una pausa para evitar rate limiting."""
+        try:
+            return self._con_datos(etf_info["ticker"], self.fetch_etf_data(etf_info["ticker"]))
+        finally:
+            if self.pausa:
+                time.sleep(self.pausa)
 
-        Returns:
-            True si se insertó correctamente
+    async def fetch_etf_async(self, etf_info: dict) -> dict:
+        """Como fetch_etf, sin bloquear el event loop durante la pausa."""
+        try:
+            return self._con_datos(etf_info["ticker"], await self.fetch_etf_data_async(etf_info["ticker"]))
+        finally:
+            if self.pausa:
+                await asyncio.sleep(self.pausa)
+
+    def parse_etf(self, etf_info: dict, data: dict | None) -> Iterator[dict]:
+        """Combina la información del ETF con los datos obtenidos."""
+        if not data:
+            logger.warning(f"{etf_info['ticker']}: Sin datos disponibles")
+            return
+        yield {**etf_info, **data, "fecha_actualizacion": date.today()}
+
+    def validate_etf(self, registro: dict) -> dict | None:
+        """Descarta registros sin precio."""
+        if registro.get("precio_actual") is None or registro["precio_actual"] <= 0:
+            return None
+        return registro
+
+    def _etfs_a_procesar(self, max_etfs: int | None, etfs: list[dict] | None) -> list[dict]:
         """
-        fecha_hoy = date.today()
+        ETFs de esta ejecución, limitados a las llamadas disponibles, que
+        quedan reservadas en api_llamadas (una por ETF).
 
+        Sin una lista explícita, los de mayor prioridad de la watchlist.
+        """
+        limite = max_etfs or None
+        self.llamadas = 0
+        self.limite_agotado = False
         with get_connection() as conn:
-            with conn.cursor() as cur:
-                try:
-                    cur.execute("""
-                        INSERT INTO fondos_etfs
-                        (ticker, nombre, tipo, mercado, precio_actual,
-                         rendimiento_anual, rendimiento_ytd, fecha_actualizacion)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (ticker, fecha_actualizacion) DO UPDATE SET
-                            precio_actual = EXCLUDED.precio_actual,
-                            rendimiento_anual = EXCLUDED.rendimiento_anual,
-                            rendimiento_ytd = EXCLUDED.rendimiento_ytd
-                    """, (
-                        etf_info["ticker"],
-                        etf_info["nombre"],
-                        etf_info["tipo"],
-                        etf_info["mercado"],
-                        data.get("precio_actual"),
-                        data.get("rendimiento_anual"),
-                        data.get("rendimiento_ytd"),
-                        fecha_hoy,
-                    ))
+            if etfs is None:
+                etfs_a_procesar = planificar_etfs(
+                    conn, limite, iniciales=ETFS_LIST, limite_diario=self.limite_diario
+                )
+            else:
+                pedidas = len(etfs) if limite is None else min(limite, len(etfs))
+                if self.limite_diario:
+                    pedidas = reservar_llamadas(conn, self.limite_diario, pedidas)
                     conn.commit()
-                    return True
+                etfs_a_procesar = etfs[:pedidas]
+            if self.limite_diario:
+                self.restantes_hoy = llamadas_restantes(conn, self.limite_diario)
+
+        self.reservadas = len(etfs_a_procesar)
+        if self.limite_diario:
+            logger.info(
+                f"Llamadas API reservadas: {self.reservadas}; "
+                f"restantes hoy: {self.restantes_hoy}/{self.limite_diario}"
+            )
+            if not etfs_a_procesar and self.restantes_hoy == 0:
+                logger.warning("No hay llamadas disponibles hoy. Reintenta mañana.")
 
-                except Exception as e:
-                    logger.error(f"Error guardando {etf_info['ticker']}: {e}")
-                    conn.rollback()
-                    return False
+        logger.info(f"Procesando {len(etfs_a_procesar)} ETFs...")
+        return etfs_a_procesar
 
-    def collect(self, max_etfs: int | None = None) -> int:
+    def _cerrar_reserva(self) -> None:
+        """
+        Al terminar la ejecución, regresa las llamadas reservadas que no se
+        hicieron, o agota el día si Alpha Vantage respondió con su límite.
+        """
+        if not self.limite_diario or not (self.limite_agotado or self._pendientes()):
+            return
+        with get_connection() as conn:
+            if self.limite_agotado:
+                agotar_llamadas(conn, self.limite_diario)
+            else:
+                devolver_llamadas(conn, self._pendientes())
+            conn.commit()
+
+    def _pipeline(self, fetch) -> Pipeline:
+        """Pipeline de ETFs con el fetch dado (síncrono o async)."""
+        # Con límite diario, una petición a la vez: el límite por minuto de
+        # Alpha Vantage no admite concurrencia
+        return Pipeline(
+            "etfs",
+            fetch=fetch,
+            parse=self.parse_etf,
+            validate=self.validate_etf,
+            loader=ETFS_LOADER,
+            filtro=ETFS_FILTRO,
+            concurrencia=1 if self.limite_diario else None,
+            notifica="fondos",
+        )
+
+    def _sin_llamadas(self) -> str | None:
+        """Error de una ejecución sin ETFs: límite diario agotado (None = nada por actualizar)."""
+        if self.limite_diario and self.restantes_hoy == 0:
+            return f"Límite diario de Alpha Vantage agotado ({self.limite_diario} llamadas)"
+        return None
+
+    def _log_resultado(self, exitosos: int) -> None:
+        """Resumen de la ejecución y llamadas hechas."""
+        logger.info(f"Recopilación completada: {exitosos} ETFs guardados")
+        if self.limite_diario:
+            logger.info(f"Llamadas hechas: {self.llamadas} de {self.reservadas} reservadas")
+
+    def collect(self, max_etfs: int | None = None, etfs: list[dict] | None = None) -> int:
         """
         Recopila y guarda datos de ETFs.
 
         Args:
             max_etfs: Máximo de ETFs a procesar (None = todos los posibles)
+            etfs: ETFs a procesar (default: plan de la watchlist)
 
         Returns:
             Número de ETFs procesados exitosamente
         """
-        restantes = self.get_remaining_calls()
-        logger.info(f"Llamadas API restantes hoy: {restantes}/{MAX_DAILY_CALLS}")
-
-        if restantes == 0:
-            logger.warning("No hay llamadas disponibles hoy. Reintenta mañana.")
-            return 0
-
-        # Limitar a las llamadas disponibles
-        etfs_a_procesar = ETFS_LIST[:min(len(ETFS_LIST), restantes)]
-        if max_etfs:
-            etfs_a_procesar = etfs_a_procesar[:max_etfs]
-
-        logger.info(f"Procesando {len(etfs_a_procesar)} ETFs...")
-
-        exitosos = 0
-
-        for etf_info in etfs_a_procesar:
-            ticker = etf_info["ticker"]
-
+        with ejecucion("etfs") as actual:
+            etfs_a_procesar = self._etfs_a_procesar(max_etfs, etfs)
+            if not etfs_a_procesar:
+                actual.error = self._sin_llamadas()
+                return 0
             try:
-                data = self.fetch_etf_data(ticker)
-
-                if data:
-                    if self.save_to_db(etf_info, data):
-                        exitosos += 1
-                        logger.info(f"{ticker}: ${data.get('precio_actual')}")
-                else:
-                    logger.warning(f"{ticker}: Sin datos disponibles")
-
-                # Pausa para evitar rate limiting
-                time.sleep(1)
-
-            except APILimitExceeded as e:
-                logger.warning(str(e))
-                break
+                exitosos = self._pipeline(self.fetch_etf).run(etfs_a_procesar)
+            finally:
+                self._cerrar_reserva()
+        self._log_resultado(exitosos)
+        return exitosos
 
-        logger.info(f"Recopilación completada: {exitosos} ETFs guardados")
-        logger.info(f"Llamadas restantes: {self.get_remaining_calls()}/{MAX_DAILY_CALLS}")
+    async def collect_async(self, max_etfs: int | None = None, etfs: list[dict] | None = None) -> int:
+        """Como collect, dentro del event loop."""
+        async with ejecucion_async("etfs") as actual:
+            # El plan consulta la watchlist con psycopg síncrono: fuera del event loop
+            etfs_a_procesar = await asyncio.to_thread(self._etfs_a_procesar, max_etfs, etfs)
+            if not etfs_a_procesar:
+                actual.error = self._sin_llamadas()
+                return 0
+            try:
+                exitosos = await self._pipeline(self.fetch_etf_async).run_async(etfs_a_procesar)
+            finally:
+                await asyncio.to_thread(self._cerrar_reserva)
+        self._log_resultado(exitosos)
         return exitosos
 
 
@@ -0,0 +1,317 @@
+"""
+Importación masiva de series descargadas de Banxico SIE (CSV o JSON).
+
+Para cargar historia completa sin pasar por la API (lenta y con cuota).
+Acepta los dos formatos de descarga del SIE:
+
+- CSV: unas líneas de metadatos, un encabezado "Fecha,SF43936,SF43939,..."
+  y una fila por fecha (dd/mm/yyyy); se lee por streaming.
+- JSON: el mismo documento que regresa la API ({"bmx": {"series": [...]}}).
+
+Cada serie (plazo de CETES, FIX, INPC o UDI) se carga con su propio
+pipeline y en paralelo con las demás, con los mismos loaders (COPY) y
+filtros de anomalías que el collector. La carga es idempotente: CETES usa
+ON CONFLICT (plazo, fecha_subasta) DO NOTHING y el FIX y los índices
+actualizan sólo los valores que cambian, así que se puede repetir con los
+mismos archivos.
+
+Los índices de inflación se cargan antes que CETES y FIX, para que las
+subastas importadas lleven su tasa real.
+
+Uso:
+    python -m app.collectors.importar cetes.csv fix.csv inflacion.json
+    python -m app.collectors.importar historia.csv --paralelo 4 --lote 10000
+    python -m app.collectors.importar cetes28.csv --serie SF43936   # CSV sin ids
+"""
+
+import argparse
+import csv
+import json
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterator
+
+from loguru import logger
+
+from app.collectors.anomalias import FiltroAnomalias
+from app.collectors.banxico_collector import (
+    CETES_FILTRO,
+    CETES_LOADER,
+    CETES_SERIES,
+    INDICES_FILTRO,
+    INDICES_LOADER,
+    INFLACION_SERIES,
+    SERIE_FIX,
+    TIPO_CAMBIO_FILTRO,
+    TIPO_CAMBIO_LOADER,
+    parse_fecha_dato,
+)
+from app.collectors.divisas import MONEDA_USD
+from app.collectors.pipeline import BulkLoader, Pipeline
+from app.config import get_settings
+from app.database import close_pool
+
+
+# Filas leídas por elemento del pipeline (cada una se valida y se agrupa
+# en lotes de --lote registros para el COPY)
+FILAS_POR_BLOQUE = 10_000
+
+
+@dataclass(frozen=True)
+class Destino:
+    """Tabla destino de una serie de Banxico."""
+    nombre: str
+    loader: BulkLoader
+    filtro: FiltroAnomalias
+    notifica: str
+    registro: Callable[[date, Decimal], dict]
+    fase: int  # Las series de una fase se cargan antes que las de la siguiente
+
+
+def _cetes(plazo: int) -> Callable[[date, Decimal], dict]:
+    return lambda fecha, tasa: {"plazo": plazo, "tasa": tasa, "fecha_subasta": fecha}
+
+
+def _indice(indice: str) -> Callable[[date, Decimal], dict]:
+    return lambda fecha, valor: {"indice": indice, "fecha": fecha, "valor": valor}
+
+
+DESTINOS: dict[str, Destino] = {
+    **{
+        serie: Destino(f"inflación {indice}", INDICES_LOADER, INDICES_FILTRO, "inflacion", _indice(indice), 0)
+        for indice, serie in INFLACION_SERIES.items()
+    },
+    **{
+        serie: Destino(f"CETES {plazo} días", CETES_LOADER, CETES_FILTRO, "cetes", _cetes(plazo), 1)
+        for plazo, serie in CETES_SERIES.items()
+    },
+    SERIE_FIX: Destino(
+        "FIX USD/MXN",
+        TIPO_CAMBIO_LOADER,
+        TIPO_CAMBIO_FILTRO,
+        "tipo_cambio",
+        lambda fecha, tipo_cambio: {"moneda": MONEDA_USD, "fecha": fecha, "tipo_cambio": tipo_cambio},
+        1,
+    ),
+}
+
+
+def _es_encabezado(fila: list[str]) -> bool:
+    """Si la fila es el encabezado de datos del CSV ("Fecha", ...)."""
+    return bool(fila) and re.sub(r"[^a-z]", "", fila[0].lower()) == "fecha"
+
+
+def _encabezado_csv(ruta: Path, encoding: str) -> tuple[int, list[str]]:
+    """Número de línea y columnas del encabezado de datos de un CSV del SIE."""
+    with open(ruta, newline="", encoding=encoding) as f:
+        for i, fila in enumerate(csv.reader(f)):
+            if _es_encabezado(fila):
+                return i, [c.strip() for c in fila[1:]]
+    raise ValueError(f"{ruta}: no se encontró el encabezado 'Fecha,...'")
+
+
+def series_en_archivo(ruta: Path, encoding: str, serie: str | None = None) -> list[str]:
+    """Ids de las series de un archivo (serie: id para un CSV de una columna sin ids)."""
+    if ruta.suffix.lower() == ".json":
+        with open(ruta, encoding=encoding) as f:
+            return [s.get("idSerie", "") for s in json.load(f).get("bmx", {}).get("series", [])]
+
+    _, columnas = _encabezado_csv(ruta, encoding)
+    if serie:
+        if len(columnas) != 1:
+            raise ValueError(f"{ruta}: --serie sólo aplica a archivos de una columna")
+        return [serie]
+    return columnas
+
+
+def leer_serie(ruta: Path, indice: int, encoding: str) -> Iterator[tuple[str, str]]:
+    """
+    (fecha, dato) de la columna `indice` de un archivo, en orden.
+
+    Los CSV se leen por streaming; el JSON del SIE es un solo documento.
+    """
+    if ruta.suffix.lower() == ".json":
+        with open(ruta, encoding=encoding) as f:
+            datos = json.load(f)["bmx"]["series"][indice].get("datos", [])
+        for registro in datos:
+            yield registro.get("fecha", ""), registro.get("dato", "")
+        return
+
+    linea, _ = _encabezado_csv(ruta, encoding)
+    with open(ruta, newline="", encoding=encoding) as f:
+        for fila in islice(csv.reader(f), linea + 1, None):
+            if len(fila) > indice + 1:
+                yield fila[0].strip(), fila[indice + 1].strip()
+
+
+class Progreso:
+    """Filas leídas por serie, mostradas en una línea de stderr."""
+
+    def __init__(self):
+        self.leidas: dict[str, int] = {}
+        self.inicio = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._hilo = threading.Thread(target=self._mostrar, name="progreso", daemon=True)
+
+    def sumar(self, serie: str, filas: int) -> None:
+        with self._lock:
+            self.leidas[serie] = self.leidas.get(serie, 0) + filas
+
+    def linea(self) -> str:
+        with self._lock:
+            total = sum(self.leidas.values())
+            detalle = " ".join(f"{s}:{n}" for s, n in self.leidas.items())
+        segundos = time.perf_counter() - self.inicio
+        return f"{total} filas ({total / max(segundos, 1e-9):.0f}/s) {detalle}"
+
+    def _mostrar(self) -> None:
+        while not self._stop.wait(1.0):
+            print(f"\r{self.linea()}", end="", file=sys.stderr, flush=True)
+
+    def __enter__(self) -> "Progreso":
+        if sys.stderr.isatty():
+            self._hilo.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self._hilo.is_alive():
+            self._hilo.join()
+            print(file=sys.stderr)
+
+
+@dataclass
+class Resultado:
+    """Resumen de la importación de una serie."""
+    archivo: str
+    serie: str
+    destino: str
+    leidas: int = 0
+    cargadas: int = 0
+    segundos: float = 0.0
+    error: str | None = None
+
+
+def importar_serie(
+    ruta: Path,
+    indice: int,
+    serie: str,
+    encoding: str,
+    lote: int,
+    filtrar: bool,
+    progreso: Progreso,
+) -> Resultado:
+    """Carga una columna de un archivo en la tabla de su serie."""
+    destino = DESTINOS[serie]
+    resultado = Resultado(ruta.name, serie, destino.nombre)
+    inicio = time.perf_counter()
+
+    def bloques() -> Iterator[list[tuple[str, str]]]:
+        filas = leer_serie(ruta, indice, encoding)
+        while bloque := list(islice(filas, FILAS_POR_BLOQUE)):
+            resultado.leidas += len(bloque)
+            progreso.sumar(serie, len(bloque))
+            yield bloque
+
+    def validar(observacion: tuple[str, str]) -> dict | None:
+        fecha_dato = parse_fecha_dato(*observacion)
+        return destino.registro(*fecha_dato) if fecha_dato else None
+
+    pipeline = Pipeline(
+        f"importar_{destino.notifica}",
+        fetch=lambda bloque: bloque,
+        parse=lambda _, bloque: bloque,
+        validate=validar,
+        loader=destino.loader,
+        filtro=destino.filtro if filtrar else None,
+        batch_size=lote,
+        concurrencia=1,
+        notifica=destino.notifica,
+    )
+    try:
+        resultado.cargadas = pipeline.run(bloques())
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        logger.error(f"{ruta.name} {serie}: {e}")
+        resultado.error = str(e)
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+def importar(
+    archivos: list[Path],
+    paralelo: int | None = None,
+    lote: int = 5000,
+    filtrar: bool = True,
+    encoding: str = "latin-1",
+    serie: str | None = None,
+) -> list[Resultado]:
+    """
+    Importa las series conocidas de los archivos, en paralelo por serie.
+
+    Returns:
+        Resumen por serie
+    """
+    paralelo = paralelo or get_settings().DB_WRITE_POOL_MAX
+
+    tareas = []
+    for ruta in archivos:
+        for indice, serie_id in enumerate(series_en_archivo(ruta, encoding, serie)):
+            if serie_id in DESTINOS:
+                tareas.append((ruta, indice, serie_id))
+            else:
+                logger.warning(f"{ruta.name}: serie {serie_id or '(sin id)'} desconocida, se omite")
+
+    resultados = []
+    with Progreso() as progreso, ThreadPoolExecutor(max_workers=paralelo, thread_name_prefix="importar") as executor:
+        for fase in sorted({DESTINOS[t[2]].fase for t in tareas}):
+            futuros = [
+                executor.submit(importar_serie, ruta, indice, serie_id, encoding, lote, filtrar, progreso)
+                for ruta, indice, serie_id in tareas
+                if DESTINOS[serie_id].fase == fase
+            ]
+            resultados.extend(f.result() for f in futuros)
+    return resultados
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Importa series de Banxico SIE desde archivos CSV/JSON")
+    parser.add_argument("archivos", nargs="+", type=Path, help="Archivos .csv o .json descargados del SIE")
+    parser.add_argument("--paralelo", type=int, help="Series cargadas a la vez (default DB_WRITE_POOL_MAX)")
+    parser.add_argument("--lote", type=int, default=5000, help="Registros por COPY/transacción")
+    parser.add_argument("--sin-filtro", action="store_true",
+                        help="No mandar a cuarentena saltos históricos (ej. crisis) al cargar historia")
+    parser.add_argument("--encoding", default="latin-1", help="Codificación de los archivos")
+    parser.add_argument("--serie", help="Id de la serie para un CSV de una columna sin ids")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    try:
+        resultados = importar(
+            args.archivos, args.paralelo, args.lote, not args.sin_filtro, args.encoding, args.serie
+        )
+    finally:
+        close_pool()
+    segundos = time.perf_counter() - inicio
+
+    print(f"\n{'archivo':<24} {'serie':<9} {'destino':<18} {'leídas':>9} {'cargadas':>9} {'segundos':>9} {'filas/s':>9}")
+    for r in resultados:
+        estado = f"  error: {r.error}" if r.error else ""
+        print(f"{r.archivo[:24]:<24} {r.serie:<9} {r.destino:<18} {r.leidas:>9} {r.cargadas:>9} "
+              f"{r.segundos:>9.2f} {r.leidas / max(r.segundos, 1e-9):>9.0f}{estado}")
+
+    leidas = sum(r.leidas for r in resultados)
+    cargadas = sum(r.cargadas for r in resultados)
+    print(f"{'total':<53} {leidas:>9} {cargadas:>9} {segundos:>9.2f} {leidas / max(segundos, 1e-9):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Inflación (INPC y UDI) y tasas reales de CETES.
+
+Al guardar cada subasta se calcula su tasa real con la misma fórmula que la
+GAT real de las SOFIPOs, para compararlas entre sí:
+
+    tasa_real = (1 + tasa) / (1 + inflación) - 1
+
+La inflación es la anual observada a la fecha de la subasta:
+
+- UDI (diaria, publicada por adelantado): UDI(fecha) / UDI(fecha - 365) - 1
+- INPC (mensual, se publica con ~40 días de retraso), si no hay UDI: el
+  último INPC publicado contra el de doce meses antes
+
+La alineación es un as-of join vectorizado igual al del tipo de cambio
+(valores_as_of). Si un índice llega después que las subastas, al
+guardarlo se recalculan los CETES desde esa fecha (actualizar_cetes_reales).
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import psycopg
+
+from app.collectors.divisas import valores_as_of
+from app.columnar import fetch_columns
+
+
+INPC = "INPC"
+UDI = "UDI"
+
+# Días entre la fecha de un INPC (primero del mes) y su publicación
+DESFASE_INPC = 40
+
+# Antigüedad máxima de la observación que se usa de cada índice
+MAX_DIAS_UDI = 5
+MAX_DIAS_INPC = 70
+
+
+def cargar_indice(conn: psycopg.Connection, indice: str, desde: date, hasta: date) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Observaciones de un índice entre dos fechas.
+
+    Returns:
+        (fechas datetime64[D] ordenadas, valores float64)
+    """
+    datos = fetch_columns(
+        conn,
+        """
+            SELECT fecha, valor FROM indices_inflacion
+            WHERE indice = %s AND fecha BETWEEN %s AND %s
+            ORDER BY fecha
+        """,
+        (indice, desde, hasta),
+        {"fecha": "date32", "valor": "float64"},
+        orden="q.fecha",
+    )
+    fechas = np.array(datos["fecha"], dtype="int64").astype("datetime64[D]")
+    return fechas, np.array(datos["valor"], dtype=np.float64)
+
+
+def inflacion_anual(conn: psycopg.Connection, fechas: np.ndarray) -> np.ndarray:
+    """
+    Inflación anual (%) observada a cada fecha; NaN si no hay índices.
+
+    Args:
+        fechas: Fechas (datetime64[D])
+    """
+    desde = fechas.min().astype(date) - timedelta(days=365 + DESFASE_INPC + MAX_DIAS_INPC)
+    hasta = fechas.max().astype(date)
+
+    inflacion = np.full(len(fechas), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        udi_fechas, udi = cargar_indice(conn, UDI, desde, hasta)
+        if len(udi):
+            _, actual = valores_as_of(fechas, udi_fechas, udi, max_dias=MAX_DIAS_UDI)
+            _, anterior = valores_as_of(fechas, udi_fechas, udi, desfase=365, max_dias=MAX_DIAS_UDI)
+            inflacion = (actual / anterior - 1) * 100
+
+        faltantes = np.isnan(inflacion)
+        inpc_fechas, inpc = cargar_indice(conn, INPC, desde, hasta)
+        if faltantes.any() and len(inpc):
+            # Último INPC publicado y el del mismo mes un año antes
+            idx, actual = valores_as_of(
+                fechas, inpc_fechas, inpc, desfase=DESFASE_INPC, max_dias=MAX_DIAS_INPC
+            )
+            fecha_actual = inpc_fechas[np.clip(idx, 0, None)]
+            _, anterior = valores_as_of(fecha_actual, inpc_fechas, inpc, desfase=365, max_dias=MAX_DIAS_INPC)
+            inflacion = np.where(faltantes, (actual / anterior - 1) * 100, inflacion)
+
+    return inflacion
+
+
+def calcular_tasas_reales(conn: psycopg.Connection, registros: list[dict]) -> None:
+    """
+    Agrega inflacion y tasa_real (%) a registros de CETES con tasa y
+    fecha_subasta. Sin índices para la fecha, quedan en None.
+    """
+    if not registros:
+        return
+
+    fechas = np.array([r["fecha_subasta"] for r in registros], dtype="datetime64[D]")
+    tasa = np.array([float(r["tasa"]) for r in registros], dtype=np.float64)
+    inflacion = inflacion_anual(conn, fechas)
+    with np.errstate(invalid="ignore"):
+        tasa_real = ((1 + tasa / 100) / (1 + inflacion / 100) - 1) * 100
+
+    for i, registro in enumerate(registros):
+        registro["inflacion"] = None if np.isnan(inflacion[i]) else round(float(inflacion[i]), 2)
+        registro["tasa_real"] = None if np.isnan(tasa_real[i]) else round(float(tasa_real[i]), 2)
+
+
+def actualizar_cetes_reales(conn: psycopg.Connection, desde: date) -> int:
+    """
+    Recalcula inflación y tasa real de las subastas desde una fecha, dentro
+    de la transacción actual (sin commit).
+
+    Returns:
+        Registros actualizados
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, tasa, fecha_subasta FROM cetes WHERE fecha_subasta >= %s", (desde,))
+        filas = cur.fetchall()
+        if not filas:
+            return 0
+
+        calcular_tasas_reales(conn, filas)
+
+        cur.execute("""
+            CREATE TEMP TABLE _cetes_reales (
+                id INTEGER, inflacion NUMERIC, tasa_real NUMERIC
+            ) ON COMMIT DROP
+        """)
+        with cur.copy("COPY _cetes_reales (id, inflacion, tasa_real) FROM STDIN") as copy:
+            for fila in filas:
+                copy.write_row([fila["id"], fila["inflacion"], fila["tasa_real"]])
+
+        cur.execute("""
+            UPDATE cetes c SET inflacion = r.inflacion, tasa_real = r.tasa_real
+            FROM _cetes_reales r
+            WHERE c.id = r.id
+        """)
+        return cur.rowcount
@@ -0,0 +1,401 @@
+"""
+Pipeline común de los collectors.
+
+Cada collector define sólo cómo obtener, interpretar y validar sus datos;
+el pipeline los encadena como generadores:
+
+    fetch -> parse -> validate -> batch -> screen -> load
+
+- fetch: una petición por elemento, con a lo sumo COLLECTOR_FETCH_CONCURRENCY
+  en curso. Un error en un elemento se registra y no detiene a los demás;
+  DetenerPipeline deja de pedir elementos nuevos (ej. límite de API).
+- parse: convierte cada respuesta en registros (dicts).
+- validate: normaliza un registro o lo descarta (None).
+- batch: agrupa registros en lotes de COLLECTOR_BATCH_SIZE.
+- screen: manda a cuarentena los valores anómalos del lote contra la
+  historia reciente de cada serie (FiltroAnomalias, opcional).
+- load: carga cada lote con COPY en una sola transacción (BulkLoader) y
+  notifica los registros nuevos antes del commit.
+
+Cada etapa acumula tiempo y contadores, que se registran en Prometheus y
+en el log al terminar.
+
+run_async() ejecuta las mismas etapas dentro de un event loop con un fetch
+async (httpx): las peticiones son tareas de asyncio en lugar de hilos, y el
+parseo y la carga de cada lote (CPU y psycopg síncrono) van a
+asyncio.to_thread mientras siguen las descargas.
+
+Uso:
+    pipeline = Pipeline("banxico", fetch=..., parse=..., validate=..., loader=...)
+    insertados = pipeline.run(elementos)
+    insertados = await pipeline.run_async(elementos)  # fetch async
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator
+
+import psycopg
+from loguru import logger
+from psycopg import sql
+
+from app.collectors.anomalias import FiltroAnomalias
+from app.collectors.ejecuciones import registrar_pipeline
+from app.config import get_settings
+from app.database import get_connection, notify_update
+from app.metrics import record_collector_run, record_pipeline_stage
+
+
+ETAPAS = ("fetch", "parse", "validate", "screen", "load")
+
+
+class DetenerPipeline(Exception):
+    """La fuente no admite más peticiones; se procesa lo ya obtenido."""
+    pass
+
+
+@dataclass
+class EstadisticasEtapa:
+    """Contadores y tiempo acumulado de una etapa."""
+    ok: int = 0
+    errores: int = 0
+    segundos: float = 0.0
+
+
+class BulkLoader:
+    """
+    Carga lotes de registros con COPY a una tabla temporal y un solo
+    INSERT ... SELECT hacia la tabla destino.
+
+    Args:
+        tabla: Tabla destino
+        columnas: Columnas a cargar (claves de cada registro)
+        on_conflict: Cláusula ON CONFLICT (vacía = INSERT simple)
+        returning: Columnas de RETURNING que se notifican como datos nuevos
+    """
+
+    def __init__(self, tabla: str, columnas: list[str], on_conflict: str = "", returning: str = ""):
+        self.tabla = tabla
+        self.columnas = columnas
+        cols = sql.SQL(", ").join(sql.Identifier(c) for c in columnas)
+        staging = sql.Identifier(f"_carga_{tabla}")
+
+        self._crear = sql.SQL(
+            "CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {cols} FROM {tabla} WITH NO DATA"
+        ).format(staging=staging, cols=cols, tabla=sql.Identifier(tabla))
+        self._copy = sql.SQL("COPY {staging} ({cols}) FROM STDIN").format(staging=staging, cols=cols)
+        self._insert = sql.SQL(
+            "INSERT INTO {tabla} ({cols}) SELECT {cols} FROM {staging} {on_conflict} {returning}"
+        ).format(
+            tabla=sql.Identifier(tabla),
+            cols=cols,
+            staging=staging,
+            on_conflict=sql.SQL(on_conflict),
+            returning=sql.SQL(f"RETURNING {returning}" if returning else ""),
+        )
+        self.returning = bool(returning)
+
+    def load(self, conn: psycopg.Connection, registros: list[dict]) -> tuple[int, list[dict]]:
+        """
+        Carga un lote dentro de la transacción actual (sin commit).
+
+        Returns:
+            (filas afectadas, filas de RETURNING)
+        """
+        with conn.cursor() as cur:
+            cur.execute(self._crear)
+            with cur.copy(self._copy) as copy:
+                for registro in registros:
+                    copy.write_row([registro.get(c) for c in self.columnas])
+            cur.execute(self._insert)
+            filas = cur.fetchall() if self.returning else []
+            return cur.rowcount, filas
+
+
+class Pipeline:
+    """
+    Encadena las etapas de un collector.
+
+    Args:
+        fuente: Nombre de la fuente (etiqueta de métricas)
+        fetch: fetch(elemento) -> respuesta cruda (corrutina con run_async)
+        parse: parse(elemento, respuesta) -> registros
+        loader: BulkLoader de la tabla destino
+        validate: validate(registro) -> registro normalizado o None
+        batch_size: Registros por lote (default COLLECTOR_BATCH_SIZE)
+        concurrencia: Peticiones simultáneas (default COLLECTOR_FETCH_CONCURRENCY)
+        notifica: Fuente con la que se notifican los datos nuevos (default fuente)
+        filtro: Detección de anomalías antes de cargar cada lote
+    """
+
+    def __init__(
+        self,
+        fuente: str,
+        fetch: Callable[[Any], Any],
+        parse: Callable[[Any, Any], Iterable[dict]],
+        loader: BulkLoader,
+        validate: Callable[[dict], dict | None] | None = None,
+        batch_size: int | None = None,
+        concurrencia: int | None = None,
+        notifica: str | None = None,
+        filtro: FiltroAnomalias | None = None,
+    ):
+        settings = get_settings()
+        self.fuente = fuente
+        self.fetch = fetch
+        self.parse = parse
+        self.loader = loader
+        self.validate = validate
+        self.batch_size = batch_size or settings.COLLECTOR_BATCH_SIZE
+        self.concurrencia = concurrencia or settings.COLLECTOR_FETCH_CONCURRENCY
+        self.notifica = notifica or fuente
+        self.filtro = filtro if settings.ANOMALY_SCREENING else None
+        self.estadisticas = {etapa: EstadisticasEtapa() for etapa in ETAPAS}
+
+    def run(self, elementos: Iterable) -> int:
+        """
+        Ejecuta el pipeline completo.
+
+        Returns:
+            Registros insertados o actualizados
+        """
+        self.estadisticas = {etapa: EstadisticasEtapa() for etapa in ETAPAS}
+        inicio = time.perf_counter()
+
+        registros = self._parse(self._fetch(elementos))
+        if self.validate:
+            registros = self._validate(registros)
+        insertados = self._load(self._batch(registros))
+        self._registrar(time.perf_counter() - inicio, insertados)
+        return insertados
+
+    async def run_async(self, elementos: Iterable) -> int:
+        """
+        Ejecuta el pipeline completo con un fetch async.
+
+        Returns:
+            Registros insertados o actualizados
+        """
+        self.estadisticas = {etapa: EstadisticasEtapa() for etapa in ETAPAS}
+        inicio = time.perf_counter()
+        insertados = 0
+        lote = []
+
+        async for elemento, respuesta in self._fetch_async(elementos):
+            # parse/validate (ej. HTML con lxml) fuera del event loop
+            registros = await asyncio.to_thread(self._procesar, elemento, respuesta)
+            for registro in registros:
+                lote.append(registro)
+                if len(lote) >= self.batch_size:
+                    insertados += await asyncio.to_thread(self._load, [lote])
+                    lote = []
+        if lote:
+            insertados += await asyncio.to_thread(self._load, [lote])
+
+        self._registrar(time.perf_counter() - inicio, insertados)
+        return insertados
+
+    def _procesar(self, elemento: Any, respuesta: Any) -> list[dict]:
+        """parse y validate de una sola respuesta."""
+        registros = self._parse(iter([(elemento, respuesta)]))
+        if self.validate:
+            registros = self._validate(registros)
+        return list(registros)
+
+    def _registrar(self, duracion: float, insertados: int) -> None:
+        """Registra la ejecución en Prometheus, en la ejecución del collector y en el log."""
+        record_collector_run(self.fuente, duracion, insertados)
+        registrar_pipeline(insertados, {etapa: est.errores for etapa, est in self.estadisticas.items()})
+        for etapa, est in self.estadisticas.items():
+            record_pipeline_stage(self.fuente, etapa, est.segundos, est.ok, est.errores)
+
+        resumen = " | ".join(
+            f"{etapa} {est.ok} ok/{est.errores} err {est.segundos:.2f} s"
+            for etapa, est in self.estadisticas.items()
+        )
+        logger.info(f"Pipeline {self.fuente}: {insertados} registros en {duracion:.2f} s ({resumen})")
+
+    def _fetch_timed(self, elemento: Any) -> tuple[Any, float]:
+        """Ejecuta fetch y regresa la respuesta junto con su duración."""
+        inicio = time.perf_counter()
+        respuesta = self.fetch(elemento)
+        return respuesta, time.perf_counter() - inicio
+
+    def _fetch(self, elementos: Iterable) -> Iterator[tuple[Any, Any]]:
+        """Obtiene cada elemento con concurrencia acotada, en orden de entrada."""
+        est = self.estadisticas["fetch"]
+        elementos = iter(elementos)
+        pendientes = deque()
+        agotado = False
+
+        with ThreadPoolExecutor(
+            max_workers=self.concurrencia, thread_name_prefix=f"fetch-{self.fuente}"
+        ) as executor:
+            while True:
+                while not agotado and len(pendientes) < self.concurrencia:
+                    try:
+                        elemento = next(elementos)
+                    except StopIteration:
+                        agotado = True
+                        break
+                    # Cada hilo con el contexto de quien corre el pipeline
+                    # (ejecución actual del collector)
+                    future = executor.submit(contextvars.copy_context().run, self._fetch_timed, elemento)
+                    pendientes.append((elemento, future))
+
+                if not pendientes:
+                    return
+
+                elemento, future = pendientes.popleft()
+                try:
+                    respuesta, segundos = future.result()
+                except DetenerPipeline as e:
+                    logger.warning(f"{self.fuente}: {e}; no se pedirán más elementos")
+                    est.errores += 1
+                    agotado = True
+                    continue
+                except Exception as e:
+                    logger.error(f"{self.fuente}: error obteniendo {elemento}: {e}")
+                    est.errores += 1
+                    continue
+
+                est.ok += 1
+                est.segundos += segundos
+                yield elemento, respuesta
+
+    async def _fetch_timed_async(self, elemento: Any) -> tuple[Any, float]:
+        """Espera el fetch async y regresa la respuesta junto con su duración."""
+        inicio = time.perf_counter()
+        respuesta = await self.fetch(elemento)
+        return respuesta, time.perf_counter() - inicio
+
+    async def _fetch_async(self, elementos: Iterable) -> AsyncIterator[tuple[Any, Any]]:
+        """Como _fetch, con tareas de asyncio en lugar de hilos."""
+        est = self.estadisticas["fetch"]
+        elementos = iter(elementos)
+        pendientes = deque()
+        agotado = False
+
+        try:
+            while True:
+                while not agotado and len(pendientes) < self.concurrencia:
+                    try:
+                        elemento = next(elementos)
+                    except StopIteration:
+                        agotado = True
+                        break
+                    tarea = asyncio.create_task(self._fetch_timed_async(elemento))
+                    pendientes.append((elemento, tarea))
+
+                if not pendientes:
+                    return
+
+                elemento, tarea = pendientes.popleft()
+                try:
+                    respuesta, segundos = await tarea
+                except DetenerPipeline as e:
+                    logger.warning(f"{self.fuente}: {e}; no se pedirán más elementos")
+                    est.errores += 1
+                    agotado = True
+                    continue
+                except Exception as e:
+                    logger.error(f"{self.fuente}: error obteniendo {elemento}: {e}")
+                    est.errores += 1
+                    continue
+
+                est.ok += 1
+                est.segundos += segundos
+                yield elemento, respuesta
+        finally:
+            # Cancelación o error del consumidor: no dejar peticiones huérfanas
+            for _, tarea in pendientes:
+                tarea.cancel()
+
+    def _parse(self, respuestas: Iterator[tuple[Any, Any]]) -> Iterator[dict]:
+        """Convierte cada respuesta en registros."""
+        est = self.estadisticas["parse"]
+        for elemento, respuesta in respuestas:
+            inicio = time.perf_counter()
+            try:
+                registros = list(self.parse(elemento, respuesta))
+            except Exception as e:
+                logger.warning(f"{self.fuente}: error interpretando {elemento}: {e}")
+                est.errores += 1
+                continue
+            finally:
+                est.segundos += time.perf_counter() - inicio
+
+            est.ok += len(registros)
+            yield from registros
+
+    def _validate(self, registros: Iterator[dict]) -> Iterator[dict]:
+        """Normaliza cada registro y descarta los inválidos."""
+        est = self.estadisticas["validate"]
+        for registro in registros:
+            inicio = time.perf_counter()
+            try:
+                valido = self.validate(registro)
+            except (ValueError, TypeError, ArithmeticError) as e:
+                logger.warning(f"{self.fuente}: registro inválido {registro}: {e}")
+                valido = None
+            est.segundos += time.perf_counter() - inicio
+
+            if valido is None:
+                est.errores += 1
+                continue
+            est.ok += 1
+            yield valido
+
+    def _batch(self, registros: Iterator[dict]) -> Iterator[list[dict]]:
+        """Agrupa registros en lotes de batch_size."""
+        lote = []
+        for registro in registros:
+            lote.append(registro)
+            if len(lote) >= self.batch_size:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+    def _screen(self, conn: psycopg.Connection, lote: list[dict]) -> list[dict]:
+        """Manda a cuarentena los registros anómalos y regresa los aceptados."""
+        est = self.estadisticas["screen"]
+        inicio = time.perf_counter()
+        aceptados, sospechosos = self.filtro.separar(conn, lote)
+        if sospechosos:
+            self.filtro.poner_en_cuarentena(conn, self.fuente, sospechosos)
+        est.segundos += time.perf_counter() - inicio
+        est.ok += len(aceptados)
+        est.errores += len(sospechosos)
+        return aceptados
+
+    def _load(self, lotes: Iterable[list[dict]]) -> int:
+        """Revisa y carga cada lote en su propia transacción."""
+        est = self.estadisticas["load"]
+        insertados = 0
+
+        for lote in lotes:
+            with get_connection() as conn:
+                try:
+                    if self.filtro:
+                        lote = self._screen(conn, lote)
+                    inicio = time.perf_counter()
+                    afectados, filas = self.loader.load(conn, lote) if lote else (0, [])
+                    if filas:
+                        notify_update(conn, self.notifica, filas)
+                    conn.commit()
+                except psycopg.Error as e:
+                    conn.rollback()
+                    logger.error(f"{self.fuente}: error cargando lote de {len(lote)} registros: {e}")
+                    est.errores += len(lote)
+                    continue
+
+            est.segundos += time.perf_counter() - inicio
+            est.ok += afectados
+            insertados += afectados
+
+        return insertados
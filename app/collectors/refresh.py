@@ -0,0 +1,104 @@
+"""
+Actualización de todas las fuentes en paralelo dentro de un event loop.
+
+Las versiones async de los collectors comparten el cliente httpx
+(cliente_http) y corren al mismo tiempo con asyncio.gather: una
+actualización completa tarda lo que la fuente más lenta y no la suma de
+todas. El error de una fuente se registra y no detiene a las demás.
+
+Los procesos de app.collectors.worker ejecutan así los jobs de la cola
+(tareas_fuentes); para una actualización completa manual:
+
+    python -m app.collectors.refresh --dias 30
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+from app.collectors.cliente_http import close_http_client
+
+
+async def refrescar(tareas: dict[str, Callable[[], Awaitable[int]]]) -> dict[str, dict]:
+    """
+    Ejecuta los collectors en paralelo.
+
+    Args:
+        tareas: Fuente -> función que crea la corrutina del collector
+
+    Returns:
+        Por fuente: insertados, segundos y error (si falló)
+    """
+    async def ejecutar(fuente: str, tarea: Callable[[], Awaitable[int]]) -> dict:
+        inicio = time.perf_counter()
+        try:
+            insertados = await tarea()
+        except Exception as e:
+            logger.exception(f"{fuente}: error en la actualización: {e}")
+            return {"insertados": 0, "segundos": round(time.perf_counter() - inicio, 3), "error": str(e)}
+        return {"insertados": insertados, "segundos": round(time.perf_counter() - inicio, 3)}
+
+    resultados = await asyncio.gather(*(ejecutar(f, t) for f, t in tareas.items()))
+    return dict(zip(tareas, resultados))
+
+
+def tareas_fuentes(dias: int = 30) -> dict[str, Callable[[], Awaitable[int]]]:
+    """Collectors de todas las fuentes con la configuración de settings."""
+    # Los collectors importan requests/bs4 y validan sus API keys al crearse:
+    # una fuente sin configurar falla sola dentro de refrescar()
+    from app.collectors.banxico_collector import BanxicoCollector
+    from app.collectors.etf_collector import ETFCollector
+    from app.collectors.sofipo_scraper import SofipoScraper
+
+    return {
+        "banxico": lambda: BanxicoCollector().collect_async(dias),
+        "etfs": lambda: ETFCollector().collect_async(),
+        "sofipos": lambda: SofipoScraper().collect_async(),
+    }
+
+
+async def refresh_all(dias: int = 30) -> dict[str, dict]:
+    """
+    Actualiza todas las fuentes en paralelo.
+
+    Args:
+        dias: Días hacia atrás de CETES, FIX e inflación
+
+    Returns:
+        Resultado por fuente (ver refrescar)
+    """
+    inicio = time.perf_counter()
+    resultados = await refrescar(tareas_fuentes(dias))
+    total = sum(r["insertados"] for r in resultados.values())
+    logger.info(f"Actualización completa: {total} registros en {time.perf_counter() - inicio:.2f} s")
+    return resultados
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Actualiza todas las fuentes en paralelo")
+    parser.add_argument("--dias", type=int, default=30, help="Días hacia atrás de las series de Banxico")
+    args = parser.parse_args()
+
+    from app.database import close_pool
+
+    async def ejecutar() -> dict[str, dict]:
+        try:
+            return await refresh_all(args.dias)
+        finally:
+            await close_http_client()
+
+    try:
+        resultados = asyncio.run(ejecutar())
+    finally:
+        close_pool()
+
+    for fuente, resultado in resultados.items():
+        estado = f"error: {resultado['error']}" if "error" in resultado else f"{resultado['insertados']} registros"
+        print(f"{fuente:<10} {estado} ({resultado['segundos']:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,30 +5,72 @@ Las SOFIPOs (Sociedades Financieras Populares) son instituciones de ahorro
 reguladas que ofrecen rendimientos generalmente más altos que los bancos.
 """
 
-import time
+import re
 from datetime import date
 from decimal import Decimal, InvalidOperation
 
+import httpx
+import psycopg
 import requests
-from bs4 import BeautifulSoup
 from loguru import logger
 
-from app.database import get_connection
+from app.collectors.anomalias import FiltroAnomalias
+from app.collectors.cliente_http import get_http_client
+from app.collectors.ejecuciones import ejecucion, ejecucion_async, registrar_respuesta
+from app.collectors.pipeline import BulkLoader, Pipeline
+from app.config import settings
+from app.metrics import track_external_call
 
 
-URL_SOFIPOS = "https://www.tasas.mx/sofipos"
-
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
     "Accept-Language": "es-MX,es;q=0.9,en;q=0.8",
 }
 
+# Encabezados de columnas de tasa por plazo, ej. "90 días"
+PATRON_PLAZO = re.compile(r"(\d+)\s*d[ií]as?", re.IGNORECASE)
+
+
+class SofipoLoader(BulkLoader):
+    """
+    Carga las SOFIPOs del lote y, en la misma transacción, sus tasas por
+    plazo en sofipo_plazos (un COPY con el id de cada fila insertada).
+    """
+
+    def load(self, conn: psycopg.Connection, registros: list[dict]) -> tuple[int, list[dict]]:
+        afectados, filas = super().load(conn, registros)
+        ids = {fila["nombre"]: fila["id"] for fila in filas}
+
+        with conn.cursor() as cur:
+            with cur.copy(
+                "COPY sofipo_plazos (sofipo_id, plazo, tasa, fecha_actualizacion) FROM STDIN"
+            ) as copy:
+                for registro in registros:
+                    sofipo_id = ids.get(registro["nombre"])
+                    if sofipo_id is None:
+                        continue
+                    for plazo, tasa in registro.get("plazos", {}).items():
+                        copy.write_row([sofipo_id, plazo, tasa, registro["fecha_actualizacion"]])
+
+        return afectados, filas
+
+
+SOFIPOS_LOADER = SofipoLoader(
+    "sofipos",
+    ["nombre", "gat_nominal", "gat_real", "fecha_actualizacion"],
+    returning="id, nombre, gat_nominal, gat_real",
+)
+
+# Anomalías: z-score contra la ventana o salto de más de 30% contra la GAT anterior
+SOFIPOS_FILTRO = FiltroAnomalias("sofipos", "nombre", "gat_nominal", "fecha_actualizacion", umbral_salto=0.3)
+
 
 class SofipoScraper:
     """Scraper para datos de SOFIPOs."""
 
-    def __init__(self):
+    def __init__(self, url: str | None = None):
+        self.url = url or settings.SOFIPOS_URL
         self.session = requests.Session()
         self.session.headers.update(HEADERS)
 
@@ -44,13 +86,28 @@ class SofipoScraper:
         """
         try:
             logger.debug(f"Obteniendo: {url}")
-            response = self.session.get(url, timeout=30)
+            with track_external_call("sofipos"):
+                response = self.session.get(url, timeout=30)
+            registrar_respuesta("sofipos", response.content)
             response.raise_for_status()
             return response.text
         except requests.RequestException as e:
             logger.error(f"Error obteniendo {url}: {e}")
             return None
 
+    async def fetch_page_async(self, url: str) -> str | None:
+        """Como fetch_page, con el cliente async compartido."""
+        try:
+            logger.debug(f"Obteniendo: {url}")
+            with track_external_call("sofipos"):
+                response = await get_http_client().get(url, headers=HEADERS)
+            registrar_respuesta("sofipos", response.content)
+            response.raise_for_status()
+            return response.text
+        except httpx.HTTPError as e:
+            logger.error(f"Error obteniendo {url}: {e}")
+            return None
+
     def parse_decimal(self, text: str) -> Decimal | None:
         """Convierte texto a Decimal, manejando formatos varios."""
         if not text:
@@ -78,6 +135,9 @@ class SofipoScraper:
         Returns:
             Lista de diccionarios con datos de SOFIPOs
         """
+        # bs4/lxml se importan sólo al parsear HTML
+        from bs4 import BeautifulSoup
+
         soup = BeautifulSoup(html, "lxml")
         sofipos = []
 
@@ -94,9 +154,19 @@ class SofipoScraper:
             logger.warning("No se encontró tabla de SOFIPOs")
             return []
 
-        filas = tabla.find_all("tr")[1:]  # Saltar header
+        filas = tabla.find_all("tr")
+        if not filas:
+            return []
+
+        # Columnas adicionales de tasa por plazo ("30 días", "90 días", ...)
+        encabezados = [c.get_text(strip=True) for c in filas[0].find_all(["td", "th"])]
+        columnas_plazo = {
+            i: int(m.group(1))
+            for i, texto in enumerate(encabezados)
+            if i > 2 and (m := PATRON_PLAZO.search(texto))
+        }
 
-        for fila in filas:
+        for fila in filas[1:]:
             celdas = fila.find_all(["td", "th"])
             if len(celdas) < 3:
                 continue
@@ -106,11 +176,19 @@ class SofipoScraper:
                 gat_nominal = self.parse_decimal(celdas[1].get_text(strip=True))
                 gat_real = self.parse_decimal(celdas[2].get_text(strip=True)) if len(celdas) > 2 else None
 
+                plazos = {}
+                for i, plazo in columnas_plazo.items():
+                    if i < len(celdas):
+                        tasa = self.parse_decimal(celdas[i].get_text(strip=True))
+                        if tasa is not None:
+                            plazos[plazo] = tasa
+
                 if nombre and gat_nominal:
                     sofipos.append({
                         "nombre": nombre,
                         "gat_nominal": gat_nominal,
                         "gat_real": gat_real,
+                        "plazos": plazos,
                     })
             except Exception as e:
                 logger.warning(f"Error parseando fila: {e}")
@@ -129,7 +207,6 @@ class SofipoScraper:
 
                 # Buscar porcentajes en el card
                 text = card.get_text()
-                import re
                 porcentajes = re.findall(r"(\d+[.,]\d+)\s*%", text)
 
                 if nombre and porcentajes:
@@ -147,48 +224,36 @@ class SofipoScraper:
 
         return sofipos
 
-    def save_to_db(self, sofipos: list[dict]) -> int:
-        """
-        Guarda los datos de SOFIPOs en la base de datos.
-
-        Args:
-            sofipos: Lista de diccionarios con datos de SOFIPOs
-
-        Returns:
-            Número de registros insertados
-        """
-        if not sofipos:
-            return 0
-
-        insertados = 0
-        fecha_hoy = date.today()
-
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                for sofipo in sofipos:
-                    try:
-                        cur.execute("""
-                            INSERT INTO sofipos (nombre, gat_nominal, gat_real, fecha_actualizacion)
-                            VALUES (%s, %s, %s, %s)
-                            RETURNING id
-                        """, (
-                            sofipo["nombre"],
-                            sofipo["gat_nominal"],
-                            sofipo.get("gat_real"),
-                            fecha_hoy,
-                        ))
-
-                        insertados += 1
-
-                    except Exception as e:
-                        logger.error(f"Error insertando SOFIPO {sofipo.get('nombre')}: {e}")
-                        conn.rollback()
-                        continue
-
-                conn.commit()
-
-        logger.info(f"SOFIPOs: {insertados} registros insertados")
-        return insertados
+    def validate_sofipo(self, sofipo: dict) -> dict | None:
+        """Descarta registros sin nombre o GAT y agrega la fecha de hoy."""
+        if not sofipo.get("nombre") or sofipo.get("gat_nominal") is None:
+            return None
+        return {
+            "nombre": sofipo["nombre"],
+            "gat_nominal": sofipo["gat_nominal"],
+            "gat_real": sofipo.get("gat_real"),
+            "fecha_actualizacion": date.today(),
+            "plazos": {
+                int(plazo): Decimal(tasa)
+                for plazo, tasa in sofipo.get("plazos", {}).items()
+                if tasa is not None and int(plazo) > 0
+            },
+        }
+
+    def _pipeline(self, fetch, parse) -> Pipeline:
+        """Pipeline de SOFIPOs con el fetch dado (síncrono o async)."""
+        return Pipeline(
+            "sofipos",
+            fetch=fetch,
+            parse=parse,
+            validate=self.validate_sofipo,
+            loader=SOFIPOS_LOADER,
+            filtro=SOFIPOS_FILTRO,
+        )
+
+    def _parse_html(self, url: str, html: str | None) -> list[dict]:
+        """parse del pipeline de scrape (página vacía = sin registros)."""
+        return self.parse_sofipos(html) if html else []
 
     def collect(self) -> int:
         """
@@ -201,10 +266,36 @@ class SofipoScraper:
 
         # Usar datos actualizados de SOFIPOs (fuente: CONDUSEF/Banxico públicos)
         # TODO: Implementar scraper cuando la página tenga estructura estable
-        sofipos = self._get_sofipos_data()
-        logger.info(f"SOFIPOs a procesar: {len(sofipos)}")
+        # (ver scrape(): fetch_page + parse_sofipos sobre self.url)
+        pipeline = self._pipeline(lambda _: self._get_sofipos_data(), lambda _, sofipos: sofipos)
+        with ejecucion("sofipos"):
+            return pipeline.run([self.url])
+
+    async def collect_async(self) -> int:
+        """Como collect, dentro del event loop."""
+        logger.info("Iniciando recopilación de SOFIPOs...")
+
+        async def datos(_):
+            return self._get_sofipos_data()
+
+        pipeline = self._pipeline(datos, lambda _, sofipos: sofipos)
+        async with ejecucion_async("sofipos"):
+            return await pipeline.run_async([self.url])
+
+    def scrape(self) -> int:
+        """
+        Recopila SOFIPOs desde la página (self.url) y las guarda.
+
+        Returns:
+            Total de registros insertados
+        """
+        with ejecucion("sofipos"):
+            return self._pipeline(self.fetch_page, self._parse_html).run([self.url])
 
-        return self.save_to_db(sofipos)
+    async def scrape_async(self) -> int:
+        """Como scrape, con el cliente async compartido."""
+        async with ejecucion_async("sofipos"):
+            return await self._pipeline(self.fetch_page_async, self._parse_html).run_async([self.url])
 
     def _get_sofipos_data(self) -> list[dict]:
         """
@@ -212,18 +303,49 @@ class SofipoScraper:
         Fuente: Datos públicos de CONDUSEF y sitios oficiales.
 
         Estos datos se actualizan manualmente o mediante scraping cuando esté disponible.
+        plazos: tasa anual por plazo en días; la GAT corresponde al plazo más largo.
         """
         return [
-            {"nombre": "Supertasas", "gat_nominal": Decimal("14.20"), "gat_real": Decimal("9.80")},
-            {"nombre": "Kubo Financiero", "gat_nominal": Decimal("13.50"), "gat_real": Decimal("9.10")},
-            {"nombre": "Financiera Sustentable", "gat_nominal": Decimal("12.80"), "gat_real": Decimal("8.50")},
-            {"nombre": "CAME", "gat_nominal": Decimal("12.00"), "gat_real": Decimal("7.70")},
-            {"nombre": "Libertad Servicios Financieros", "gat_nominal": Decimal("11.80"), "gat_real": Decimal("7.50")},
-            {"nombre": "Te Creemos", "gat_nominal": Decimal("11.50"), "gat_real": Decimal("7.20")},
-            {"nombre": "Caja Popular Mexicana", "gat_nominal": Decimal("10.80"), "gat_real": Decimal("6.60")},
-            {"nombre": "Caja Morelia Valladolid", "gat_nominal": Decimal("10.50"), "gat_real": Decimal("6.30")},
-            {"nombre": "FINSUS", "gat_nominal": Decimal("10.20"), "gat_real": Decimal("6.00")},
-            {"nombre": "ConSer", "gat_nominal": Decimal("9.80"), "gat_real": Decimal("5.60")},
+            {
+                "nombre": "Supertasas", "gat_nominal": Decimal("14.20"), "gat_real": Decimal("9.80"),
+                "plazos": {30: Decimal("10.50"), 90: Decimal("12.00"), 180: Decimal("13.20"), 360: Decimal("14.20")},
+            },
+            {
+                "nombre": "Kubo Financiero", "gat_nominal": Decimal("13.50"), "gat_real": Decimal("9.10"),
+                "plazos": {30: Decimal("10.00"), 90: Decimal("11.50"), 180: Decimal("12.60"), 360: Decimal("13.50")},
+            },
+            {
+                "nombre": "Financiera Sustentable", "gat_nominal": Decimal("12.80"), "gat_real": Decimal("8.50"),
+                "plazos": {30: Decimal("9.80"), 90: Decimal("11.00"), 180: Decimal("12.00"), 360: Decimal("12.80")},
+            },
+            {
+                "nombre": "CAME", "gat_nominal": Decimal("12.00"), "gat_real": Decimal("7.70"),
+                "plazos": {30: Decimal("9.50"), 90: Decimal("10.50"), 180: Decimal("11.30"), 360: Decimal("12.00")},
+            },
+            {
+                "nombre": "Libertad Servicios Financieros", "gat_nominal": Decimal("11.80"), "gat_real": Decimal("7.50"),
+                "plazos": {30: Decimal("9.20"), 90: Decimal("10.30"), 180: Decimal("11.00"), 360: Decimal("11.80")},
+            },
+            {
+                "nombre": "Te Creemos", "gat_nominal": Decimal("11.50"), "gat_real": Decimal("7.20"),
+                "plazos": {30: Decimal("9.00"), 90: Decimal("10.00"), 180: Decimal("10.80"), 360: Decimal("11.50")},
+            },
+            {
+                "nombre": "Caja Popular Mexicana", "gat_nominal": Decimal("10.80"), "gat_real": Decimal("6.60"),
+                "plazos": {30: Decimal("8.50"), 90: Decimal("9.40"), 180: Decimal("10.10"), 360: Decimal("10.80")},
+            },
+            {
+                "nombre": "Caja Morelia Valladolid", "gat_nominal": Decimal("10.50"), "gat_real": Decimal("6.30"),
+                "plazos": {30: Decimal("8.30"), 90: Decimal("9.20"), 180: Decimal("9.90"), 360: Decimal("10.50")},
+            },
+            {
+                "nombre": "FINSUS", "gat_nominal": Decimal("10.20"), "gat_real": Decimal("6.00"),
+                "plazos": {30: Decimal("9.00"), 90: Decimal("9.60"), 180: Decimal("10.00"), 360: Decimal("10.20")},
+            },
+            {
+                "nombre": "ConSer", "gat_nominal": Decimal("9.80"), "gat_real": Decimal("5.60"),
+                "plazos": {30: Decimal("7.80"), 90: Decimal("8.60"), 180: Decimal("9.20"), 360: Decimal("9.80")},
+            },
         ]
 
 
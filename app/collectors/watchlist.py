@@ -0,0 +1,361 @@
+"""
+Watchlist de ETFs en PostgreSQL (tabla etf_watchlist) y planificador de
+actualizaciones.
+
+Alpha Vantage da pocas llamadas por día y la watchlist puede tener miles
+de tickers: cada ejecución del collector pide sólo los de mayor
+prioridad, en lugar de recorrer una lista fija en orden (donde la cola de
+la lista nunca se actualizaba). La prioridad de un ticker es
+
+    peso × antigüedad × (1 + ETF_PESO_DEMANDA × ln(1 + demanda))
+         × (1 + ETF_PESO_VOLATILIDAD × volatilidad)
+
+- antigüedad: días desde su último precio guardado, con tope en
+  ETF_ANTIGUEDAD_MAXIMA_HORAS (un ticker sin precio tiene el tope).
+- demanda: consultas a /api/fondos/{ticker} (las cuenta app.demanda), que
+  pierden la mitad de su valor cada ETF_DEMANDA_VIDA_MEDIA_HORAS.
+- volatilidad: desviación estándar del cambio diario (%) de sus últimos
+  ETF_VOLATILIDAD_VENTANA precios; un precio volátil envejece más rápido.
+- peso: multiplicador manual por ticker (POST /api/admin/watchlist).
+
+No se planifican los tickers con un precio de hace menos de
+ETF_ANTIGUEDAD_MINIMA_HORAS, ni los que fallaron (planificados y sin
+precio nuevo) en las últimas ETF_REINTENTO_HORAS. El orden lo hace
+PostgreSQL (ORDER BY prioridad LIMIT n, un top-N sobre la tabla) y los
+tickers elegidos se marcan con FOR UPDATE SKIP LOCKED, así que dos
+ejecuciones simultáneas no piden el mismo ticker.
+
+El límite diario de Alpha Vantage se cuenta en la tabla api_llamadas (una
+fila por día), no en cada nodo: el plan reserva sus llamadas en la misma
+transacción en que marca los tickers, así que varios nodos se reparten un
+solo presupuesto.
+
+Uso:
+    python -m app.collectors.watchlist plan --limit 25
+    python -m app.collectors.watchlist importar tickers.csv   # ticker,nombre,tipo,mercado[,peso]
+"""
+
+import argparse
+import csv
+import math
+from pathlib import Path
+from typing import Iterable
+
+import psycopg
+from loguru import logger
+
+from app.config import get_settings
+
+
+# Demanda a la fecha de la consulta (con el decaimiento desde demanda_at)
+DEMANDA_SQL = """
+    demanda * POWER(0.5, EXTRACT(EPOCH FROM NOW() - demanda_at) / 3600 / %(vida_media)s)
+"""
+
+PRIORIDAD_SQL = f"""
+    peso
+    * LEAST(COALESCE(EXTRACT(EPOCH FROM NOW() - actualizado_at) / 3600, %(max_horas)s), %(max_horas)s) / 24
+    * (1 + %(peso_demanda)s * LN(1 + {DEMANDA_SQL}))
+    * (1 + %(peso_volatilidad)s * COALESCE(volatilidad, 0))
+"""
+
+# Tickers que se pueden pedir ahora
+ELEGIBLE_SQL = """
+    activo
+    AND (actualizado_at IS NULL OR actualizado_at < NOW() - make_interval(secs => %(min_horas)s * 3600))
+    AND (
+        intentado_at IS NULL
+        OR intentado_at < NOW() - make_interval(secs => %(reintento_horas)s * 3600)
+        OR COALESCE(actualizado_at >= intentado_at, FALSE)
+    )
+"""
+
+# Fila de api_llamadas con el presupuesto de Alpha Vantage
+FUENTE_LLAMADAS = "alpha_vantage"
+
+COLUMNAS_WATCHLIST = f"""
+    ticker, nombre, tipo, mercado, activo, peso, volatilidad, actualizado_at, intentado_at,
+    ({DEMANDA_SQL})::float8 AS demanda,
+    ({PRIORIDAD_SQL})::float8 AS prioridad,
+    ({ELEGIBLE_SQL}) AS elegible
+"""
+
+
+def parametros_prioridad() -> dict:
+    """Parámetros de PRIORIDAD_SQL y ELEGIBLE_SQL desde settings."""
+    settings = get_settings()
+    return {
+        "max_horas": settings.ETF_ANTIGUEDAD_MAXIMA_HORAS,
+        "min_horas": settings.ETF_ANTIGUEDAD_MINIMA_HORAS,
+        "reintento_horas": settings.ETF_REINTENTO_HORAS,
+        "peso_demanda": settings.ETF_PESO_DEMANDA,
+        "peso_volatilidad": settings.ETF_PESO_VOLATILIDAD,
+        "vida_media": settings.ETF_DEMANDA_VIDA_MEDIA_HORAS,
+    }
+
+
+def guardar_tickers(conn: psycopg.Connection, etfs: Iterable[dict]) -> int:
+    """
+    Agrega tickers a la watchlist o actualiza sus datos (y los reactiva).
+
+    Args:
+        etfs: Diccionarios con ticker y, opcionales, nombre, tipo, mercado y peso
+
+    Returns:
+        Tickers agregados o actualizados
+    """
+    # Un ticker repetido en la misma inserción haría fallar el ON CONFLICT
+    unicos = {
+        e["ticker"].strip().upper(): (
+            e["ticker"].strip().upper(),
+            e.get("nombre") or None,
+            e.get("tipo") or "ETF",
+            e.get("mercado") or None,
+            float(e.get("peso") or 1),
+        )
+        for e in etfs
+        if e.get("ticker", "").strip()
+    }
+    if not unicos:
+        return 0
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO etf_watchlist (ticker, nombre, tipo, mercado, peso)
+            SELECT * FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[], %s::varchar[], %s::float8[])
+            ON CONFLICT (ticker) DO UPDATE SET
+                nombre = COALESCE(EXCLUDED.nombre, etf_watchlist.nombre),
+                tipo = EXCLUDED.tipo,
+                mercado = COALESCE(EXCLUDED.mercado, etf_watchlist.mercado),
+                peso = EXCLUDED.peso,
+                activo = TRUE
+        """, [list(columna) for columna in zip(*unicos.values())])
+        guardados = cur.rowcount
+    conn.commit()
+    return guardados
+
+
+def desactivar_ticker(conn: psycopg.Connection, ticker: str) -> bool:
+    """Saca un ticker de la planificación (conserva su historial). False si no existe."""
+    with conn.cursor() as cur:
+        cur.execute("UPDATE etf_watchlist SET activo = FALSE WHERE ticker = %s", (ticker.upper(),))
+        existe = cur.rowcount > 0
+    conn.commit()
+    return existe
+
+
+def listar_watchlist(conn: psycopg.Connection, limit: int, solo_activos: bool = True) -> list[dict]:
+    """Tickers con su demanda y prioridad actuales, de mayor a menor prioridad."""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT {COLUMNAS_WATCHLIST}
+            FROM etf_watchlist
+            WHERE activo OR NOT %(solo_activos)s
+            ORDER BY elegible DESC, prioridad DESC, ticker
+            LIMIT %(limit)s
+        """, {**parametros_prioridad(), "solo_activos": solo_activos, "limit": limit})
+        return cur.fetchall()
+
+
+def reservar_llamadas(conn: psycopg.Connection, limite_diario: int, pedidas: int | None) -> int:
+    """
+    Reserva llamadas de hoy en api_llamadas, sin pasar de limite_diario (sin commit).
+
+    La fila del día queda bloqueada hasta el commit: otro nodo que reserva
+    al mismo tiempo espera y ve lo que quedó.
+
+    Args:
+        pedidas: Llamadas que se quieren hacer (None = todas las que queden)
+
+    Returns:
+        Llamadas reservadas (0 si el límite del día está agotado)
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO api_llamadas (fuente, fecha) VALUES (%s, CURRENT_DATE)
+            ON CONFLICT (fuente, fecha) DO NOTHING
+        """, (FUENTE_LLAMADAS,))
+        cur.execute("""
+            SELECT llamadas FROM api_llamadas
+            WHERE fuente = %s AND fecha = CURRENT_DATE
+            FOR UPDATE
+        """, (FUENTE_LLAMADAS,))
+        disponibles = max(0, limite_diario - cur.fetchone()["llamadas"])
+        reservadas = disponibles if pedidas is None else min(pedidas, disponibles)
+        cur.execute("""
+            UPDATE api_llamadas SET llamadas = llamadas + %s
+            WHERE fuente = %s AND fecha = CURRENT_DATE
+            RETURNING llamadas
+        """, (reservadas, FUENTE_LLAMADAS))
+        usadas = cur.fetchone()["llamadas"]
+    logger.debug(f"Alpha Vantage: {reservadas} llamadas reservadas ({usadas}/{limite_diario} hoy)")
+    return reservadas
+
+
+def devolver_llamadas(conn: psycopg.Connection, llamadas: int) -> None:
+    """Regresa al presupuesto de hoy llamadas reservadas que no se hicieron (sin commit)."""
+    if llamadas <= 0:
+        return
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE api_llamadas SET llamadas = GREATEST(llamadas - %s, 0)
+            WHERE fuente = %s AND fecha = CURRENT_DATE
+        """, (llamadas, FUENTE_LLAMADAS))
+
+
+def agotar_llamadas(conn: psycopg.Connection, limite_diario: int) -> None:
+    """Marca el presupuesto de hoy como agotado (Alpha Vantage respondió con su límite; sin commit)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO api_llamadas (fuente, fecha, llamadas) VALUES (%(fuente)s, CURRENT_DATE, %(limite)s)
+            ON CONFLICT (fuente, fecha) DO UPDATE SET llamadas = GREATEST(api_llamadas.llamadas, %(limite)s)
+        """, {"fuente": FUENTE_LLAMADAS, "limite": limite_diario})
+
+
+def llamadas_restantes(conn: psycopg.Connection, limite_diario: int) -> int:
+    """Llamadas de hoy sin usar ni reservar."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT llamadas FROM api_llamadas WHERE fuente = %s AND fecha = CURRENT_DATE",
+            (FUENTE_LLAMADAS,),
+        )
+        fila = cur.fetchone()
+    return max(0, limite_diario - (fila["llamadas"] if fila else 0))
+
+
+def planificar_etfs(
+    conn: psycopg.Connection,
+    limite: int | None,
+    iniciales: Iterable[dict] = (),
+    limite_diario: int | None = None,
+) -> list[dict]:
+    """
+    Elige los tickers a actualizar en esta ejecución y los marca como intentados.
+
+    Con limite_diario, reserva en la misma transacción una llamada por
+    ticker elegido (ver reservar_llamadas).
+
+    Args:
+        limite: Máximo de tickers (None = todos los elegibles)
+        iniciales: ETFs con los que se llena la watchlist si está vacía
+        limite_diario: Llamadas por día de Alpha Vantage (None = sin límite)
+
+    Returns:
+        ticker, nombre, tipo y mercado de cada ETF, de mayor a menor prioridad
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM etf_watchlist) AS hay")
+        if not cur.fetchone()["hay"] and iniciales:
+            logger.info(f"Watchlist vacía: se agregan {guardar_tickers(conn, iniciales)} ETFs iniciales")
+
+        if limite_diario:
+            reservadas = limite = reservar_llamadas(conn, limite_diario, limite)
+
+        cur.execute(f"""
+            WITH plan AS (
+                SELECT ticker, ({PRIORIDAD_SQL}) AS prioridad
+                FROM etf_watchlist
+                WHERE {ELEGIBLE_SQL}
+                ORDER BY prioridad DESC, ticker
+                LIMIT %(limite)s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE etf_watchlist w SET intentado_at = NOW()
+            FROM plan
+            WHERE w.ticker = plan.ticker
+            RETURNING w.ticker, w.nombre, w.tipo, w.mercado, plan.prioridad::float8 AS prioridad
+        """, {**parametros_prioridad(), "limite": limite})
+        plan = sorted(cur.fetchall(), key=lambda f: (-f["prioridad"], f["ticker"]))
+        if limite_diario:
+            # Menos tickers elegibles que llamadas: el resto queda para otros
+            devolver_llamadas(conn, reservadas - len(plan))
+    conn.commit()
+
+    if plan:
+        primeros = ", ".join(f"{f['ticker']} ({f['prioridad']:.2f})" for f in plan[:5])
+        logger.info(f"Plan de ETFs: {len(plan)} tickers; mayor prioridad: {primeros}")
+    return [{c: f[c] for c in ("ticker", "nombre", "tipo", "mercado")} for f in plan]
+
+
+def marcar_actualizados(conn: psycopg.Connection, tickers: Iterable[str]) -> None:
+    """
+    Registra el precio nuevo de los tickers y recalcula su volatilidad.
+
+    Se ejecuta en la transacción de la carga (sin commit): el ticker sólo
+    cuenta como actualizado si su precio se guardó.
+    """
+    tickers = sorted(set(tickers))
+    if not tickers:
+        return
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE etf_watchlist w SET
+                actualizado_at = NOW(),
+                volatilidad = (
+                    SELECT stddev_samp(rendimiento_ytd) FROM (
+                        SELECT rendimiento_ytd FROM fondos_etfs f
+                        WHERE f.ticker = w.ticker AND rendimiento_ytd IS NOT NULL
+                        ORDER BY fecha_actualizacion DESC
+                        LIMIT %s
+                    ) recientes
+                )
+            WHERE w.ticker = ANY(%s)
+        """, (get_settings().ETF_VOLATILIDAD_VENTANA, tickers))
+
+
+def sumar_demanda(conn: psycopg.Connection, consultas: dict[str, int]) -> None:
+    """Suma consultas por ticker a la demanda (aplicando el decaimiento pendiente)."""
+    if not consultas:
+        return
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            UPDATE etf_watchlist w SET
+                demanda = {DEMANDA_SQL} + c.consultas,
+                demanda_at = NOW()
+            FROM unnest(%(tickers)s::varchar[], %(consultas)s::int[]) AS c(ticker, consultas)
+            WHERE w.ticker = c.ticker
+        """, {
+            "vida_media": get_settings().ETF_DEMANDA_VIDA_MEDIA_HORAS,
+            "tickers": list(consultas),
+            "consultas": list(consultas.values()),
+        })
+    conn.commit()
+
+
+def leer_csv(ruta: Path) -> list[dict]:
+    """Tickers de un CSV con encabezado (ticker,nombre,tipo,mercado[,peso])."""
+    with open(ruta, newline="", encoding="utf-8") as f:
+        return [{k.strip().lower(): (v or "").strip() for k, v in fila.items() if k} for fila in csv.DictReader(f)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Watchlist de ETFs y plan de actualización")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    plan = comandos.add_parser("plan", help="Tickers de mayor prioridad (sin marcarlos)")
+    plan.add_argument("--limit", type=int, default=25)
+    importar = comandos.add_parser("importar", help="Agrega o actualiza tickers desde un CSV")
+    importar.add_argument("archivo", type=Path)
+    args = parser.parse_args()
+
+    from app.database import close_pool, get_connection
+
+    try:
+        with get_connection() as conn:
+            if args.comando == "importar":
+                print(f"{guardar_tickers(conn, leer_csv(args.archivo))} tickers guardados")
+                return
+
+            print(f"{'ticker':<8} {'prioridad':>10} {'demanda':>9} {'volat.':>7} {'actualizado':<19}")
+            for fila in listar_watchlist(conn, args.limit):
+                if not fila["elegible"]:
+                    continue
+                actualizado = fila["actualizado_at"].strftime("%Y-%m-%d %H:%M") if fila["actualizado_at"] else "-"
+                volatilidad = fila["volatilidad"] if fila["volatilidad"] is not None else math.nan
+                print(f"{fila['ticker']:<8} {fila['prioridad']:>10.2f} {fila['demanda']:>9.1f} "
+                      f"{volatilidad:>7.2f} {actualizado:<19}")
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
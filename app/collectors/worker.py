@@ -0,0 +1,150 @@
+"""
+Worker de la cola de recopilaciones (tabla collector_jobs).
+
+Proceso aparte de la API: toma jobs con FOR UPDATE SKIP LOCKED y los
+ejecuta con los collectors async (hasta JOB_WORKER_CONCURRENCY a la vez
+en un solo event loop). Se escala levantando más procesos, en la misma
+máquina o en otras; ninguno toma el job de otro. Mientras un job corre,
+su latido_at se actualiza cada JOB_HEARTBEAT_SECONDS; si el proceso muere,
+otro worker lo recupera tras JOB_TIMEOUT_SECONDS sin latido.
+
+Con SIGTERM/SIGINT deja de tomar jobs y termina los que tiene en curso.
+
+Uso:
+    python -m app.collectors.worker
+    python -m app.collectors.worker --concurrencia 5
+    python -m app.collectors.worker --una-vez   # drena la cola y termina
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import time
+
+from loguru import logger
+
+from app.collectors.cliente_http import close_http_client
+from app.collectors.cola import latir_job, reclamar_job, recuperar_vencidos, terminar_job
+from app.collectors.refresh import tareas_fuentes
+from app.config import get_settings
+from app.database import close_pool, get_connection
+
+
+def _en_conexion(fn, *args):
+    """Ejecuta una función de la cola con una conexión del pool de escritura."""
+    with get_connection() as conn:
+        return fn(conn, *args)
+
+
+class Worker:
+    """
+    Drena la cola de recopilaciones.
+
+    Args:
+        concurrencia: Jobs simultáneos (default JOB_WORKER_CONCURRENCY)
+        una_vez: Terminar cuando la cola quede vacía
+    """
+
+    def __init__(self, concurrencia: int | None = None, una_vez: bool = False):
+        settings = get_settings()
+        self.nombre = f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrencia = concurrencia or settings.JOB_WORKER_CONCURRENCY
+        self.una_vez = una_vez
+        self.espera = settings.JOB_POLL_SECONDS
+        self.intervalo_latido = settings.JOB_HEARTBEAT_SECONDS
+        # Los vencidos se revisan cada tanto; no en cada consulta a la cola
+        self.intervalo_vencidos = max(60.0, settings.JOB_TIMEOUT_SECONDS / 10)
+        self.detener = asyncio.Event()
+
+    async def latir(self, job_id: int) -> None:
+        """Actualiza el heartbeat del job hasta que se cancele."""
+        while True:
+            await asyncio.sleep(self.intervalo_latido)
+            try:
+                if not await asyncio.to_thread(_en_conexion, latir_job, job_id, self.nombre):
+                    logger.warning(f"Job {job_id}: ya no es de este worker (vencido)")
+                    return
+            except Exception as e:
+                # Un heartbeat perdido no detiene el job; el siguiente lo repone
+                logger.warning(f"Job {job_id}: no se pudo actualizar el heartbeat: {e}")
+
+    async def ejecutar_job(self, job: dict) -> None:
+        """Ejecuta un job y guarda su resultado."""
+        logger.info(f"Job {job['id']}: {job['fuente']} {job['parametros']} (intento {job['intentos']})")
+        insertados, error = None, None
+        latido = asyncio.create_task(self.latir(job["id"]), name=f"latido-{job['id']}")
+        try:
+            tarea = tareas_fuentes(**job["parametros"])[job["fuente"]]
+            insertados = await tarea()
+        except Exception as e:
+            logger.exception(f"Job {job['id']}: error en {job['fuente']}: {e}")
+            error = str(e) or type(e).__name__
+        finally:
+            latido.cancel()
+
+        if not await asyncio.to_thread(_en_conexion, terminar_job, job["id"], self.nombre, insertados, error):
+            logger.warning(f"Job {job['id']}: ya no era de este worker (vencido); resultado descartado")
+        else:
+            logger.info(f"Job {job['id']}: {'error' if error else f'{insertados} registros'}")
+
+    async def run(self) -> None:
+        """Toma y ejecuta jobs hasta que se pida detener (o la cola quede vacía)."""
+        logger.info(f"Worker {self.nombre}: hasta {self.concurrencia} jobs simultáneos")
+        en_curso: set[asyncio.Task] = set()
+        parada = asyncio.create_task(self.detener.wait())
+        revision_vencidos = 0.0
+
+        while not self.detener.is_set():
+            if time.monotonic() - revision_vencidos > self.intervalo_vencidos:
+                recuperados = await asyncio.to_thread(_en_conexion, recuperar_vencidos)
+                if recuperados:
+                    logger.warning(f"{recuperados} jobs vencidos devueltos a la cola")
+                revision_vencidos = time.monotonic()
+
+            while len(en_curso) < self.concurrencia:
+                job = await asyncio.to_thread(_en_conexion, reclamar_job, self.nombre)
+                if job is None:
+                    break
+                en_curso.add(asyncio.create_task(self.ejecutar_job(job), name=f"job-{job['id']}"))
+
+            if self.una_vez and not en_curso:
+                break
+
+            # Despierta cuando termina un job (hay lugar), al pedir detener
+            # o tras JOB_POLL_SECONDS para volver a consultar la cola
+            await asyncio.wait({*en_curso, parada}, timeout=self.espera, return_when=asyncio.FIRST_COMPLETED)
+            en_curso = {t for t in en_curso if not t.done()}
+
+        if en_curso:
+            logger.info(f"Worker {self.nombre}: esperando {len(en_curso)} jobs en curso")
+            await asyncio.gather(*en_curso, return_exceptions=True)
+        parada.cancel()
+
+
+async def _main(concurrencia: int | None, una_vez: bool) -> None:
+    worker = Worker(concurrencia, una_vez)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.detener.set)
+    try:
+        await worker.run()
+    finally:
+        await close_http_client()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker de la cola de recopilaciones")
+    parser.add_argument("--concurrencia", type=int, help="Jobs simultáneos (default JOB_WORKER_CONCURRENCY)")
+    parser.add_argument("--una-vez", action="store_true", help="Terminar cuando la cola quede vacía")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_main(args.concurrencia, args.una_vez))
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
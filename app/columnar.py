@@ -0,0 +1,246 @@
+"""
+Formatos columnares binarios (Arrow IPC y Parquet) para endpoints de
+histórico, y JSON con proyección de campos para endpoints de listas.
+
+Las columnas se arman en PostgreSQL con array_agg y se leen en formato
+binario: cada columna llega como un solo arreglo, sin crear un dict ni
+un modelo Pydantic por fila. Las fechas viajan como días desde 1970
+(date32 de Arrow) y los DECIMAL como float8.
+
+Los agregados no respetan el ORDER BY de la subconsulta: cada uno lleva
+su propio ORDER BY (`orden`). Cuando el orden depende de columnas que
+?campos= puede quitar, la consulta agrega la posición de cada fila con
+numerar() y los agregados se ordenan por ella (q._fila, el default).
+
+Con ?campos= la consulta del router selecciona sólo esas columnas; el
+JSON (por filas o ?formato=columnar, un arreglo por campo) se arma en
+PostgreSQL con json_agg y se envía tal cual.
+
+Uso en un router:
+    columnas = seleccionar_campos(campos, COLUMNAS)
+    query = f"SELECT {lista_select(columnas)}, {numerar('fecha DESC')} FROM ... ORDER BY fecha DESC"
+    binario = negotiate_format(request)
+    if binario:
+        return columnar_response(db, query, params, columnas, binario)
+    if campos or formato == FormatoJSON.COLUMNAR:
+        return json_response(db, query, params, columnas, formato)
+"""
+
+from enum import Enum
+
+from fastapi import HTTPException, Request, Response
+import psycopg
+
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+
+# Tipos MIME aceptados -> formato
+FORMATOS = {
+    ARROW_STREAM: ARROW_STREAM,
+    PARQUET: PARQUET,
+    "application/x-parquet": PARQUET,
+}
+
+# Expresión de agregación por tipo de columna
+_AGREGACIONES = {
+    "int32": "array_agg(q.{col} ORDER BY {orden})",
+    "float64": "array_agg(q.{col}::float8 ORDER BY {orden})",
+    "date32": "array_agg(q.{col} - DATE '1970-01-01' ORDER BY {orden})",
+    "string": "array_agg(q.{col}::text ORDER BY {orden})",
+}
+
+# Valor JSON por tipo de columna. Por filas, los DECIMAL van como texto
+# (igual que los modelos Pydantic); por columnas, como números (igual
+# que Arrow), que es lo que usan las gráficas.
+_JSON_FILAS = {
+    "int32": "q.{col}",
+    "float64": "q.{col}::text",
+    "date32": "q.{col}",
+    "string": "q.{col}",
+    "json": "q.{col}",
+}
+_JSON_COLUMNAS = {**_JSON_FILAS, "float64": "q.{col}::float8"}
+
+
+class FormatoJSON(str, Enum):
+    """Forma de las respuestas JSON de listas."""
+    FILAS = "filas"  # [{campo: valor, ...}, ...]
+    COLUMNAR = "columnar"  # {campo: [valores], ...}
+
+
+def negotiate_format(request: Request) -> str | None:
+    """
+    Elige el formato columnar pedido en la cabecera Accept.
+
+    Returns:
+        Tipo MIME del formato o None si se debe responder JSON
+    """
+    accept = request.headers.get("accept", "")
+    for tipo in accept.split(","):
+        formato = FORMATOS.get(tipo.split(";")[0].strip().lower())
+        if formato:
+            return formato
+    return None
+
+
+def seleccionar_campos(campos: str | None, columnas: dict[str, str]) -> dict[str, str]:
+    """
+    Columnas pedidas en ?campos=a,b (todas si no se indica), en ese orden.
+
+    Raises:
+        HTTPException 400: Campo desconocido
+    """
+    if not campos:
+        return columnas
+
+    nombres = list(dict.fromkeys(c.strip() for c in campos.split(",") if c.strip()))
+    desconocidos = [c for c in nombres if c not in columnas]
+    if desconocidos or not nombres:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos desconocidos: {', '.join(desconocidos) or campos}; disponibles: {', '.join(columnas)}",
+        )
+    return {nombre: columnas[nombre] for nombre in nombres}
+
+
+def numerar(orden: str) -> str:
+    """
+    Columna _fila con la posición de cada fila según `orden` (el mismo
+    ORDER BY de la consulta), para ordenar los agregados con q._fila.
+    """
+    return f"ROW_NUMBER() OVER (ORDER BY {orden}) AS _fila"
+
+
+def lista_select(columnas: dict[str, str], expresiones: dict[str, str] | None = None) -> str:
+    """
+    Lista de SELECT con las columnas indicadas.
+
+    Args:
+        columnas: {nombre: tipo} ya validadas con seleccionar_campos
+        expresiones: Expresión SQL de las columnas que no son de la tabla
+            (ej. {"precio_actual": "precio_mxn"})
+    """
+    expresiones = expresiones or {}
+    return ", ".join(
+        f"{expresiones[nombre]} AS {nombre}" if nombre in expresiones else nombre
+        for nombre in columnas
+    )
+
+
+def json_response(
+    db: psycopg.Connection,
+    query: str,
+    params: list | tuple,
+    columnas: dict[str, str],
+    formato: FormatoJSON,
+    orden: str = "q._fila",
+) -> Response:
+    """
+    Respuesta JSON armada en PostgreSQL, por filas o un arreglo por campo.
+
+    `orden` es el ORDER BY de los agregados, sobre las columnas de la
+    consulta (alias q).
+    """
+    if formato == FormatoJSON.COLUMNAR:
+        select = "json_build_object({})".format(", ".join(
+            f"'{nombre}', COALESCE(json_agg({_JSON_COLUMNAS[tipo].format(col=nombre)} ORDER BY {orden}), '[]')"
+            for nombre, tipo in columnas.items()
+        ))
+        consulta = f"SELECT {select}::text AS json FROM ({query}) AS q"
+    else:
+        # json_agg de la fila completa (sólo los campos pedidos): claves en
+        # orden y sin espacios
+        filas = ", ".join(f"{_JSON_FILAS[tipo].format(col=nombre)} AS {nombre}" for nombre, tipo in columnas.items())
+        consulta = f"""
+            SELECT COALESCE(json_agg(r ORDER BY {orden}), '[]')::text AS json
+            FROM ({query}) AS q CROSS JOIN LATERAL (SELECT {filas}) AS r
+        """
+
+    with db.cursor() as cur:
+        cur.execute(consulta, params)
+        row = cur.fetchone()
+
+    return Response(content=row["json"], media_type="application/json")
+
+
+def fetch_columns(
+    db: psycopg.Connection,
+    query: str,
+    params: list | tuple,
+    columnas: dict[str, str],
+    orden: str = "q._fila",
+) -> dict[str, list]:
+    """
+    Ejecuta una consulta y regresa sus resultados por columna.
+
+    Args:
+        db: Conexión
+        query: Consulta que produce las columnas
+        params: Parámetros de la consulta
+        columnas: {nombre: tipo} con tipos int32, float64, date32 o string
+        orden: ORDER BY de cada columna sobre la consulta (alias q); debe
+            ser un orden total para que las columnas queden alineadas
+
+    Returns:
+        Diccionario {columna: lista de valores}
+    """
+    select = ", ".join(
+        f"{_AGREGACIONES[tipo].format(col=nombre, orden=orden)} AS {nombre}"
+        for nombre, tipo in columnas.items()
+    )
+
+    with db.cursor() as cur:
+        cur.execute(f"SELECT {select} FROM ({query}) AS q", params, binary=True)
+        row = cur.fetchone()
+
+    return {nombre: row[nombre] or [] for nombre in columnas}
+
+
+def to_arrow_table(datos: dict[str, list], columnas: dict[str, str]):
+    """Convierte columnas a una tabla de Arrow."""
+    import pyarrow as pa
+
+    tipos = {
+        "int32": pa.int32(),
+        "float64": pa.float64(),
+        "date32": pa.date32(),
+        "string": pa.string(),
+    }
+    return pa.table({
+        nombre: pa.array(datos[nombre], type=tipos[tipo])
+        for nombre, tipo in columnas.items()
+    })
+
+
+def serialize_table(tabla, formato: str) -> bytes:
+    """Serializa una tabla de Arrow como Arrow IPC stream o Parquet."""
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    if formato == PARQUET:
+        import pyarrow.parquet as pq
+
+        pq.write_table(tabla, sink, compression="zstd")
+    else:
+        with pa.ipc.new_stream(sink, tabla.schema) as writer:
+            writer.write_table(tabla)
+    return sink.getvalue().to_pybytes()
+
+
+def columnar_response(
+    db: psycopg.Connection,
+    query: str,
+    params: list | tuple,
+    columnas: dict[str, str],
+    formato: str,
+    orden: str = "q._fila",
+) -> Response:
+    """Respuesta Arrow/Parquet construida columna por columna (ver fetch_columns)."""
+    datos = fetch_columns(db, query, params, columnas, orden)
+    tabla = to_arrow_table(datos, columnas)
+    return Response(
+        content=serialize_table(tabla, formato),
+        media_type=formato,
+        headers={"Vary": "Accept"},
+    )
@@ -1,70 +1,421 @@
 """
 Conexión a PostgreSQL con psycopg3.
+
+Se usan dos pools independientes:
+- Lectura: lo usan los routers de la API. Puede apuntar a una réplica
+  (DATABASE_READ_URL).
+- Escritura: lo usan los collectors, de modo que una carga masiva no
+  compite por conexiones con las peticiones de la API.
+
+Las conexiones usan un cursor instrumentado que mide cada consulta, para
+distinguir el tiempo de espera del pool del tiempo de las consultas. Las
+consultas que superan SLOW_QUERY_MS se registran en el log.
 """
 
+import json
+import time
 from contextlib import contextmanager
-from typing import Generator
+from dataclasses import dataclass, field
+from typing import Any, Generator
 
 import psycopg
-from psycopg.rows import dict_row
-from psycopg_pool import ConnectionPool
+from loguru import logger
+from psycopg import sql
+from psycopg.conninfo import conninfo_to_dict
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import ConnectionPool, PoolTimeout
+from starlette.requests import Request
 
-from app.config import settings
 
+def _settings():
+    """
+    Configuración de la aplicación.
 
-# Pool de conexiones
-pool: ConnectionPool | None = None
+    Se importa al primer uso para que los scripts que sólo necesitan la
+    base de datos no paguen la importación de pydantic-settings.
+    """
+    from app.config import get_settings
 
+    return get_settings()
 
-def init_pool() -> None:
-    """Inicializa el pool de conexiones."""
-    global pool
-    if pool is None:
-        pool = ConnectionPool(
+
+# Máximo de consultas individuales que se guardan por conexión
+MAX_QUERIES_REGISTRADAS = 100
+
+# Canal de NOTIFY para datos nuevos (lo escucha app.stream)
+NOTIFY_CHANNEL = "tasas_actualizadas"
+# PostgreSQL limita el payload de NOTIFY a 8000 bytes
+MAX_NOTIFY_BYTES = 7900
+
+
+@dataclass
+class QueryStats:
+    """Tiempos acumulados de las consultas hechas con una conexión."""
+
+    pool_wait_ms: float = 0.0
+    count: int = 0
+    total_ms: float = 0.0
+    queries: list[tuple[str, float]] = field(default_factory=list)
+    # Perfilado: capturar EXPLAIN (ANALYZE, BUFFERS) de cada SELECT
+    explain: bool = False
+    plans: list[dict] = field(default_factory=list)
+
+    def record(self, query: Any, duration_ms: float) -> None:
+        """Registra una consulta ejecutada."""
+        self.count += 1
+        self.total_ms += duration_ms
+        if len(self.queries) < MAX_QUERIES_REGISTRADAS:
+            self.queries.append((_query_text(query), duration_ms))
+
+
+def _query_text(query: Any) -> str:
+    """Obtiene el texto de una consulta (str, bytes o psycopg.sql)."""
+    if isinstance(query, str):
+        return query
+    if isinstance(query, bytes):
+        return query.decode()
+    return repr(query)
+
+
+def _as_sql(query: Any) -> sql.Composable:
+    """Convierte una consulta a un objeto componible de psycopg.sql."""
+    if isinstance(query, sql.Composable):
+        return query
+    if isinstance(query, bytes):
+        query = query.decode()
+    return sql.SQL(query)
+
+
+def _is_select(query: Any) -> bool:
+    """Indica si una consulta es de sólo lectura (SELECT o WITH)."""
+    texto = _query_text(query).lstrip().upper()
+    return texto.startswith("SELECT") or texto.startswith("WITH")
+
+
+class TimedCursor(psycopg.Cursor):
+    """Cursor que mide la duración de cada consulta."""
+
+    def execute(self, query, params=None, *, prepare=None, binary=None):
+        inicio = time.perf_counter()
+        try:
+            super().execute(query, params, prepare=prepare, binary=binary)
+        finally:
+            self._record(query, inicio)
+
+        stats = getattr(self.connection, "query_stats", None)
+        if stats is not None and stats.explain and _is_select(query):
+            self._capture_plan(stats, query, params)
+        return self
+
+    def _capture_plan(self, stats: QueryStats, query: Any, params) -> None:
+        """Ejecuta EXPLAIN (ANALYZE, BUFFERS) de la consulta sin medirlo."""
+        try:
+            with psycopg.Cursor(self.connection, row_factory=tuple_row) as cur:
+                cur.execute(
+                    sql.SQL("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ") + _as_sql(query),
+                    params,
+                )
+                plan = cur.fetchone()[0]
+        except psycopg.Error as e:
+            plan = {"error": str(e)}
+        stats.plans.append({"sql": _query_text(query).strip(), "plan": plan})
+
+    def executemany(self, query, params_seq, *, returning=False):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(query, params_seq, returning=returning)
+        finally:
+            self._record(query, inicio)
+
+    def _record(self, query: Any, inicio: float) -> None:
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+
+        if 0 < _settings().SLOW_QUERY_MS <= duracion_ms:
+            logger.warning(
+                f"Consulta lenta ({duracion_ms:.1f} ms): {' '.join(_query_text(query).split())[:500]}"
+            )
+
+        stats = getattr(self.connection, "query_stats", None)
+        if stats is not None:
+            stats.record(query, duracion_ms)
+
+
+class InstrumentedConnection(psycopg.Connection):
+    """Conexión que acumula estadísticas de sus consultas."""
+
+    query_stats: QueryStats | None = None
+
+
+# Pools de conexiones
+read_pool: ConnectionPool | None = None
+write_pool: ConnectionPool | None = None
+
+
+# Puerto del pooler de Supabase (Supavisor) en modo transacción
+PUERTO_POOLER_TRANSACCIONES = "6543"
+
+
+def es_pooler_transacciones(dsn: str) -> bool:
+    """
+    True si el DSN apunta a un pooler en modo transacción (puerto 6543 de
+    Supabase o ?pgbouncer=true).
+
+    Cada transacción puede ir a otra conexión del servidor: no sirven los
+    prepared statements, LISTEN ni los advisory locks de sesión.
+    """
+    if "pgbouncer=true" in dsn.lower():
+        return True
+    try:
+        puerto = conninfo_to_dict(dsn).get("port")
+    except psycopg.Error:
+        return False
+    return str(puerto) == PUERTO_POOLER_TRANSACCIONES
+
+
+def _connection_kwargs(dsn: str) -> dict:
+    """Argumentos comunes para las conexiones de ambos pools."""
+    preparar = _settings().DB_PREPARED_STATEMENTS
+    if preparar and es_pooler_transacciones(dsn):
+        logger.warning("DB_PREPARED_STATEMENTS ignorado: la URL es un pooler en modo transacción")
+        preparar = False
+    return {
+        "row_factory": dict_row,
+        "cursor_factory": TimedCursor,
+        # Las consultas con prepare=True se preparan en su primera ejecución;
+        # None desactiva los prepared statements (incluso con prepare=True).
+        "prepare_threshold": 5 if preparar else None,
+    }
+
+
+def _configure_connection(conn: psycopg.Connection) -> None:
+    """Configura cada conexión nueva del pool."""
+    settings = _settings()
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        conn.execute(
+            "SELECT set_config('statement_timeout', %s, false)",
+            (f"{settings.DB_STATEMENT_TIMEOUT_MS}ms",),
+        )
+        conn.commit()
+
+
+def read_pool_size() -> tuple[int, int]:
+    """
+    Tamaño (mínimo, máximo) del pool de lectura de este proceso.
+
+    Con varios workers de uvicorn, DB_READ_MAX_CONNECTIONS se reparte entre
+    ellos para que el total de conexiones no crezca con los workers.
+    """
+    settings = _settings()
+    max_size = settings.DB_READ_POOL_MAX
+    if settings.WEB_CONCURRENCY > 1:
+        max_size = max(1, settings.DB_READ_MAX_CONNECTIONS // settings.WEB_CONCURRENCY)
+    return min(settings.DB_READ_POOL_MIN, max_size), max_size
+
+
+def init_read_pool() -> ConnectionPool:
+    """Inicializa el pool de lectura (API)."""
+    global read_pool
+    if read_pool is None:
+        settings = _settings()
+        min_size, max_size = read_pool_size()
+        dsn = settings.DATABASE_READ_URL or settings.DATABASE_URL
+        read_pool = ConnectionPool(
+            dsn,
+            connection_class=InstrumentedConnection,
+            min_size=min_size,
+            max_size=max_size,
+            timeout=settings.DB_READ_POOL_TIMEOUT,
+            # Un worker por conexión mínima: el arranque las abre en paralelo
+            num_workers=max(3, min_size),
+            name="lectura",
+            configure=_configure_connection,
+            kwargs=_connection_kwargs(dsn),
+        )
+    return read_pool
+
+
+def init_write_pool() -> ConnectionPool:
+    """Inicializa el pool de escritura (collectors)."""
+    global write_pool
+    if write_pool is None:
+        settings = _settings()
+        write_pool = ConnectionPool(
             settings.DATABASE_URL,
-            min_size=2,
-            max_size=10,
-            kwargs={"row_factory": dict_row}
+            connection_class=InstrumentedConnection,
+            min_size=settings.DB_WRITE_POOL_MIN,
+            max_size=settings.DB_WRITE_POOL_MAX,
+            timeout=settings.DB_WRITE_POOL_TIMEOUT,
+            name="escritura",
+            configure=_configure_connection,
+            kwargs=_connection_kwargs(settings.DATABASE_URL),
         )
+    return write_pool
+
+
+def warm_up_pool(timeout: float | None = None) -> None:
+    """
+    Abre el pool de lectura y espera a que tenga sus conexiones mínimas.
+
+    Las conexiones se abren de forma concurrente por los workers del pool,
+    así la primera petición no paga el costo de conectar.
+    """
+    timeout = _settings().DB_POOL_WARMUP_TIMEOUT if timeout is None else timeout
+    pool = init_read_pool()
+    inicio = time.perf_counter()
+    try:
+        pool.wait(timeout=timeout)
+    except PoolTimeout:
+        logger.warning(f"Pool {pool.name}: conexiones mínimas no listas tras {timeout:.0f} s")
+        return
+    logger.info(
+        f"Pool {pool.name}: {pool.min_size} conexiones listas en "
+        f"{(time.perf_counter() - inicio) * 1000:.0f} ms"
+    )
+
+
+def init_pool() -> None:
+    """Inicializa los pools de lectura y escritura."""
+    init_read_pool()
+    init_write_pool()
 
 
 def close_pool() -> None:
-    """Cierra el pool de conexiones."""
-    global pool
-    if pool is not None:
-        pool.close()
-        pool = None
+    """Cierra los pools de conexiones."""
+    global read_pool, write_pool
+    if read_pool is not None:
+        read_pool.close()
+        read_pool = None
+    if write_pool is not None:
+        write_pool.close()
+        write_pool = None
+
+
+def get_pool_stats() -> dict[str, dict[str, int]]:
+    """
+    Estadísticas de psycopg_pool de cada pool abierto.
+
+    Incluye, entre otras: requests_waiting (clientes esperando),
+    requests_wait_ms (tiempo total de espera), requests_errors
+    (timeouts al pedir conexión) y connections_in_use.
+    """
+    resultado = {}
+    for pool in (read_pool, write_pool):
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        stats["connections_in_use"] = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+        resultado[pool.name] = stats
+    return resultado
+
+
+def set_statement_timeout(conn: psycopg.Connection, timeout_ms: int) -> None:
+    """
+    Fija un timeout para las sentencias de la transacción actual.
+
+    Uso:
+        set_statement_timeout(db, 500)
+        with db.cursor() as cur:
+            cur.execute(...)
+    """
+    conn.execute("SELECT set_config('statement_timeout', %s, true)", (f"{timeout_ms}ms",))
+
+
+def notify_update(conn: psycopg.Connection, fuente: str, datos: list[dict]) -> None:
+    """
+    Notifica a los procesos de la API que una fuente tiene datos nuevos.
+
+    Se emite dentro de la transacción del collector, así que PostgreSQL
+    sólo la entrega si se hace commit. Si el detalle no cabe en el
+    payload, se envía sólo el total.
+
+    Args:
+        conn: Conexión con la transacción de escritura
+        fuente: Fuente de los datos (cetes, sofipos, fondos)
+        datos: Registros nuevos en forma compacta
+    """
+    mensaje = {"fuente": fuente, "total": len(datos), "datos": datos}
+    payload = json.dumps(mensaje, separators=(",", ":"), default=str)
+    if len(payload.encode()) > MAX_NOTIFY_BYTES - len(fuente) - 1:
+        payload = json.dumps({"fuente": fuente, "total": len(datos), "truncado": True})
+
+    conn.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, f"{fuente}:{payload}"))
+
+
+@contextmanager
+def _instrumented(pool: ConnectionPool) -> Generator[psycopg.Connection, None, None]:
+    """Obtiene una conexión de un pool y mide su uso."""
+    inicio = time.perf_counter()
+    with pool.connection() as conn:
+        stats = QueryStats(pool_wait_ms=(time.perf_counter() - inicio) * 1000)
+        conn.query_stats = stats
+        try:
+            yield conn
+        finally:
+            conn.query_stats = None
+            logger.debug(
+                f"Pool {pool.name}: espera {stats.pool_wait_ms:.1f} ms, "
+                f"{stats.count} consultas en {stats.total_ms:.1f} ms"
+            )
 
 
 @contextmanager
 def get_connection() -> Generator[psycopg.Connection, None, None]:
     """
-    Context manager para obtener una conexión del pool.
+    Context manager para obtener una conexión del pool de escritura.
+
+    Lo usan los collectors para insertar datos.
 
     Uso:
         with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("INSERT INTO cetes ...")
+            conn.commit()
+    """
+    with _instrumented(init_write_pool()) as conn:
+        yield conn
+
+
+@contextmanager
+def get_read_connection() -> Generator[psycopg.Connection, None, None]:
+    """
+    Context manager para obtener una conexión del pool de lectura.
+
+    Uso:
+        with get_read_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT * FROM cetes")
                 rows = cur.fetchall()
     """
-    if pool is None:
-        init_pool()
+    with _instrumented(init_read_pool()) as conn:
+        yield conn
 
-    with pool.connection() as conn:
+
+@contextmanager
+def get_request_connection(request: Request) -> Generator[psycopg.Connection, None, None]:
+    """
+    Conexión del pool de lectura ligada a una petición HTTP.
+
+    Deja las estadísticas de consultas en request.state.query_stats para
+    los middlewares de métricas y de perfilado. Si la petición pide
+    perfilado con EXPLAIN, se capturan los planes de cada SELECT.
+
+    Se usa directamente cuando la conexión sólo se necesita en algunos
+    casos (por ejemplo, con single-flight o snapshot).
+    """
+    with _instrumented(init_read_pool()) as conn:
+        conn.query_stats.explain = getattr(request.state, "profile_explain", False)
+        request.state.query_stats = conn.query_stats
         yield conn
 
 
-def get_db() -> Generator[psycopg.Connection, None, None]:
+def get_db(request: Request) -> Generator[psycopg.Connection, None, None]:
     """
-    Dependency para FastAPI.
+    Dependency para FastAPI (pool de lectura).
 
     Uso:
         @app.get("/endpoint")
         def endpoint(db: psycopg.Connection = Depends(get_db)):
             ...
     """
-    if pool is None:
-        init_pool()
-
-    with pool.connection() as conn:
+    with get_request_connection(request) as conn:
         yield conn
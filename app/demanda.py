@@ -0,0 +1,81 @@
+"""
+Demanda de cada ticker de fondos (consultas a /api/fondos/{ticker}).
+
+El planificador de ETFs (app.collectors.watchlist) la usa para gastar
+las llamadas del día en los tickers que se consultan. Cada worker de la
+API cuenta las consultas en memoria, sin tocar la base de datos en la
+petición, y cada ETF_DEMANDA_FLUSH_SECONDS las suma a
+etf_watchlist.demanda con una sola UPDATE (en el pool de escritura).
+Las consultas a tickers fuera de la watchlist no se guardan.
+"""
+
+import threading
+from collections import Counter
+
+import psycopg
+from loguru import logger
+
+from app.config import get_settings
+
+
+# Tickers distintos que se cuentan entre volcados (acota la memoria ante
+# consultas a tickers inventados)
+MAX_TICKERS = 10_000
+
+_consultas: Counter[str] = Counter()
+_lock = threading.Lock()
+_hilo: threading.Thread | None = None
+_stop = threading.Event()
+
+
+def registrar_consulta(ticker: str) -> None:
+    """Cuenta una consulta al ticker."""
+    ticker = ticker.upper()
+    with _lock:
+        if ticker in _consultas or len(_consultas) < MAX_TICKERS:
+            _consultas[ticker] += 1
+
+
+def volcar_demanda() -> None:
+    """Suma a la base de datos las consultas contadas desde el último volcado."""
+    from app.collectors.watchlist import sumar_demanda
+    from app.database import get_connection
+
+    global _consultas
+    with _lock:
+        consultas, _consultas = _consultas, Counter()
+    if not consultas:
+        return
+
+    try:
+        with get_connection() as conn:
+            sumar_demanda(conn, dict(consultas))
+    except psycopg.Error as e:
+        # Se pierden las consultas de este intervalo; la demanda es aproximada
+        logger.error(f"No se pudo guardar la demanda de {len(consultas)} tickers: {e}")
+
+
+def _volcar_loop() -> None:
+    intervalo = get_settings().ETF_DEMANDA_FLUSH_SECONDS
+    while not _stop.wait(intervalo):
+        volcar_demanda()
+
+
+def start_demanda() -> None:
+    """Arranca el hilo que guarda la demanda periódicamente."""
+    global _hilo
+    if _hilo is not None:
+        return
+    _stop.clear()
+    _hilo = threading.Thread(target=_volcar_loop, name="demanda", daemon=True)
+    _hilo.start()
+
+
+def stop_demanda() -> None:
+    """Detiene el hilo y guarda lo que quedó contado."""
+    global _hilo
+    if _hilo is not None:
+        _stop.set()
+        _hilo.join(timeout=5)
+        _hilo = None
+        volcar_demanda()
@@ -0,0 +1,73 @@
+"""
+Reporte del tiempo de importación de la aplicación.
+
+Ejecuta `python -X importtime` en un proceso limpio y muestra los módulos
+que más tardan en importarse, para vigilar el arranque en frío.
+
+Uso:
+    python -m app.importtime                 # importa app.main y crea la app
+    python -m app.importtime app.database    # otro módulo
+    python -m app.importtime --top 30
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+
+def measure_imports(modulo: str, crear_app: bool) -> list[tuple[str, int, int]]:
+    """
+    Importa un módulo en un proceso nuevo con -X importtime.
+
+    Returns:
+        Lista de (módulo, tiempo propio en µs, tiempo acumulado en µs)
+    """
+    codigo = f"import {modulo}"
+    if crear_app:
+        codigo += f"; {modulo}.create_app()"
+
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        capture_output=True,
+        text=True,
+    )
+    if resultado.returncode != 0:
+        raise RuntimeError(resultado.stderr.strip().splitlines()[-1])
+
+    modulos = []
+    for linea in resultado.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        modulos.append((nombre.strip(), int(propio), int(acumulado)))
+    return modulos
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reporte de tiempo de importación")
+    parser.add_argument("modulo", nargs="?", default="app.main")
+    parser.add_argument("--top", type=int, default=20, help="Módulos a mostrar")
+    args = parser.parse_args()
+
+    crear_app = args.modulo == "app.main"
+
+    inicio = time.perf_counter()
+    modulos = measure_imports(args.modulo, crear_app)
+    total_ms = (time.perf_counter() - inicio) * 1000
+
+    print(f"Arranque de '{args.modulo}'{' + create_app()' if crear_app else ''}: {total_ms:.0f} ms (proceso completo)")
+    print(f"Módulos importados: {len(modulos)}\n")
+
+    print(f"{'acumulado ms':>13} {'propio ms':>10}  módulo")
+    for nombre, propio, acumulado in sorted(modulos, key=lambda m: m[2], reverse=True)[:args.top]:
+        print(f"{acumulado / 1000:13.1f} {propio / 1000:10.1f}  {nombre}")
+
+    pesados = {"requests", "bs4", "lxml", "apscheduler", "yfinance"}
+    cargados = sorted(pesados & {nombre for nombre, _, _ in modulos})
+    if cargados:
+        print(f"\nAviso: se importaron dependencias de collectors: {', '.join(cargados)}")
+
+
+if __name__ == "__main__":
+    main()
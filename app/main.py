@@ -5,67 +5,55 @@ API REST para consultar rendimientos financieros de:
 - CETES (Certificados de la Tesorería)
 - SOFIPOs (Sociedades Financieras Populares)
 - ETFs y Fondos de Inversión
+
+La aplicación se construye con create_app(). `app.main:app` se crea en el
+primer acceso, así que importar este módulo no importa los routers:
+
+    uvicorn app.main:app
+    uvicorn app.main:create_app --factory
 """
 
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import APIRouter, FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.config import settings
-from app.database import init_pool, close_pool
-from app.routers import cetes, sofipos, fondos, comparar
+from app.cache import start_cache, stop_cache
+from app.config import get_settings
+from app.database import close_pool, get_pool_stats, warm_up_pool
+from app.demanda import start_demanda, stop_demanda
+from app.scheduler import start_scheduler, stop_scheduler
+from app.snapshot import start_snapshot, stop_snapshot
+from app.stream import broadcaster
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Maneja el ciclo de vida de la aplicación."""
-    # Startup
-    init_pool()
+    # Startup: la API sólo lee; el pool de escritura se abre bajo demanda
+    warm_up_pool()
+    start_snapshot()
+    start_cache()
+    start_demanda()
+    start_scheduler()
     yield
     # Shutdown
+    from app.backtest import close_backtest_pool
+
+    stop_demanda()
+    stop_cache()
+    await broadcaster.stop()
+    stop_scheduler()
+    stop_snapshot()
+    close_backtest_pool()
     close_pool()
 
 
-app = FastAPI(
-    title="Financial Rates API",
-    description="""
-API para consultar rendimientos financieros en México.
-
-## Endpoints disponibles
-
-- **CETES**: Tasas de Certificados de la Tesorería
-- **SOFIPOs**: Rendimientos de Sociedades Financieras Populares
-- **Fondos/ETFs**: Precios y rendimientos de ETFs internacionales
-- **Comparar**: Comparación entre diferentes instrumentos
+# Endpoints generales (raíz, salud y métricas)
+router = APIRouter()
 
-## Fuentes de datos
 
-- CETES: API oficial de Banxico SIE
-- SOFIPOs: Datos públicos de instituciones reguladas
-- ETFs: Alpha Vantage API
-    """,
-    version="1.0.0",
-    lifespan=lifespan,
-)
-
-# Configurar CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # En producción, especificar dominios
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Registrar routers
-app.include_router(cetes.router, prefix="/api")
-app.include_router(sofipos.router, prefix="/api")
-app.include_router(fondos.router, prefix="/api")
-app.include_router(comparar.router, prefix="/api")
-
-
-@app.get("/")
+@router.get("/")
 def root():
     """Información de la API."""
     return {
@@ -77,12 +65,101 @@ def root():
             "sofipos": "/api/sofipos",
             "fondos": "/api/fondos",
             "comparar": "/api/comparar",
+            "stream": "/api/stream",
+            "backtest": "/api/backtest",
+            "status": "/api/status/fuentes",
+            "admin": "/api/admin",
         },
+        "metricas": "/metrics",
         "documentacion": "/docs",
     }
 
 
-@app.get("/health")
+@router.get("/health")
 def health_check():
     """Health check para monitoreo."""
-    return {"status": "ok", "environment": settings.ENVIRONMENT}
+    return {"status": "ok", "environment": get_settings().ENVIRONMENT}
+
+
+@router.get("/health/db")
+def health_db():
+    """Estadísticas de los pools de conexiones (espera, uso y timeouts)."""
+    return {"pools": get_pool_stats()}
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métricas en formato de exposición de Prometheus."""
+    from app.metrics import render_metrics
+
+    contenido, content_type = render_metrics()
+    return Response(content=contenido, media_type=content_type)
+
+
+def create_app() -> FastAPI:
+    """Construye la aplicación FastAPI con middlewares y routers."""
+    from app.metrics import MetricsMiddleware
+    from app.profiling import ProfilingMiddleware
+    from app.routers import cetes, sofipos, fondos, comparar, stream, backtest, status, admin
+
+    app = FastAPI(
+        title="Financial Rates API",
+        description="""
+API para consultar rendimientos financieros en México.
+
+## Endpoints disponibles
+
+- **CETES**: Tasas de Certificados de la Tesorería
+- **SOFIPOs**: Rendimientos de Sociedades Financieras Populares
+- **Fondos/ETFs**: Precios y rendimientos de ETFs internacionales
+- **Comparar**: Comparación entre diferentes instrumentos
+- **Backtest**: Simulación histórica de estrategias CETES/ETF
+- **Estado**: Frescura de cada fuente (última ejecución exitosa y dato más reciente)
+- **Admin**: Recopilaciones bajo demanda en la cola de workers (requiere X-Admin-Token)
+
+## Fuentes de datos
+
+- CETES: API oficial de Banxico SIE
+- SOFIPOs: Datos públicos de instituciones reguladas
+- ETFs: Alpha Vantage API
+        """,
+        version="1.0.0",
+        lifespan=lifespan,
+    )
+
+    # Configurar CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # En producción, especificar dominios
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Perfilado opcional por petición (ENABLE_PROFILING + cabecera X-Profile)
+    app.add_middleware(ProfilingMiddleware)
+
+    # Métricas Prometheus (latencia, tamaño de respuesta y tiempo en DB por ruta)
+    app.add_middleware(MetricsMiddleware)
+
+    # Registrar routers
+    app.include_router(cetes.router, prefix="/api")
+    app.include_router(sofipos.router, prefix="/api")
+    app.include_router(fondos.router, prefix="/api")
+    app.include_router(comparar.router, prefix="/api")
+    app.include_router(stream.router, prefix="/api")
+    app.include_router(backtest.router, prefix="/api")
+    app.include_router(status.router, prefix="/api")
+    app.include_router(admin.router, prefix="/api")
+
+    app.include_router(router)
+    return app
+
+
+def __getattr__(name: str):
+    """Crea `app` en el primer acceso (uvicorn app.main:app)."""
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
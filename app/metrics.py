@@ -0,0 +1,213 @@
+"""
+Métricas Prometheus de la API y de los collectors.
+
+La API expone las métricas en /metrics. El middleware es ASGI puro para
+que el costo por petición sea sólo unas cuantas observaciones de
+histogramas; las estadísticas de los pools se leen al momento del scrape.
+
+Con varios workers de uvicorn, definir PROMETHEUS_MULTIPROC_DIR para
+agregar las métricas de todos los procesos.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Generator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from app.database import get_pool_stats
+
+
+# Métricas HTTP
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latencia de las peticiones por ruta",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Tamaño del cuerpo de las respuestas por ruta",
+    ["route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Peticiones en proceso",
+    multiprocess_mode="livesum",
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds",
+    "Tiempo en consultas a la base de datos por petición",
+    ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+SINGLEFLIGHT_SHARED = Counter(
+    "http_singleflight_shared_total",
+    "Peticiones que reutilizaron una consulta idéntica en curso",
+    ["consulta"],
+)
+
+RESPONSE_CACHE = Counter(
+    "http_response_cache_total",
+    "Consultas de la caché de respuestas (hit, stale: servida mientras se recalcula, miss)",
+    ["consulta", "resultado"],
+)
+
+# Métricas de collectors
+COLLECTOR_RUN_DURATION = Histogram(
+    "collector_run_duration_seconds",
+    "Duración de cada ejecución de un collector",
+    ["fuente"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800),
+)
+COLLECTOR_ROWS_INSERTED = Counter(
+    "collector_rows_inserted_total",
+    "Registros insertados por los collectors",
+    ["fuente"],
+)
+EXTERNAL_API_LATENCY = Histogram(
+    "collector_external_request_duration_seconds",
+    "Latencia de las llamadas a APIs externas",
+    ["fuente"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+EXTERNAL_API_BYTES = Counter(
+    "collector_external_api_bytes_total",
+    "Bytes recibidos de APIs externas",
+    ["fuente"],
+)
+COLLECTOR_STAGE_SECONDS = Counter(
+    "collector_stage_seconds_total",
+    "Tiempo acumulado en cada etapa del pipeline de un collector",
+    ["fuente", "etapa"],
+)
+COLLECTOR_STAGE_RECORDS = Counter(
+    "collector_stage_records_total",
+    "Elementos procesados por cada etapa del pipeline (ok / error)",
+    ["fuente", "etapa", "resultado"],
+)
+
+# Etiqueta para peticiones que no coinciden con ninguna ruta
+RUTA_DESCONOCIDA = "sin_ruta"
+
+
+class PoolStatsCollector:
+    """Expone las estadísticas de psycopg_pool al momento del scrape."""
+
+    METRICAS = {
+        "pool_size": "Conexiones abiertas en el pool",
+        "pool_available": "Conexiones libres en el pool",
+        "connections_in_use": "Conexiones en uso",
+        "requests_waiting": "Clientes esperando una conexión",
+        "requests_wait_ms": "Tiempo total de espera por una conexión (ms)",
+        "requests_errors": "Peticiones de conexión fallidas o con timeout",
+    }
+
+    def collect(self):
+        stats = get_pool_stats()
+        for nombre, descripcion in self.METRICAS.items():
+            familia = GaugeMetricFamily(f"db_pool_{nombre}", descripcion, labels=["pool"])
+            for pool, valores in stats.items():
+                familia.add_metric([pool], valores.get(nombre, 0))
+            yield familia
+
+
+REGISTRY.register(PoolStatsCollector())
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide latencia, tamaño de respuesta y tiempo en DB."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # get_db deja aquí las estadísticas de consultas de la petición
+        state = scope.setdefault("state", {})
+        status_code = 500
+        response_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duracion = time.perf_counter() - inicio
+            REQUESTS_IN_FLIGHT.dec()
+
+            route = scope.get("route")
+            ruta = route.path if route is not None else RUTA_DESCONOCIDA
+
+            REQUEST_LATENCY.labels(scope["method"], ruta, str(status_code)).observe(duracion)
+            RESPONSE_SIZE.labels(ruta).observe(response_size)
+
+            query_stats = state.get("query_stats")
+            if query_stats is not None:
+                REQUEST_DB_TIME.labels(ruta).observe(query_stats.total_ms / 1000)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Genera el texto de exposición de Prometheus."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(PoolStatsCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+@contextmanager
+def track_external_call(fuente: str) -> Generator[None, None, None]:
+    """
+    Mide la latencia de una llamada a una API externa.
+
+    Uso:
+        with track_external_call("banxico"):
+            response = requests.get(url)
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        EXTERNAL_API_LATENCY.labels(fuente).observe(time.perf_counter() - inicio)
+
+
+def record_collector_run(fuente: str, duracion: float, insertados: int) -> None:
+    """Registra la duración y los registros insertados de un collector."""
+    COLLECTOR_RUN_DURATION.labels(fuente).observe(duracion)
+    COLLECTOR_ROWS_INSERTED.labels(fuente).inc(insertados)
+
+
+def record_pipeline_stage(fuente: str, etapa: str, segundos: float, ok: int, errores: int) -> None:
+    """Registra el tiempo y los elementos procesados por una etapa del pipeline."""
+    COLLECTOR_STAGE_SECONDS.labels(fuente, etapa).inc(segundos)
+    COLLECTOR_STAGE_RECORDS.labels(fuente, etapa, "ok").inc(ok)
+    COLLECTOR_STAGE_RECORDS.labels(fuente, etapa, "error").inc(errores)
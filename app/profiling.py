@@ -0,0 +1,123 @@
+"""
+Perfilado opcional de peticiones.
+
+Con ENABLE_PROFILING activo, una petición con la cabecera X-Profile
+recibe en la respuesta el número de consultas SQL, el tiempo en la base
+de datos, la espera por conexión y el tiempo en Python:
+
+- X-Profile: 1        -> cabeceras Server-Timing y X-SQL-Count
+- X-Profile: explain  -> además, el cuerpo JSON se envuelve como
+                         {"datos": ..., "perfil": {...}} con el
+                         EXPLAIN (ANALYZE, BUFFERS) de cada SELECT
+
+X-Profile: 0 (o false, no, off) no activa el perfil. Las respuestas en
+streaming (SSE de /api/stream, StreamingResponse) pasan sin perfil: no
+terminan, o no se pueden retener completas, para agregarle cabeceras.
+"""
+
+import json
+import time
+
+from app.config import settings
+
+
+PROFILE_HEADER = b"x-profile"
+VALORES_FALSOS = {b"", b"0", b"false", b"no", b"off"}
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI que adjunta el perfil de la petición a la respuesta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ENABLE_PROFILING:
+            await self.app(scope, receive, send)
+            return
+
+        modo = dict(scope["headers"]).get(PROFILE_HEADER, b"").strip().lower()
+        if modo in VALORES_FALSOS:
+            await self.app(scope, receive, send)
+            return
+
+        explain = modo == b"explain"
+        state = scope.setdefault("state", {})
+        state["profile_explain"] = explain
+
+        # Se retiene la respuesta completa para poder agregar el perfil,
+        # salvo que sea streaming: entonces se envía tal cual
+        inicio_respuesta = None
+        cuerpo = []
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal inicio_respuesta, streaming
+            if streaming:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                inicio_respuesta = message
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                if content_type.startswith(b"text/event-stream"):
+                    streaming = True
+                    await send(message)
+            elif message["type"] == "http.response.body":
+                if message.get("more_body", False):
+                    streaming = True
+                    await send(inicio_respuesta)
+                    await send({"type": "http.response.body", "body": b"".join(cuerpo), "more_body": True})
+                    await send(message)
+                else:
+                    cuerpo.append(message.get("body", b""))
+
+        inicio = time.perf_counter()
+        await self.app(scope, receive, send_wrapper)
+        total_ms = (time.perf_counter() - inicio) * 1000
+        if streaming:
+            return
+
+        perfil = _build_profile(state.get("query_stats"), total_ms)
+        body = b"".join(cuerpo)
+        headers = [
+            (k, v) for k, v in inicio_respuesta["headers"]
+            if k.lower() != b"content-length"
+        ]
+
+        content_type = dict(headers).get(b"content-type", b"")
+        if explain and content_type.startswith(b"application/json"):
+            perfil["consultas_detalle"] = state["query_stats"].plans if state.get("query_stats") else []
+            body = json.dumps(
+                {"datos": json.loads(body or b"null"), "perfil": perfil},
+                ensure_ascii=False,
+                default=str,
+            ).encode()
+
+        headers.append((b"content-length", str(len(body)).encode()))
+        headers.append((b"x-sql-count", str(perfil["consultas"]).encode()))
+        headers.append((
+            b"server-timing",
+            (
+                f"db;dur={perfil['tiempo_db_ms']}, "
+                f"pool;dur={perfil['espera_pool_ms']}, "
+                f"app;dur={perfil['tiempo_python_ms']}, "
+                f"total;dur={perfil['tiempo_total_ms']}"
+            ).encode(),
+        ))
+
+        await send({**inicio_respuesta, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _build_profile(query_stats, total_ms: float) -> dict:
+    """Resume el tiempo de una petición entre base de datos y Python."""
+    consultas = query_stats.count if query_stats else 0
+    db_ms = query_stats.total_ms if query_stats else 0.0
+    espera_ms = query_stats.pool_wait_ms if query_stats else 0.0
+
+    return {
+        "consultas": consultas,
+        "tiempo_db_ms": round(db_ms, 2),
+        "espera_pool_ms": round(espera_ms, 2),
+        "tiempo_python_ms": round(max(total_ms - db_ms - espera_ms, 0.0), 2),
+        "tiempo_total_ms": round(total_ms, 2),
+    }
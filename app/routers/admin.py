@@ -0,0 +1,146 @@
+"""Router de API para tareas de administración (recopilaciones bajo demanda, su historial, la cuarentena y la watchlist de ETFs)."""
+
+import secrets
+from datetime import datetime
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Path, Query
+import psycopg
+
+from app.collectors.cola import FUENTES, encolar_job, obtener_job, parametros_fuente
+from app.collectors.cuarentena import liberar_cuarentena, listar_cuarentena
+from app.collectors.ejecuciones import listar_ejecuciones
+from app.collectors.watchlist import desactivar_ticker, guardar_tickers, listar_watchlist
+from app.config import get_settings
+from app.database import get_connection, get_db
+from app.schemas.admin import (
+    CuarentenaResponse,
+    EjecucionResponse,
+    JobResponse,
+    WatchlistResponse,
+    WatchlistTicker,
+)
+from app.scheduler import estado_scheduler
+
+
+def verificar_token(x_admin_token: str | None = Header(None)) -> None:
+    """Exige la cabecera X-Admin-Token igual a ADMIN_TOKEN."""
+    token = get_settings().ADMIN_TOKEN
+    if not token:
+        raise HTTPException(status_code=403, detail="Endpoints de administración desactivados (ADMIN_TOKEN)")
+    if not secrets.compare_digest(x_admin_token or "", token):
+        raise HTTPException(status_code=401, detail="X-Admin-Token inválido")
+
+
+router = APIRouter(prefix="/admin", tags=["Administración"], dependencies=[Depends(verificar_token)])
+
+
+@router.post("/collect/{fuente}", response_model=JobResponse, status_code=202)
+def encolar_recopilacion(
+    fuente: str = Path(..., description="banxico, etfs o sofipos"),
+    dias: int = Query(30, ge=1, le=3650, description="Días hacia atrás de CETES, FIX e inflación"),
+):
+    """
+    Encola la recopilación de una fuente y regresa el job.
+
+    La ejecuta un proceso de `python -m app.collectors.worker`, nunca el
+    que atiende la API. Si la fuente ya tiene un job pendiente o en curso, regresa ese.
+    """
+    if fuente not in FUENTES:
+        raise HTTPException(status_code=404, detail=f"Fuente {fuente} no existe ({', '.join(FUENTES)})")
+
+    with get_connection() as conn:
+        return encolar_job(conn, fuente, parametros_fuente(fuente, dias))
+
+
+@router.post("/refresh", response_model=list[JobResponse], status_code=202)
+def encolar_todas(
+    dias: int = Query(30, ge=1, le=3650, description="Días hacia atrás de CETES, FIX e inflación"),
+):
+    """Encola la recopilación de todas las fuentes (un job por fuente)."""
+    with get_connection() as conn:
+        return [encolar_job(conn, fuente, parametros_fuente(fuente, dias)) for fuente in FUENTES]
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+def consultar_job(job_id: int):
+    """Estado, duración y registros insertados de un job."""
+    # Pool de escritura: una réplica con retraso no vería el job recién encolado
+    with get_connection() as conn:
+        job = obtener_job(conn, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} no encontrado")
+    return job
+
+
+@router.get("/ejecuciones", response_model=list[EjecucionResponse])
+def consultar_ejecuciones(
+    fuente: str | None = Query(None, description="banxico, etfs o sofipos"),
+    desde: datetime | None = Query(None, description="Ejecuciones iniciadas desde (YYYY-MM-DDTHH:MM)"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: psycopg.Connection = Depends(get_db),
+):
+    """
+    Historial de ejecuciones de los collectors, más recientes primero:
+    duración, llamadas HTTP, bytes recibidos, registros y registros por
+    segundo (para ver tendencias de rendimiento).
+    """
+    return listar_ejecuciones(db, fuente, desde, limit)
+
+
+@router.get("/cuarentena", response_model=list[CuarentenaResponse])
+def consultar_cuarentena(
+    fuente: str | None = Query(None, description="banxico, banxico_fix, banxico_inflacion, etfs o sofipos"),
+    pendientes: bool = Query(True, description="Sólo los que no se han liberado"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Registros detenidos por la detección de anomalías, más recientes primero."""
+    # Pool de escritura: una réplica con retraso no vería lo recién liberado
+    with get_connection() as conn:
+        return listar_cuarentena(conn, fuente, pendientes, limit)
+
+
+@router.post("/cuarentena/liberar")
+def liberar_registros(ids: list[int] = Body(..., min_length=1, max_length=1000)):
+    """
+    Carga a su tabla destino registros en cuarentena que se revisaron y
+    son correctos (ej. un cambio de nivel real), con el mismo loader de su
+    collector. Los ids ya liberados se ignoran.
+    """
+    with get_connection() as conn:
+        return liberar_cuarentena(conn, ids)
+
+
+@router.get("/watchlist", response_model=list[WatchlistResponse])
+def consultar_watchlist(
+    limit: int = Query(100, ge=1, le=10_000),
+    incluir_inactivos: bool = Query(False),
+):
+    """
+    Watchlist de ETFs en el orden en que se actualizaría: primero los
+    elegibles, de mayor a menor prioridad (antigüedad, demanda,
+    volatilidad y peso).
+    """
+    # Pool de escritura: la demanda y los intentos se escriben ahí
+    with get_connection() as conn:
+        return listar_watchlist(conn, limit, solo_activos=not incluir_inactivos)
+
+
+@router.post("/watchlist")
+def agregar_watchlist(tickers: list[WatchlistTicker]):
+    """Agrega tickers a la watchlist o actualiza sus datos y peso (y los reactiva)."""
+    with get_connection() as conn:
+        return {"guardados": guardar_tickers(conn, (t.model_dump() for t in tickers))}
+
+
+@router.delete("/watchlist/{ticker}", status_code=204)
+def quitar_watchlist(ticker: str):
+    """Deja de actualizar un ticker; su historial en fondos_etfs se conserva."""
+    with get_connection() as conn:
+        if not desactivar_ticker(conn, ticker):
+            raise HTTPException(status_code=404, detail=f"Ticker {ticker} no está en la watchlist")
+
+
+@router.get("/scheduler")
+def consultar_scheduler():
+    """Fuentes de las que este proceso es líder y próximas ejecuciones programadas."""
+    return estado_scheduler()
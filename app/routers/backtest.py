@@ -0,0 +1,108 @@
+"""Router de API para backtesting de estrategias."""
+
+from datetime import date
+from itertools import product
+
+from fastapi import APIRouter, HTTPException, Query, Request
+
+from app.backtest import ESTRATEGIAS_PREDEFINIDAS, Estrategia, load_history, run_backtests
+from app.config import get_settings
+from app.database import get_request_connection
+from app.schemas.backtest import BacktestRequest, BarridoSchema, ResultadoBacktest
+
+router = APIRouter(prefix="/backtest", tags=["Backtesting"])
+
+
+def _nombre_barrido(plazos: list[int], ticker: str | None, peso: float, rebalanceo: int) -> str:
+    """Nombre descriptivo de una combinación del barrido."""
+    nombre = "CETES " + "/".join(str(p) for p in plazos)
+    if ticker and peso > 0:
+        nombre += f" + {peso:.0%} {ticker} (rebalanceo {rebalanceo} sem)"
+    return nombre
+
+
+def _expandir_barrido(barrido: BarridoSchema) -> list[Estrategia]:
+    """Genera las estrategias del producto de parámetros del barrido."""
+    estrategias = []
+    for plazos, ticker, peso, rebalanceo in product(
+        barrido.plazos, barrido.tickers, barrido.pesos_etf, barrido.rebalanceos
+    ):
+        # Sin ETF el peso y el rebalanceo no cambian el resultado
+        if not ticker and (peso > 0 or rebalanceo != barrido.rebalanceos[0]):
+            continue
+        if ticker and peso == 0:
+            continue
+        estrategias.append(Estrategia(
+            nombre=_nombre_barrido(plazos, ticker, peso, rebalanceo),
+            plazos=tuple(plazos),
+            ticker=ticker,
+            peso_etf=peso,
+            rebalanceo=rebalanceo,
+        ))
+    return estrategias
+
+
+def _ejecutar(
+    request: Request,
+    estrategias: list[Estrategia],
+    fecha_inicio: date | None,
+    fecha_fin: date | None,
+) -> list[dict]:
+    """Carga el histórico una vez y simula todas las estrategias."""
+    if not estrategias:
+        raise HTTPException(status_code=400, detail="No hay estrategias que simular")
+
+    maximo = get_settings().BACKTEST_MAX_ESTRATEGIAS
+    if len(estrategias) > maximo:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El barrido genera {len(estrategias)} estrategias (máximo {maximo})",
+        )
+
+    tickers = sorted({e.ticker for e in estrategias if e.ticker})
+    with get_request_connection(request) as db:
+        hist = load_history(db, fecha_inicio, fecha_fin, tickers)
+
+    if len(hist.fechas) < 2:
+        raise HTTPException(status_code=404, detail="No hay histórico de CETES en el rango")
+
+    # Un ticker sin precios no tumba las demás estrategias: las suyas
+    # regresan sin métricas y con advertencia (ver simulate)
+    return run_backtests(hist, estrategias)
+
+
+@router.get("", response_model=list[ResultadoBacktest])
+def backtest_predefinidas(
+    request: Request,
+    fecha_inicio: date | None = Query(None, description="Fecha inicial (YYYY-MM-DD)"),
+    fecha_fin: date | None = Query(None, description="Fecha final (YYYY-MM-DD)"),
+):
+    """
+    Simula las estrategias predefinidas: rolar CETES 28, escalera
+    91/182/364 y 60/40 CETES/SPY.
+    """
+    return _ejecutar(request, ESTRATEGIAS_PREDEFINIDAS, fecha_inicio, fecha_fin)
+
+
+@router.post("", response_model=list[ResultadoBacktest])
+def backtest(request: Request, peticion: BacktestRequest):
+    """
+    Simula estrategias explícitas y/o un barrido de parámetros.
+
+    Retorna rendimiento total y anualizado, volatilidad anualizada y
+    máximo drawdown (en %) de cada estrategia.
+    """
+    estrategias = [
+        Estrategia(
+            nombre=e.nombre,
+            plazos=tuple(e.plazos),
+            ticker=e.ticker,
+            peso_etf=e.peso_etf,
+            rebalanceo=e.rebalanceo,
+        )
+        for e in peticion.estrategias
+    ]
+    if peticion.barrido:
+        estrategias += _expandir_barrido(peticion.barrido)
+
+    return _ejecutar(request, estrategias, peticion.fecha_inicio, peticion.fecha_fin)
@@ -2,73 +2,174 @@
 
 from datetime import date
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 import psycopg
 
-from app.database import get_db
+from app.columnar import (
+    FormatoJSON,
+    columnar_response,
+    json_response,
+    lista_select,
+    negotiate_format,
+    numerar,
+    seleccionar_campos,
+)
+from app.database import get_db, get_request_connection
 from app.schemas.cetes import CetesResponse
+from app.singleflight import coalesce
+from app.snapshot import get_snapshot
 
 router = APIRouter(prefix="/cetes", tags=["CETES"])
 
+# Límite de registros en JSON; Arrow/Parquet permiten descargas mayores
+MAX_LIMIT_JSON = 200
+MAX_LIMIT_COLUMNAR = 100_000
+
+# Plazos de CETES que se subastan
+PLAZOS_CETES = [28, 91, 182, 364]
+
+# Última subasta de cada plazo hasta %(as_of)s. Cada LATERAL recorre hacia
+# atrás el índice único (plazo, fecha_subasta) y se detiene en la primera fila.
+CETES_AS_OF_SQL = """
+    SELECT c.id, p.plazo, c.tasa, c.fecha_subasta, c.fecha_vencimiento, c.inflacion, c.tasa_real
+    FROM (VALUES (28), (91), (182), (364)) AS p(plazo)
+    CROSS JOIN LATERAL (
+        SELECT id, tasa, fecha_subasta, fecha_vencimiento, inflacion, tasa_real
+        FROM cetes
+        WHERE plazo = p.plazo AND fecha_subasta <= %(as_of)s
+        ORDER BY fecha_subasta DESC
+        LIMIT 1
+    ) c
+"""
+
+# Columnas de CETES para formatos columnares
+COLUMNAS_CETES = {
+    "id": "int32",
+    "plazo": "int32",
+    "tasa": "float64",
+    "fecha_subasta": "date32",
+    "fecha_vencimiento": "date32",
+    "inflacion": "float64",
+    "tasa_real": "float64",
+}
+
 
 @router.get("", response_model=list[CetesResponse])
 def listar_cetes(
+    request: Request,
     plazo: int | None = Query(None, description="Filtrar por plazo (28, 91, 182, 364)"),
-    db: psycopg.Connection = Depends(get_db),
 ):
     """
     Lista las tasas de CETES más recientes.
 
     Si se especifica plazo, filtra por ese plazo.
     """
+    if not plazo:
+        # Obtener la última tasa de cada plazo
+        return tasas_actuales(request, None)
+
+    with get_request_connection(request) as db, db.cursor() as cur:
+        cur.execute("""
+            SELECT id, plazo, tasa, fecha_subasta, fecha_vencimiento, inflacion, tasa_real
+            FROM cetes
+            WHERE plazo = %s
+            ORDER BY fecha_subasta DESC
+            LIMIT 10
+        """, (plazo,), prepare=True)
+        rows = cur.fetchall()
+
+    return [CetesResponse(**row) for row in rows]
+
+
+def consultar_tasas_actuales(db: psycopg.Connection, as_of: date | None = None) -> list[dict]:
+    """
+    Consulta la tasa más reciente de cada plazo (serializada a JSON).
+
+    Con as_of, la más reciente hasta esa fecha.
+    """
     with db.cursor() as cur:
-        if plazo:
-            cur.execute("""
-                SELECT id, plazo, tasa, fecha_subasta, fecha_vencimiento
-                FROM cetes
-                WHERE plazo = %s
-                ORDER BY fecha_subasta DESC
-                LIMIT 10
-            """, (plazo,))
+        if as_of:
+            cur.execute(CETES_AS_OF_SQL + " ORDER BY p.plazo", {"as_of": as_of}, prepare=True)
         else:
-            # Obtener la última tasa de cada plazo
             cur.execute("""
-                SELECT DISTINCT ON (plazo) id, plazo, tasa, fecha_subasta, fecha_vencimiento
+                SELECT DISTINCT ON (plazo) id, plazo, tasa, fecha_subasta, fecha_vencimiento,
+                       inflacion, tasa_real
                 FROM cetes
                 ORDER BY plazo, fecha_subasta DESC
-            """)
-
+            """, prepare=True)
         rows = cur.fetchall()
 
-    return [CetesResponse(**row) for row in rows]
+    return [CetesResponse(**row).model_dump(mode="json") for row in rows]
 
 
 @router.get("/actuales", response_model=list[CetesResponse])
-def tasas_actuales(db: psycopg.Connection = Depends(get_db)):
-    """Obtiene las tasas más recientes de cada plazo."""
-    with db.cursor() as cur:
-        cur.execute("""
-            SELECT DISTINCT ON (plazo) id, plazo, tasa, fecha_subasta, fecha_vencimiento
-            FROM cetes
-            ORDER BY plazo, fecha_subasta DESC
-        """)
-        rows = cur.fetchall()
+def tasas_actuales(
+    request: Request,
+    as_of: date | None = Query(None, description="Estado a una fecha (YYYY-MM-DD)"),
+):
+    """
+    Obtiene las tasas más recientes de cada plazo.
 
-    return [CetesResponse(**row) for row in rows]
+    Con as_of, obtiene las que estaban vigentes en esa fecha.
+    """
+    if as_of is None:
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            return snapshot["cetes_actuales"]
+
+    return coalesce(
+        ("cetes_actuales", as_of), request, lambda db: consultar_tasas_actuales(db, as_of)
+    )
+
+
+@router.get("/reales", response_model=list[CetesResponse])
+def tasas_reales(
+    request: Request,
+    as_of: date | None = Query(None, description="Estado a una fecha (YYYY-MM-DD)"),
+):
+    """
+    Última subasta de cada plazo ordenada por tasa real (mayor primero).
+
+    La tasa real se calcula al guardar cada subasta; aquí sólo se ordenan
+    las tasas actuales (a la fecha as_of, si se indica).
+    """
+    actuales = tasas_actuales(request, as_of)
+    return sorted(
+        actuales,
+        key=lambda c: (c["tasa_real"] is None, -float(c["tasa_real"] or 0)),
+    )
 
 
 @router.get("/historico", response_model=list[CetesResponse])
 def historico_cetes(
+    request: Request,
     plazo: int = Query(..., description="Plazo (28, 91, 182, 364)"),
     fecha_inicio: date | None = Query(None, description="Fecha inicio (YYYY-MM-DD)"),
     fecha_fin: date | None = Query(None, description="Fecha fin (YYYY-MM-DD)"),
-    limit: int = Query(50, le=200),
+    limit: int = Query(50, ge=1, le=MAX_LIMIT_COLUMNAR),
+    campos: str | None = Query(None, description="Campos separados por coma (ej. fecha_subasta,tasa)"),
+    formato: FormatoJSON = Query(FormatoJSON.FILAS, description="JSON por filas o columnar (un arreglo por campo)"),
     db: psycopg.Connection = Depends(get_db),
 ):
-    """Obtiene el histórico de tasas para un plazo específico."""
+    """
+    Obtiene el histórico de tasas para un plazo específico.
+
+    Con `campos` sólo se consultan y envían esas columnas. Con
+    `formato=columnar` o `Accept: application/vnd.apache.arrow.stream` /
+    `application/vnd.apache.parquet` responde por columnas (hasta 100,000
+    registros); en JSON por filas el límite es 200.
+    """
+    columnas = seleccionar_campos(campos, COLUMNAS_CETES)
+    binario = negotiate_format(request)
+    if not binario and formato == FormatoJSON.FILAS and limit > MAX_LIMIT_JSON:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit máximo en JSON por filas es {MAX_LIMIT_JSON}; usar formato=columnar, Arrow o Parquet",
+        )
+
     with db.cursor() as cur:
-        query = """
-            SELECT id, plazo, tasa, fecha_subasta, fecha_vencimiento
+        query = f"""
+            SELECT {lista_select(columnas)}, {numerar("fecha_subasta DESC")}
             FROM cetes
             WHERE plazo = %s
         """
@@ -85,6 +186,11 @@ def historico_cetes(
         query += " ORDER BY fecha_subasta DESC LIMIT %s"
         params.append(limit)
 
+        if binario:
+            return columnar_response(db, query, params, columnas, binario)
+        if campos or formato == FormatoJSON.COLUMNAR:
+            return json_response(db, query, params, columnas, formato)
+
         cur.execute(query, params)
         rows = cur.fetchall()
 
@@ -97,17 +203,17 @@ def obtener_cete_por_plazo(
     db: psycopg.Connection = Depends(get_db),
 ):
     """Obtiene la tasa más reciente para un plazo específico."""
-    if plazo not in [28, 91, 182, 364]:
+    if plazo not in PLAZOS_CETES:
         raise HTTPException(status_code=400, detail="Plazo debe ser 28, 91, 182 o 364")
 
     with db.cursor() as cur:
         cur.execute("""
-            SELECT id, plazo, tasa, fecha_subasta, fecha_vencimiento
+            SELECT id, plazo, tasa, fecha_subasta, fecha_vencimiento, inflacion, tasa_real
             FROM cetes
             WHERE plazo = %s
             ORDER BY fecha_subasta DESC
             LIMIT 1
-        """, (plazo,))
+        """, (plazo,), prepare=True)
         row = cur.fetchone()
 
     if not row:
@@ -1,51 +1,123 @@
 """Router de API para comparación de instrumentos."""
 
-from fastapi import APIRouter, Depends
+from datetime import date
+
+from fastapi import APIRouter, Query, Request
 import psycopg
 
-from app.database import get_db
+from app.routers.cetes import CETES_AS_OF_SQL
+from app.routers.fondos import COLUMNAS_RESPUESTA, FONDOS_AS_OF_SQL
+from app.routers.sofipos import SOFIPOS_AS_OF_SQL
+from app.cache import cached
+from app.schemas.fondos import Moneda
+from app.snapshot import get_snapshot
 
 router = APIRouter(prefix="/comparar", tags=["Comparación"])
 
 
 @router.get("")
-def comparar_instrumentos(db: psycopg.Connection = Depends(get_db)):
+def comparar_instrumentos(
+    request: Request,
+    as_of: date | None = Query(None, description="Estado a una fecha (YYYY-MM-DD)"),
+    moneda: Moneda = Query(Moneda.USD, description="Moneda de precios y rendimientos de los ETFs"),
+):
     """
     Compara rendimientos actuales de CETES, SOFIPOs y ETFs.
 
     Retorna un resumen de los mejores instrumentos en cada categoría.
+    Con as_of, compara los valores vigentes en esa fecha. Con moneda=MXN,
+    los ETFs se comparan con su precio y rendimiento en pesos.
     """
+    if as_of is None:
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            return snapshot["comparar" if moneda == Moneda.USD else "comparar_mxn"]
+
+    return cached(
+        ("comparar", as_of, moneda), request, lambda db: construir_comparacion(db, as_of, moneda)
+    )
+
+
+def construir_comparacion(
+    db: psycopg.Connection, as_of: date | None = None, moneda: Moneda = Moneda.USD
+) -> dict:
+    """Consulta y arma la comparación de instrumentos (a la fecha as_of, si se indica)."""
     with db.cursor() as cur:
-        # Obtener CETES actuales
-        cur.execute("""
-            SELECT DISTINCT ON (plazo) plazo, tasa, fecha_subasta
-            FROM cetes
-            ORDER BY plazo, fecha_subasta DESC
-        """)
-        cetes = cur.fetchall()
-
-        # Obtener top 5 SOFIPOs
-        cur.execute("""
-            SELECT nombre, gat_nominal, gat_real
-            FROM sofipos
-            WHERE gat_nominal IS NOT NULL
-            ORDER BY gat_nominal DESC
-            LIMIT 5
-        """)
-        sofipos = cur.fetchall()
-
-        # Obtener top 5 ETFs por rendimiento
-        cur.execute("""
-            SELECT ticker, nombre, precio_actual, rendimiento_ytd
-            FROM fondos_etfs
-            WHERE precio_actual IS NOT NULL
-            ORDER BY rendimiento_ytd DESC NULLS LAST
-            LIMIT 5
-        """)
-        fondos = cur.fetchall()
+        if as_of:
+            cetes, sofipos, fondos = _consultar_a_fecha(cur, as_of, moneda)
+        else:
+            cetes, sofipos, fondos = _consultar_actuales(cur, moneda)
+
+    return _armar_comparacion(cetes, sofipos, fondos, moneda)
+
+
+def _consultar_actuales(cur: psycopg.Cursor, moneda: Moneda) -> tuple[list, list, list]:
+    """Consulta los valores más recientes de cada categoría."""
+    # Obtener CETES actuales
+    cur.execute("""
+        SELECT DISTINCT ON (plazo) plazo, tasa, tasa_real, fecha_subasta
+        FROM cetes
+        ORDER BY plazo, fecha_subasta DESC
+    """, prepare=True)
+    cetes = cur.fetchall()
+
+    # Obtener top 5 SOFIPOs
+    cur.execute("""
+        SELECT nombre, gat_nominal, gat_real
+        FROM sofipos
+        WHERE gat_nominal IS NOT NULL
+        ORDER BY gat_nominal DESC
+        LIMIT 5
+    """, prepare=True)
+    sofipos = cur.fetchall()
+
+    # Obtener top 5 ETFs por rendimiento
+    cur.execute(f"""
+        SELECT ticker, nombre, precio_actual, rendimiento_ytd
+        FROM (SELECT {COLUMNAS_RESPUESTA[moneda]} FROM fondos_etfs) AS f
+        WHERE precio_actual IS NOT NULL
+        ORDER BY rendimiento_ytd DESC NULLS LAST
+        LIMIT 5
+    """, prepare=True)
+    fondos = cur.fetchall()
+
+    return cetes, sofipos, fondos
+
+
+def _consultar_a_fecha(cur: psycopg.Cursor, as_of: date, moneda: Moneda) -> tuple[list, list, list]:
+    """Consulta el último valor de cada instrumento hasta la fecha as_of."""
+    params = {"as_of": as_of}
+
+    cur.execute(CETES_AS_OF_SQL + " ORDER BY p.plazo", params, prepare=True)
+    cetes = cur.fetchall()
+
+    cur.execute(f"""
+        SELECT nombre, gat_nominal, gat_real
+        FROM ({SOFIPOS_AS_OF_SQL}) AS s
+        WHERE gat_nominal IS NOT NULL
+        ORDER BY gat_nominal DESC
+        LIMIT 5
+    """, params, prepare=True)
+    sofipos = cur.fetchall()
+
+    cur.execute(f"""
+        SELECT ticker, nombre, precio_actual, rendimiento_ytd
+        FROM (SELECT {COLUMNAS_RESPUESTA[moneda]} FROM ({FONDOS_AS_OF_SQL}) AS a) AS f
+        WHERE precio_actual IS NOT NULL
+        ORDER BY rendimiento_ytd DESC NULLS LAST
+        LIMIT 5
+    """, params, prepare=True)
+    fondos = cur.fetchall()
+
+    return cetes, sofipos, fondos
+
 
+def _armar_comparacion(cetes: list, sofipos: list, fondos: list, moneda: Moneda = Moneda.USD) -> dict:
+    """Arma la respuesta de comparación a partir de las filas consultadas."""
     # Calcular mejor opción
     mejor_cete = max(cetes, key=lambda x: float(x["tasa"])) if cetes else None
+    reales = [c for c in cetes if c["tasa_real"] is not None]
+    mejor_cete_real = max(reales, key=lambda x: float(x["tasa_real"])) if reales else None
     mejor_sofipo = sofipos[0] if sofipos else None
     mejor_fondo = fondos[0] if fondos else None
 
@@ -54,6 +126,7 @@ def comparar_instrumentos(db: psycopg.Connection = Depends(get_db)):
             {
                 "plazo": c["plazo"],
                 "tasa": float(c["tasa"]),
+                "tasa_real": float(c["tasa_real"]) if c["tasa_real"] is not None else None,
                 "fecha": str(c["fecha_subasta"]),
             }
             for c in cetes
@@ -66,6 +139,7 @@ def comparar_instrumentos(db: psycopg.Connection = Depends(get_db)):
             }
             for s in sofipos
         ],
+        "moneda_fondos": moneda.value,
         "fondos_top": [
             {
                 "ticker": f["ticker"],
@@ -80,6 +154,10 @@ def comparar_instrumentos(db: psycopg.Connection = Depends(get_db)):
                 "plazo": mejor_cete["plazo"],
                 "tasa": float(mejor_cete["tasa"]),
             } if mejor_cete else None,
+            "mejor_cete_real": {
+                "plazo": mejor_cete_real["plazo"],
+                "tasa_real": float(mejor_cete_real["tasa_real"]),
+            } if mejor_cete_real else None,
             "mejor_sofipo": {
                 "nombre": mejor_sofipo["nombre"],
                 "gat_nominal": float(mejor_sofipo["gat_nominal"]),
@@ -1,27 +1,124 @@
 """Router de API para Fondos/ETFs."""
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 import psycopg
 
+from app.cache import cached
+from app.columnar import (
+    FormatoJSON,
+    columnar_response,
+    json_response,
+    lista_select,
+    negotiate_format,
+    numerar,
+    seleccionar_campos,
+)
 from app.database import get_db
-from app.schemas.fondos import FondoResponse
+from app.demanda import registrar_consulta
+from app.schemas.fondos import FondoResponse, Moneda
+from app.snapshot import TOP_SNAPSHOT, get_snapshot
 
 router = APIRouter(prefix="/fondos", tags=["Fondos/ETFs"])
 
+# Límite de registros en JSON; Arrow/Parquet permiten descargas mayores
+MAX_LIMIT_JSON = 200
+MAX_LIMIT_COLUMNAR = 100_000
+
+# Último registro de cada ticker hasta %(as_of)s. Los tickers se obtienen
+# saltando por el índice único (ticker, fecha_actualizacion) y cada LATERAL
+# toma la fila más reciente con LIMIT 1, sin recorrer toda la tabla.
+FONDOS_AS_OF_SQL = """
+    WITH RECURSIVE tickers AS (
+        (SELECT ticker FROM fondos_etfs ORDER BY ticker LIMIT 1)
+        UNION ALL
+        SELECT (
+            SELECT f.ticker FROM fondos_etfs f
+            WHERE f.ticker > t.ticker
+            ORDER BY f.ticker
+            LIMIT 1
+        )
+        FROM tickers t
+        WHERE t.ticker IS NOT NULL
+    )
+    SELECT f.*
+    FROM tickers t
+    CROSS JOIN LATERAL (
+        SELECT id, ticker, nombre, tipo, mercado, precio_actual,
+               rendimiento_anual, rendimiento_ytd, fecha_actualizacion,
+               tipo_cambio, precio_mxn, rendimiento_anual_mxn, rendimiento_ytd_mxn
+        FROM fondos_etfs
+        WHERE ticker = t.ticker AND fecha_actualizacion <= %(as_of)s
+        ORDER BY fecha_actualizacion DESC
+        LIMIT 1
+    ) f
+"""
+
+# Columnas de fondos para formatos columnares y proyección con ?campos=
+COLUMNAS_FONDOS = {
+    "id": "int32",
+    "ticker": "string",
+    "nombre": "string",
+    "tipo": "string",
+    "mercado": "string",
+    "precio_actual": "float64",
+    "rendimiento_anual": "float64",
+    "rendimiento_ytd": "float64",
+    "fecha_actualizacion": "date32",
+    "tipo_cambio": "float64",
+    "moneda": "string",
+}
+
+# Expresión de las columnas de la respuesta que no son columnas de la
+# tabla, por moneda. En pesos se sirven las columnas calculadas al
+# guardar (app.collectors.divisas) con los mismos nombres, sin convertir
+# nada por petición.
+EXPRESIONES_FONDOS = {
+    Moneda.USD: {"moneda": "'USD'"},
+    Moneda.MXN: {
+        "precio_actual": "precio_mxn",
+        "rendimiento_anual": "rendimiento_anual_mxn",
+        "rendimiento_ytd": "rendimiento_ytd_mxn",
+        "moneda": "'MXN'",
+    },
+}
+
+# Columnas de la respuesta por moneda
+COLUMNAS_RESPUESTA = {
+    moneda: lista_select(COLUMNAS_FONDOS, expresiones)
+    for moneda, expresiones in EXPRESIONES_FONDOS.items()
+}
+
+# Columna de rendimiento YTD por moneda (filtros y orden)
+RENDIMIENTO_YTD = {
+    Moneda.USD: "rendimiento_ytd",
+    Moneda.MXN: "rendimiento_ytd_mxn",
+}
+
 
 @router.get("", response_model=list[FondoResponse])
 def listar_fondos(
+    request: Request,
     tipo: str | None = Query(None, description="Filtrar por tipo (ETF, MUTUAL_FUND)"),
     mercado: str | None = Query(None, description="Filtrar por mercado (US, MX, GLOBAL)"),
-    limit: int = Query(20, le=100),
+    limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    moneda: Moneda = Query(Moneda.USD, description="Moneda de precios y rendimientos"),
+    campos: str | None = Query(None, description="Campos separados por coma (ej. ticker,rendimiento_ytd)"),
+    formato: FormatoJSON = Query(FormatoJSON.FILAS, description="JSON por filas o columnar (un arreglo por campo)"),
     db: psycopg.Connection = Depends(get_db),
 ):
-    """Lista todos los fondos/ETFs con filtros opcionales."""
+    """
+    Lista todos los fondos/ETFs con filtros opcionales.
+
+    Con `campos` sólo se consultan y envían esas columnas; con
+    `formato=columnar` (o Arrow/Parquet en Accept) responde por columnas.
+    """
+    columnas = seleccionar_campos(campos, COLUMNAS_FONDOS)
     with db.cursor() as cur:
-        query = """
-            SELECT id, ticker, nombre, tipo, mercado, precio_actual,
-                   rendimiento_anual, rendimiento_ytd, fecha_actualizacion
+        query = f"""
+            SELECT {lista_select(columnas, EXPRESIONES_FONDOS[moneda])}, {numerar("ticker")}
             FROM fondos_etfs
             WHERE 1=1
         """
@@ -38,6 +135,12 @@ def listar_fondos(
         query += " ORDER BY ticker LIMIT %s OFFSET %s"
         params.extend([limit, offset])
 
+        binario = negotiate_format(request)
+        if binario:
+            return columnar_response(db, query, params, columnas, binario)
+        if campos or formato == FormatoJSON.COLUMNAR:
+            return json_response(db, query, params, columnas, formato)
+
         cur.execute(query, params)
         rows = cur.fetchall()
 
@@ -47,39 +150,126 @@ def listar_fondos(
 @router.get("/buscar", response_model=list[FondoResponse])
 def buscar_fondos(
     q: str = Query(..., min_length=1, description="Buscar por ticker o nombre"),
-    limit: int = Query(10, le=50),
+    limit: int = Query(10, ge=1, le=50),
+    moneda: Moneda = Query(Moneda.USD, description="Moneda de precios y rendimientos"),
     db: psycopg.Connection = Depends(get_db),
 ):
     """Busca fondos por ticker o nombre."""
     with db.cursor() as cur:
-        cur.execute("""
-            SELECT id, ticker, nombre, tipo, mercado, precio_actual,
-                   rendimiento_anual, rendimiento_ytd, fecha_actualizacion
+        cur.execute(f"""
+            SELECT {COLUMNAS_RESPUESTA[moneda]}
             FROM fondos_etfs
             WHERE ticker ILIKE %s OR nombre ILIKE %s
             ORDER BY ticker
             LIMIT %s
-        """, (f"%{q}%", f"%{q}%", limit))
+        """, (f"%{q}%", f"%{q}%", limit), prepare=True)
         rows = cur.fetchall()
 
     return [FondoResponse(**row) for row in rows]
 
 
+def consultar_top_fondos(
+    db: psycopg.Connection, limit: int, as_of: date | None = None, moneda: Moneda = Moneda.USD
+) -> list[dict]:
+    """
+    Consulta los fondos con mejor rendimiento YTD (serializados a JSON).
+
+    Con as_of, usa el último registro de cada ticker hasta esa fecha.
+    """
+    columnas = COLUMNAS_RESPUESTA[moneda]
+    ytd = RENDIMIENTO_YTD[moneda]
+    with db.cursor() as cur:
+        if as_of:
+            cur.execute(f"""
+                SELECT {columnas} FROM ({FONDOS_AS_OF_SQL}) AS f
+                WHERE {ytd} IS NOT NULL
+                ORDER BY {ytd} DESC
+                LIMIT %(limit)s
+            """, {"as_of": as_of, "limit": limit}, prepare=True)
+            return [FondoResponse(**row).model_dump(mode="json") for row in cur.fetchall()]
+
+        cur.execute(f"""
+            SELECT {columnas}
+            FROM fondos_etfs
+            WHERE {ytd} IS NOT NULL
+            ORDER BY {ytd} DESC
+            LIMIT %s
+        """, (limit,), prepare=True)
+        rows = cur.fetchall()
+
+    return [FondoResponse(**row).model_dump(mode="json") for row in rows]
+
+
 @router.get("/top", response_model=list[FondoResponse])
 def top_fondos(
-    limit: int = Query(10, le=50),
+    request: Request,
+    limit: int = Query(10, ge=1, le=50),
+    as_of: date | None = Query(None, description="Estado a una fecha (YYYY-MM-DD)"),
+    moneda: Moneda = Query(Moneda.USD, description="Moneda de precios y rendimientos"),
+):
+    """Obtiene los fondos con mejor rendimiento YTD (a la fecha as_of, si se indica)."""
+    if as_of is None:
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            clave = "fondos_top" if moneda == Moneda.USD else "fondos_top_mxn"
+            return snapshot[clave][:limit]
+
+    # Se cachea el top completo (hasta el limit máximo) y se recorta por petición
+    return cached(
+        ("fondos_top", as_of, moneda),
+        request,
+        lambda db: consultar_top_fondos(db, TOP_SNAPSHOT, as_of, moneda),
+    )[:limit]
+
+
+@router.get("/{ticker}/historico", response_model=list[FondoResponse])
+def historico_fondo(
+    request: Request,
+    ticker: str,
+    fecha_inicio: date | None = Query(None, description="Fecha inicio (YYYY-MM-DD)"),
+    fecha_fin: date | None = Query(None, description="Fecha fin (YYYY-MM-DD)"),
+    limit: int = Query(50, ge=1, le=MAX_LIMIT_COLUMNAR),
+    moneda: Moneda = Query(Moneda.USD, description="Moneda de precios y rendimientos"),
     db: psycopg.Connection = Depends(get_db),
 ):
-    """Obtiene los fondos con mejor rendimiento YTD."""
+    """
+    Obtiene el histórico de precios y rendimientos de un fondo/ETF.
+
+    Con `Accept: application/vnd.apache.arrow.stream` o
+    `application/vnd.apache.parquet` responde en formato columnar binario
+    (hasta 100,000 registros); en JSON el límite es 200.
+    """
+    formato = negotiate_format(request)
+    if not formato and limit > MAX_LIMIT_JSON:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit máximo en JSON es {MAX_LIMIT_JSON}; usar Arrow o Parquet para más registros",
+        )
+
+    registrar_consulta(ticker)
+    query = f"""
+        SELECT {COLUMNAS_RESPUESTA[moneda]}
+        FROM fondos_etfs
+        WHERE ticker = %s
+    """
+    params = [ticker.upper()]
+
+    if fecha_inicio:
+        query += " AND fecha_actualizacion >= %s"
+        params.append(fecha_inicio)
+
+    if fecha_fin:
+        query += " AND fecha_actualizacion <= %s"
+        params.append(fecha_fin)
+
+    query += " ORDER BY fecha_actualizacion DESC LIMIT %s"
+    params.append(limit)
+
+    if formato:
+        return columnar_response(db, query, params, COLUMNAS_FONDOS, formato, orden="q.fecha_actualizacion DESC")
+
     with db.cursor() as cur:
-        cur.execute("""
-            SELECT id, ticker, nombre, tipo, mercado, precio_actual,
-                   rendimiento_anual, rendimiento_ytd, fecha_actualizacion
-            FROM fondos_etfs
-            WHERE rendimiento_ytd IS NOT NULL
-            ORDER BY rendimiento_ytd DESC
-            LIMIT %s
-        """, (limit,))
+        cur.execute(query, params)
         rows = cur.fetchall()
 
     return [FondoResponse(**row) for row in rows]
@@ -88,18 +278,24 @@ def top_fondos(
 @router.get("/{ticker}", response_model=FondoResponse)
 def obtener_fondo(
     ticker: str,
+    moneda: Moneda = Query(Moneda.USD, description="Moneda de precios y rendimientos"),
     db: psycopg.Connection = Depends(get_db),
 ):
-    """Obtiene un fondo/ETF por su ticker."""
+    """
+    Obtiene un fondo/ETF por su ticker.
+
+    Cada consulta cuenta como demanda del ticker: los más consultados se
+    actualizan antes (app.collectors.watchlist).
+    """
+    registrar_consulta(ticker)
     with db.cursor() as cur:
-        cur.execute("""
-            SELECT id, ticker, nombre, tipo, mercado, precio_actual,
-                   rendimiento_anual, rendimiento_ytd, fecha_actualizacion
+        cur.execute(f"""
+            SELECT {COLUMNAS_RESPUESTA[moneda]}
             FROM fondos_etfs
             WHERE ticker = %s
             ORDER BY fecha_actualizacion DESC
             LIMIT 1
-        """, (ticker.upper(),))
+        """, (ticker.upper(),), prepare=True)
         row = cur.fetchone()
 
     if not row:
@@ -1,55 +1,230 @@
 """Router de API para SOFIPOs."""
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
 import psycopg
 
+from app.cache import cached
+from app.columnar import FormatoJSON, json_response, lista_select, numerar, seleccionar_campos
 from app.database import get_db
-from app.schemas.sofipos import SofipoResponse
+from app.schemas.sofipos import SofipoEnPlazo, SofipoResponse, SofipoWithPlazos
+from app.singleflight import coalesce
+from app.snapshot import TOP_SNAPSHOT, get_snapshot
 
 router = APIRouter(prefix="/sofipos", tags=["SOFIPOs"])
 
+# Último registro de cada SOFIPO hasta %(as_of)s. Los nombres se obtienen
+# saltando por el índice (nombre, fecha_actualizacion) y cada LATERAL toma
+# la fila más reciente con LIMIT 1, sin recorrer toda la tabla.
+SOFIPOS_AS_OF_SQL = """
+    WITH RECURSIVE nombres AS (
+        (SELECT nombre FROM sofipos ORDER BY nombre LIMIT 1)
+        UNION ALL
+        SELECT (
+            SELECT s.nombre FROM sofipos s
+            WHERE s.nombre > n.nombre
+            ORDER BY s.nombre
+            LIMIT 1
+        )
+        FROM nombres n
+        WHERE n.nombre IS NOT NULL
+    )
+    SELECT s.id, s.nombre, s.gat_nominal, s.gat_real, s.fecha_actualizacion
+    FROM nombres n
+    CROSS JOIN LATERAL (
+        SELECT id, nombre, gat_nominal, gat_real, fecha_actualizacion
+        FROM sofipos
+        WHERE nombre = n.nombre AND fecha_actualizacion <= %(as_of)s
+        ORDER BY fecha_actualizacion DESC
+        LIMIT 1
+    ) s
+"""
+
+# Plazos de la SOFIPO s como arreglo JSON, en la misma consulta (LATERAL
+# sobre el índice (sofipo_id, plazo)) en lugar de una consulta por SOFIPO.
+# La tasa va como texto para conservar la escala del DECIMAL.
+PLAZOS_JSON_SQL = """
+    SELECT COALESCE(json_agg(json_build_object(
+        'id', p.id, 'plazo', p.plazo, 'tasa', p.tasa::text, 'fecha_actualizacion', p.fecha_actualizacion
+    ) ORDER BY p.plazo), '[]'::json) AS plazos
+    FROM sofipo_plazos p
+    WHERE p.sofipo_id = s.id
+"""
+
+# Columnas de SOFIPOs para ?campos= y formato columnar
+COLUMNAS_SOFIPOS = {
+    "id": "int32",
+    "nombre": "string",
+    "gat_nominal": "float64",
+    "gat_real": "float64",
+    "fecha_actualizacion": "date32",
+}
 
-@router.get("", response_model=list[SofipoResponse])
+
+@router.get("", response_model=list[SofipoWithPlazos], response_model_exclude_unset=True)
 def listar_sofipos(
-    limit: int = Query(20, le=100),
+    limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
     ordenar_por: str = Query("gat_nominal", regex="^(gat_nominal|gat_real|nombre)$"),
+    incluir_plazos: bool = Query(False, description="Incluir las tasas por plazo de cada SOFIPO"),
+    campos: str | None = Query(None, description="Campos separados por coma (ej. nombre,gat_nominal)"),
+    formato: FormatoJSON = Query(FormatoJSON.FILAS, description="JSON por filas o columnar (un arreglo por campo)"),
     db: psycopg.Connection = Depends(get_db),
 ):
     """
     Lista todas las SOFIPOs con paginación.
 
-    Ordenar por: gat_nominal, gat_real, nombre
+    Ordenar por: gat_nominal, gat_real, nombre. Con `campos` sólo se
+    consultan y envían esas columnas (plazos es un campo más con
+    incluir_plazos); con `formato=columnar` responde un arreglo por campo.
     """
-    with db.cursor() as cur:
-        cur.execute(f"""
-            SELECT id, nombre, gat_nominal, gat_real, fecha_actualizacion
+    columnas = seleccionar_campos(
+        campos, {**COLUMNAS_SOFIPOS, "plazos": "json"} if incluir_plazos else COLUMNAS_SOFIPOS
+    )
+
+    if "plazos" in columnas:
+        query = f"""
+            SELECT {", ".join(f"s.{c}" if c != "plazos" else "p.plazos" for c in columnas)}, s._fila
+            FROM (
+                SELECT id, nombre, gat_nominal, gat_real, fecha_actualizacion,
+                       {numerar(f"{ordenar_por} DESC NULLS LAST")}
+                FROM sofipos
+                ORDER BY {ordenar_por} DESC NULLS LAST
+                LIMIT %s OFFSET %s
+            ) s
+            CROSS JOIN LATERAL ({PLAZOS_JSON_SQL}) p
+            ORDER BY s.{ordenar_por} DESC NULLS LAST
+        """
+        modelo = SofipoWithPlazos
+    else:
+        query = f"""
+            SELECT {lista_select(columnas)}, {numerar(f"{ordenar_por} DESC NULLS LAST")}
             FROM sofipos
             ORDER BY {ordenar_por} DESC NULLS LAST
             LIMIT %s OFFSET %s
-        """, (limit, offset))
+        """
+        modelo = SofipoResponse
+
+    if campos or formato == FormatoJSON.COLUMNAR:
+        return json_response(db, query, (limit, offset), columnas, formato)
+
+    with db.cursor() as cur:
+        cur.execute(query, (limit, offset), prepare=True)
         rows = cur.fetchall()
 
-    return [SofipoResponse(**row) for row in rows]
+    return [modelo(**row) for row in rows]
 
 
-@router.get("/top", response_model=list[SofipoResponse])
-def top_sofipos(
-    limit: int = Query(10, le=50),
-    db: psycopg.Connection = Depends(get_db),
-):
-    """Obtiene las SOFIPOs con mejor GAT nominal."""
+def consultar_top_sofipos(
+    db: psycopg.Connection, limit: int, as_of: date | None = None
+) -> list[dict]:
+    """
+    Consulta las SOFIPOs con mejor GAT nominal (serializadas a JSON).
+
+    Con as_of, usa el último registro de cada SOFIPO hasta esa fecha.
+    """
     with db.cursor() as cur:
+        if as_of:
+            cur.execute(f"""
+                SELECT * FROM ({SOFIPOS_AS_OF_SQL}) AS s
+                WHERE gat_nominal IS NOT NULL
+                ORDER BY gat_nominal DESC
+                LIMIT %(limit)s
+            """, {"as_of": as_of, "limit": limit}, prepare=True)
+            return [SofipoResponse(**row).model_dump(mode="json") for row in cur.fetchall()]
+
         cur.execute("""
             SELECT id, nombre, gat_nominal, gat_real, fecha_actualizacion
             FROM sofipos
             WHERE gat_nominal IS NOT NULL
             ORDER BY gat_nominal DESC
             LIMIT %s
-        """, (limit,))
+        """, (limit,), prepare=True)
+        rows = cur.fetchall()
+
+    return [SofipoResponse(**row).model_dump(mode="json") for row in rows]
+
+
+@router.get("/top", response_model=list[SofipoResponse])
+def top_sofipos(
+    request: Request,
+    limit: int = Query(10, ge=1, le=50),
+    as_of: date | None = Query(None, description="Estado a una fecha (YYYY-MM-DD)"),
+):
+    """Obtiene las SOFIPOs con mejor GAT nominal (a la fecha as_of, si se indica)."""
+    if as_of is None:
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            return snapshot["sofipos_top"][:limit]
+
+    # Se cachea el top completo (hasta el limit máximo) y se recorta por petición
+    return cached(
+        ("sofipos_top", as_of), request, lambda db: consultar_top_sofipos(db, TOP_SNAPSHOT, as_of)
+    )[:limit]
+
+
+def consultar_sofipos_por_plazo(
+    db: psycopg.Connection, dias: int, tolerancia: int, limit: int, as_of: date | None = None
+) -> list[dict]:
+    """
+    Consulta las SOFIPOs con tasa al plazo indicado, de mayor a menor tasa
+    (serializadas a JSON).
+
+    Usa el último registro de cada SOFIPO hasta as_of (default hoy) y, por
+    SOFIPO, el plazo más cercano a dias dentro de la tolerancia. Todo en una
+    sola consulta, con los plazos de cada SOFIPO agregados con json_agg.
+    """
+    with db.cursor() as cur:
+        cur.execute(f"""
+            SELECT s.id, s.nombre, s.gat_nominal, s.gat_real, s.fecha_actualizacion,
+                   json_build_object(
+                       'id', e.id, 'plazo', e.plazo, 'tasa', e.tasa::text,
+                       'fecha_actualizacion', e.fecha_actualizacion
+                   ) AS plazo_encontrado,
+                   p.plazos
+            FROM ({SOFIPOS_AS_OF_SQL}) AS s
+            CROSS JOIN LATERAL (
+                SELECT id, plazo, tasa, fecha_actualizacion
+                FROM sofipo_plazos
+                WHERE sofipo_id = s.id
+                  AND plazo BETWEEN %(dias)s - %(tolerancia)s AND %(dias)s + %(tolerancia)s
+                ORDER BY abs(plazo - %(dias)s), plazo
+                LIMIT 1
+            ) e
+            CROSS JOIN LATERAL ({PLAZOS_JSON_SQL}) p
+            ORDER BY e.tasa DESC
+            LIMIT %(limit)s
+        """, {
+            "as_of": as_of or date.today(),
+            "dias": dias,
+            "tolerancia": tolerancia,
+            "limit": limit,
+        }, prepare=True)
         rows = cur.fetchall()
 
-    return [SofipoResponse(**row) for row in rows]
+    return [SofipoEnPlazo(**row).model_dump(mode="json") for row in rows]
+
+
+@router.get("/plazo/{dias}", response_model=list[SofipoEnPlazo])
+def sofipos_por_plazo(
+    request: Request,
+    dias: int = Path(..., gt=0, le=3650, description="Plazo en días"),
+    tolerancia: int = Query(0, ge=0, le=90, description="Días de diferencia aceptados (ej. 28 vs 30)"),
+    limit: int = Query(20, ge=1, le=100),
+    as_of: date | None = Query(None, description="Estado a una fecha (YYYY-MM-DD)"),
+):
+    """
+    SOFIPOs que ofrecen el plazo indicado, ordenadas por su tasa a ese plazo.
+
+    Con tolerancia se puede emparejar con los plazos de CETES, ej.
+    /sofipos/plazo/28?tolerancia=2 encuentra los plazos de 30 días.
+    """
+    return coalesce(
+        ("sofipos_plazo", dias, tolerancia, limit, as_of),
+        request,
+        lambda db: consultar_sofipos_por_plazo(db, dias, tolerancia, limit, as_of),
+    )
 
 
 @router.get("/{sofipo_id}", response_model=SofipoResponse)
@@ -63,7 +238,7 @@ def obtener_sofipo(
             SELECT id, nombre, gat_nominal, gat_real, fecha_actualizacion
             FROM sofipos
             WHERE id = %s
-        """, (sofipo_id,))
+        """, (sofipo_id,), prepare=True)
         row = cur.fetchone()
 
     if not row:
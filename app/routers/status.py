@@ -0,0 +1,49 @@
+"""Router de API para el estado de las fuentes de datos."""
+
+import time
+from datetime import timedelta
+
+from fastapi import APIRouter, Request
+
+from app.cache import cached
+from app.collectors.cola import FUENTES
+from app.collectors.ejecuciones import consultar_watermarks
+from app.schemas.status import FuenteEstado
+
+router = APIRouter(prefix="/status", tags=["Estado"])
+
+
+@router.get("/fuentes", response_model=list[FuenteEstado])
+def estado_fuentes(request: Request):
+    """
+    Retraso de cada fuente: desde su última ejecución exitosa y desde su
+    dato más reciente.
+
+    Lee la marca de agua (una fila por fuente, cacheada); el retraso se
+    calcula en cada petición con la hora de la base de datos al leerla.
+    """
+    marcas = cached(
+        ("status_fuentes",),
+        request,
+        lambda db: {**consultar_watermarks(db), "leido": time.monotonic()},
+    )
+    ahora = marcas["ahora"] + timedelta(seconds=time.monotonic() - marcas["leido"])
+    por_fuente = {m["fuente"]: m for m in marcas["fuentes"]}
+
+    estados = []
+    for fuente in sorted({*FUENTES, *por_fuente}):
+        marca = por_fuente.get(fuente)
+        if marca is None:
+            estados.append(FuenteEstado(fuente=fuente, estado="sin_ejecuciones"))
+            continue
+        exito, dato = marca["ultimo_exito_at"], marca["ultimo_dato"]
+        estados.append(FuenteEstado(
+            fuente=fuente,
+            estado="error" if marca["ultimo_error"] else "ok",
+            ultima_ejecucion_at=marca["ultima_ejecucion_at"],
+            ultimo_exito_at=exito,
+            ultimo_dato=dato,
+            retraso_segundos=round((ahora - exito).total_seconds(), 1) if exito else None,
+            retraso_dato_dias=(ahora.date() - dato).days if dato else None,
+        ))
+    return estados
@@ -0,0 +1,98 @@
+"""Router de API para el stream de actualizaciones de tasas."""
+
+import asyncio
+
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.config import get_settings
+from app.stream import broadcaster
+
+router = APIRouter(prefix="/stream", tags=["Stream"])
+
+
+def _parse_fuentes(fuentes: str | None) -> set[str] | None:
+    """Convierte 'cetes,sofipos' en un conjunto de fuentes."""
+    if not fuentes:
+        return None
+    return {f.strip().lower() for f in fuentes.split(",") if f.strip()}
+
+
+@router.get("")
+async def stream_sse(
+    fuentes: str | None = Query(None, description="Filtrar fuentes (cetes, sofipos, fondos)"),
+):
+    """
+    Stream de Server-Sent Events con los datos nuevos de cada fuente.
+
+    Cada evento lleva el nombre de la fuente y como datos un JSON con los
+    registros nuevos. Reemplaza el polling de /api/cetes/actuales y
+    /api/comparar.
+    """
+    sub = broadcaster.subscribe(_parse_fuentes(fuentes))
+    keepalive = get_settings().STREAM_KEEPALIVE_SECONDS
+
+    async def eventos():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    mensaje = await asyncio.wait_for(sub.queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if mensaje is None:
+                    # Cliente descartado por lento; el navegador reconecta
+                    return
+
+                fuente, payload = mensaje
+                yield f"event: {fuente}\ndata: {payload}\n\n"
+        finally:
+            broadcaster.unsubscribe(sub)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _wait_disconnect(websocket: WebSocket) -> None:
+    """Espera a que el cliente cierre el WebSocket."""
+    while True:
+        mensaje = await websocket.receive()
+        if mensaje["type"] == "websocket.disconnect":
+            return
+
+
+@router.websocket("/ws")
+async def stream_websocket(websocket: WebSocket, fuentes: str | None = None):
+    """WebSocket con los mismos mensajes que el stream SSE."""
+    await websocket.accept()
+    sub = broadcaster.subscribe(_parse_fuentes(fuentes))
+    desconexion = asyncio.create_task(_wait_disconnect(websocket))
+
+    try:
+        while True:
+            siguiente = asyncio.create_task(sub.queue.get())
+            done, _ = await asyncio.wait(
+                {siguiente, desconexion}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if desconexion in done:
+                siguiente.cancel()
+                return
+
+            mensaje = siguiente.result()
+            if mensaje is None:
+                # 1013: intentar más tarde (cliente descartado por lento)
+                await websocket.close(code=1013)
+                return
+
+            fuente, payload = mensaje
+            await websocket.send_text(f'{{"evento":"{fuente}","datos":{payload}}}')
+    except WebSocketDisconnect:
+        pass
+    finally:
+        desconexion.cancel()
+        broadcaster.unsubscribe(sub)
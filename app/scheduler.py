@@ -0,0 +1,253 @@
+"""
+Recopilaciones programadas con un solo líder entre réplicas de la API.
+
+Cada proceso con ENABLE_SCHEDULER corre un BackgroundScheduler de
+APScheduler con los horarios SCHEDULE_* (crontab, en SCHEDULER_TIMEZONE).
+Al dispararse un horario, sólo el líder de esa fuente encola el job en
+collector_jobs (lo ejecutan los procesos de app.collectors.worker, nunca
+la API): una publicación de Banxico produce una recopilación, no una por
+réplica, y no se multiplican las llamadas a Alpha Vantage.
+
+Elección de líder: cada fuente tiene un advisory lock de sesión en
+PostgreSQL. Cada proceso intenta tomar los que le faltan cada
+SCHEDULER_LEADER_SECONDS sobre una conexión dedicada (fuera de los pools:
+el lock pertenece a la sesión). Si el líder muere o pierde la red,
+PostgreSQL cierra su sesión (keepalives TCP) y libera el lock; otro
+proceso lo toma en su siguiente intento. Antes de encolar, el líder
+verifica que su sesión siga viva.
+
+La conexión del lock necesita una sesión real: con Supabase, la conexión
+directa o el pooler en modo sesión (puerto 5432), no el de transacciones
+(6543). Ver SCHEDULER_DATABASE_URL; si la URL del lock es un pooler en
+modo transacción, el scheduler no arranca.
+"""
+
+import os
+import socket
+import threading
+from datetime import datetime, timezone
+from typing import Iterable
+
+import psycopg
+from loguru import logger
+
+from app.config import get_settings
+from app.database import es_pooler_transacciones
+
+
+# Primer entero de los advisory locks del scheduler (el segundo es el
+# hash de la fuente), para no chocar con otros usos de pg_advisory_lock
+NAMESPACE_LOCKS = 7301
+
+# Segundos sin respuesta antes de que PostgreSQL dé por muerta la sesión
+# del líder (tcp_keepalives_idle + interval * count)
+KEEPALIVE = {"idle": 10, "interval": 5, "count": 3}
+
+_scheduler = None
+_eleccion: "EleccionLider | None" = None
+
+
+class EleccionLider:
+    """
+    Liderazgo por recurso con advisory locks de sesión.
+
+    Args:
+        recursos: Nombres de los recursos (ej. fuentes)
+        dsn: Conexión dedicada (default SCHEDULER_DATABASE_URL o DATABASE_URL)
+    """
+
+    def __init__(self, recursos: Iterable[str], dsn: str | None = None):
+        settings = get_settings()
+        self.recursos = tuple(recursos)
+        self.dsn = dsn or settings.SCHEDULER_DATABASE_URL or settings.DATABASE_URL
+        self.nombre = f"{socket.gethostname()}:{os.getpid()}"
+        self._conn: psycopg.Connection | None = None
+        self._lider: set[str] = set()
+        self._lock = threading.Lock()
+
+    def _conectar(self) -> psycopg.Connection:
+        """Conexión dedicada con keepalives en ambos extremos."""
+        conn = psycopg.connect(
+            self.dsn,
+            autocommit=True,
+            application_name=f"scheduler {self.nombre}",
+            keepalives=1,
+            keepalives_idle=KEEPALIVE["idle"],
+            keepalives_interval=KEEPALIVE["interval"],
+            keepalives_count=KEEPALIVE["count"],
+        )
+        # Del lado del servidor: libera los locks de un líder inalcanzable
+        for parametro, valor in KEEPALIVE.items():
+            conn.execute(f"SET tcp_keepalives_{parametro} = {int(valor)}")
+        return conn
+
+    def _perder(self, motivo: str | None) -> None:
+        """Cierra la sesión y renuncia a todos los recursos (motivo None = al detener)."""
+        if self._lider and motivo:
+            logger.warning(f"Scheduler {self.nombre}: deja de ser líder de {sorted(self._lider)} ({motivo})")
+        self._lider.clear()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def actualizar(self) -> set[str]:
+        """
+        Verifica la sesión e intenta tomar los recursos sin líder.
+
+        Returns:
+            Recursos de los que este proceso es líder
+        """
+        with self._lock:
+            try:
+                if self._conn is None or self._conn.closed:
+                    self._lider.clear()
+                    self._conn = self._conectar()
+                else:
+                    self._conn.execute("SELECT 1")
+
+                for recurso in self.recursos:
+                    if recurso in self._lider:
+                        continue
+                    tomado = self._conn.execute(
+                        "SELECT pg_try_advisory_lock(%s, hashtext(%s))", (NAMESPACE_LOCKS, recurso)
+                    ).fetchone()[0]
+                    if tomado:
+                        self._lider.add(recurso)
+                        logger.info(f"Scheduler {self.nombre}: líder de {recurso}")
+            except psycopg.Error as e:
+                self._perder(str(e).strip())
+            return set(self._lider)
+
+    def es_lider(self, recurso: str) -> bool:
+        """Si este proceso es líder del recurso, con la sesión verificada ahora."""
+        with self._lock:
+            if recurso not in self._lider:
+                return False
+            try:
+                self._conn.execute("SELECT 1")
+                return True
+            except psycopg.Error as e:
+                self._perder(str(e).strip())
+                return False
+
+    @property
+    def lider(self) -> list[str]:
+        """Recursos de los que este proceso es líder (según la última verificación)."""
+        return sorted(self._lider)
+
+    def liberar(self) -> None:
+        """Cierra la sesión; los locks quedan libres para otro proceso."""
+        with self._lock:
+            if self._lider:
+                logger.info(f"Scheduler {self.nombre}: libera {self.lider}")
+            self._perder(None)
+
+
+def _disparar(fuente: str) -> None:
+    """Horario de una fuente: sólo el líder encola la recopilación."""
+    if _eleccion is None or not _eleccion.es_lider(fuente):
+        logger.debug(f"Scheduler: {fuente} lo encola otro proceso")
+        return
+
+    from app.collectors.cola import encolar_job, parametros_fuente
+    from app.database import get_connection
+
+    with get_connection() as conn:
+        job = encolar_job(conn, fuente, parametros_fuente(fuente))
+    logger.info(f"Scheduler: {fuente} encolado (job {job['id']})")
+
+
+def dsn_locks() -> str | None:
+    """
+    URL de la conexión de los advisory locks, o None si no conserva la
+    sesión (pooler en modo transacción): ahí un lock no garantiza nada y
+    todas las réplicas se creerían líderes.
+    """
+    settings = get_settings()
+    dsn = settings.SCHEDULER_DATABASE_URL or settings.DATABASE_URL
+    if es_pooler_transacciones(dsn):
+        variable = "SCHEDULER_DATABASE_URL" if settings.SCHEDULER_DATABASE_URL else "DATABASE_URL"
+        logger.error(
+            f"Scheduler desactivado: {variable} es un pooler en modo transacción y los "
+            "advisory locks de líder necesitan una sesión. Configurar SCHEDULER_DATABASE_URL "
+            "con la conexión directa o el pooler en modo sesión (puerto 5432)"
+        )
+        return None
+    return dsn
+
+
+def horarios() -> dict[str, str]:
+    """Crontab de cada fuente programada (vacío = sin programar)."""
+    settings = get_settings()
+    programados = {
+        "banxico": settings.SCHEDULE_BANXICO,
+        "etfs": settings.SCHEDULE_ETFS,
+        "sofipos": settings.SCHEDULE_SOFIPOS,
+    }
+    return {fuente: cron for fuente, cron in programados.items() if cron.strip()}
+
+
+def start_scheduler() -> None:
+    """Arranca el scheduler y la elección de líder (si está habilitado)."""
+    global _scheduler, _eleccion
+    settings = get_settings()
+    if not settings.ENABLE_SCHEDULER or _scheduler is not None:
+        return
+
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+
+    programados = horarios()
+    if not programados:
+        return
+    dsn = dsn_locks()
+    if dsn is None:
+        return
+
+    _eleccion = EleccionLider(programados, dsn)
+    _scheduler = BackgroundScheduler(timezone=settings.SCHEDULER_TIMEZONE)
+    _scheduler.add_job(
+        _eleccion.actualizar,
+        "interval",
+        seconds=settings.SCHEDULER_LEADER_SECONDS,
+        id="eleccion",
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.now(timezone.utc),  # primer intento sin esperar el intervalo
+    )
+    for fuente, cron in programados.items():
+        _scheduler.add_job(
+            _disparar,
+            CronTrigger.from_crontab(cron, timezone=settings.SCHEDULER_TIMEZONE),
+            args=[fuente],
+            id=fuente,
+            coalesce=True,
+            misfire_grace_time=300,
+        )
+    _scheduler.start()
+    logger.info(f"Scheduler {_eleccion.nombre}: {programados}")
+
+
+def stop_scheduler() -> None:
+    """Detiene el scheduler y libera los locks de líder."""
+    global _scheduler, _eleccion
+    if _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+    if _eleccion is not None:
+        _eleccion.liberar()
+        _eleccion = None
+
+
+def estado_scheduler() -> dict:
+    """Fuentes de las que este proceso es líder y próximas ejecuciones."""
+    if _scheduler is None:
+        return {"activo": False, "lider": [], "proximas": {}}
+    return {
+        "activo": True,
+        "proceso": _eleccion.nombre,
+        "lider": _eleccion.lider,
+        "proximas": {
+            job.id: job.next_run_time for job in _scheduler.get_jobs() if job.id != "eleccion"
+        },
+    }
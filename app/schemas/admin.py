@@ -0,0 +1,79 @@
+"""Schemas Pydantic para la administración (cola y ejecuciones de los collectors, watchlist de ETFs)."""
+
+from datetime import date, datetime
+
+from pydantic import BaseModel, Field
+
+
+class JobResponse(BaseModel):
+    """Job de la cola de recopilaciones."""
+    id: int
+    fuente: str = Field(..., description="banxico, etfs o sofipos")
+    parametros: dict = Field(default_factory=dict)
+    estado: str = Field(..., description="pendiente, en_curso, completado o error")
+    intentos: int
+    worker: str | None = Field(None, description="host:pid del worker que lo ejecutó")
+    insertados: int | None = Field(None, description="Registros insertados o actualizados")
+    error: str | None = None
+    created_at: datetime
+    iniciado_at: datetime | None = None
+    latido_at: datetime | None = None
+    terminado_at: datetime | None = None
+    duracion_segundos: float | None = None
+
+
+class EjecucionResponse(BaseModel):
+    """Ejecución registrada de un collector (tabla collector_runs)."""
+    id: int
+    fuente: str
+    proceso: str | None = Field(None, description="host:pid que ejecutó el collector")
+    iniciado_at: datetime
+    terminado_at: datetime
+    duracion_segundos: float
+    llamadas_http: int
+    bytes_recibidos: int
+    insertados: int = Field(..., description="Registros insertados o actualizados")
+    estado: str = Field(..., description="ok, parcial o error")
+    errores: dict[str, int] = Field(default_factory=dict, description="Errores por etapa del pipeline")
+    registros_por_segundo: float | None = None
+    error: str | None = None
+
+
+class CuarentenaResponse(BaseModel):
+    """Registro detenido por la detección de anomalías (tabla cuarentena)."""
+    id: int
+    fuente: str
+    tabla: str
+    serie: str = Field(..., description="Plazo, ticker, moneda, índice o nombre")
+    fecha: date
+    valor: float | None = None
+    motivo: str
+    registro: dict
+    created_at: datetime
+    liberado_at: datetime | None = None
+    liberado_por: str | None = Field(None, description="nivel confirmado o admin")
+
+
+class WatchlistTicker(BaseModel):
+    """Ticker que se agrega (o actualiza) en la watchlist de ETFs."""
+    ticker: str = Field(..., min_length=1, max_length=20)
+    nombre: str | None = Field(None, max_length=200)
+    tipo: str = Field("ETF", max_length=50, description="ETF, MUTUAL_FUND, etc.")
+    mercado: str | None = Field(None, max_length=50, description="US, MX, GLOBAL, etc.")
+    peso: float = Field(1.0, gt=0, le=100, description="Multiplicador de la prioridad")
+
+
+class WatchlistResponse(BaseModel):
+    """Ticker de la watchlist con su prioridad actual."""
+    ticker: str
+    nombre: str | None = None
+    tipo: str | None = None
+    mercado: str | None = None
+    activo: bool
+    peso: float
+    demanda: float = Field(..., description="Consultas a /api/fondos/{ticker}, con decaimiento")
+    volatilidad: float | None = Field(None, description="Desviación estándar del cambio diario (%)")
+    prioridad: float
+    elegible: bool = Field(..., description="Si la siguiente ejecución lo puede pedir")
+    actualizado_at: datetime | None = None
+    intentado_at: datetime | None = None
@@ -0,0 +1,82 @@
+"""Schemas Pydantic para backtesting."""
+
+from datetime import date
+
+from pydantic import BaseModel, Field, field_validator
+
+
+PLAZOS_VALIDOS = {28, 91, 182, 364}
+
+
+def _validar_plazos(plazos: list[int]) -> list[int]:
+    """Verifica que los plazos sean de CETES que se subastan."""
+    invalidos = set(plazos) - PLAZOS_VALIDOS
+    if invalidos:
+        raise ValueError(f"Plazos inválidos: {sorted(invalidos)}")
+    return plazos
+
+
+class EstrategiaSchema(BaseModel):
+    """Estrategia a simular."""
+    nombre: str = Field(..., max_length=100)
+    plazos: list[int] = Field([28], min_length=1, description="CETES que se rolan con pesos iguales")
+    ticker: str | None = Field(None, max_length=20, description="ETF de la parte de renta variable")
+    peso_etf: float = Field(0.0, ge=0, le=1)
+    rebalanceo: int = Field(4, ge=1, le=52, description="Semanas entre rebalanceos")
+
+    @field_validator("plazos")
+    @classmethod
+    def validar_plazos(cls, v: list[int]) -> list[int]:
+        return _validar_plazos(v)
+
+
+class BarridoSchema(BaseModel):
+    """Barrido de parámetros: se simula el producto de todas las listas."""
+    plazos: list[list[int]] = Field([[28]], min_length=1)
+    tickers: list[str | None] = Field([None], min_length=1)
+    pesos_etf: list[float] = Field([0.0], min_length=1)
+    rebalanceos: list[int] = Field([4], min_length=1)
+
+    @field_validator("plazos")
+    @classmethod
+    def validar_plazos(cls, v: list[list[int]]) -> list[list[int]]:
+        for plazos in v:
+            if not plazos:
+                raise ValueError("Cada combinación de plazos debe tener al menos uno")
+            _validar_plazos(plazos)
+        return v
+
+    @field_validator("pesos_etf")
+    @classmethod
+    def validar_pesos(cls, v: list[float]) -> list[float]:
+        if any(p < 0 or p > 1 for p in v):
+            raise ValueError("Los pesos deben estar entre 0 y 1")
+        return v
+
+    @field_validator("rebalanceos")
+    @classmethod
+    def validar_rebalanceos(cls, v: list[int]) -> list[int]:
+        if any(r < 1 or r > 52 for r in v):
+            raise ValueError("Los rebalanceos deben estar entre 1 y 52 semanas")
+        return v
+
+
+class BacktestRequest(BaseModel):
+    """Petición de backtesting: estrategias explícitas y/o un barrido."""
+    fecha_inicio: date | None = None
+    fecha_fin: date | None = None
+    estrategias: list[EstrategiaSchema] = []
+    barrido: BarridoSchema | None = None
+
+
+class ResultadoBacktest(BaseModel):
+    """Resultado de una estrategia (rendimientos y riesgo en %)."""
+    nombre: str
+    fecha_inicio: date | None
+    fecha_fin: date | None
+    semanas: int
+    rendimiento_total: float | None
+    rendimiento_anual: float | None
+    volatilidad: float | None = Field(None, description="Volatilidad anualizada")
+    max_drawdown: float | None
+    advertencia: str | None = Field(None, description="Por qué no hay métricas (datos faltantes)")
@@ -22,5 +22,7 @@ class CetesCreate(CetesBase):
 class CetesResponse(CetesBase):
     """Schema para respuesta de API."""
     id: int
+    inflacion: Decimal | None = Field(None, description="Inflación anual a la fecha de subasta")
+    tasa_real: Decimal | None = Field(None, description="Tasa real: (1 + tasa) / (1 + inflación) - 1")
 
     model_config = ConfigDict(from_attributes=True)
@@ -22,6 +22,12 @@ class Mercado(str, Enum):
     GLOBAL = "GLOBAL"
 
 
+class Moneda(str, Enum):
+    """Moneda de precios y rendimientos."""
+    USD = "USD"
+    MXN = "MXN"
+
+
 class FondoBase(BaseModel):
     """Schema base de Fondo/ETF."""
     ticker: str = Field(..., max_length=20)
@@ -42,5 +48,7 @@ class FondoCreate(FondoBase):
 class FondoResponse(FondoBase):
     """Schema de respuesta de Fondo/ETF."""
     id: int
+    moneda: Moneda = Moneda.USD
+    tipo_cambio: Decimal | None = Field(None, description="FIX USD/MXN usado para los valores en pesos")
 
     model_config = ConfigDict(from_attributes=True)
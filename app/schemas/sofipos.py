@@ -48,3 +48,8 @@ class SofipoResponse(SofipoBase):
 class SofipoWithPlazos(SofipoResponse):
     """SOFIPO con sus plazos incluidos."""
     plazos: list[SofipoPlazoResponse] = []
+
+
+class SofipoEnPlazo(SofipoWithPlazos):
+    """SOFIPO con la tasa del plazo solicitado (o el más cercano dentro de la tolerancia)."""
+    plazo_encontrado: SofipoPlazoResponse
@@ -0,0 +1,16 @@
+"""Schemas Pydantic para el estado de las fuentes."""
+
+from datetime import date, datetime
+
+from pydantic import BaseModel, Field
+
+
+class FuenteEstado(BaseModel):
+    """Frescura de una fuente según la marca de agua de sus ejecuciones."""
+    fuente: str = Field(..., description="banxico, etfs o sofipos")
+    estado: str = Field(..., description="ok, error (la última ejecución falló) o sin_ejecuciones")
+    ultima_ejecucion_at: datetime | None = None
+    ultimo_exito_at: datetime | None = None
+    ultimo_dato: date | None = Field(None, description="Fecha del dato más reciente guardado")
+    retraso_segundos: float | None = Field(None, description="Segundos desde la última ejecución exitosa")
+    retraso_dato_dias: int | None = Field(None, description="Días desde el dato más reciente")
@@ -0,0 +1,97 @@
+"""
+Coalescencia de consultas idénticas concurrentes (single-flight).
+
+Cuando llegan varias peticiones iguales al mismo tiempo (caché fría o
+justo después de un collector), sólo la primera toma una conexión del
+pool y ejecuta la consulta; las demás esperan y reciben el mismo
+resultado. El resultado compartido no debe modificarse.
+
+Uso en un router:
+    return coalesce(("fondos_top", limit), request, lambda db: consultar_top_fondos(db, limit))
+"""
+
+import threading
+from typing import Callable, Hashable, TypeVar
+
+import psycopg
+from starlette.requests import Request
+
+from app.database import get_request_connection
+from app.metrics import SINGLEFLIGHT_SHARED
+
+
+T = TypeVar("T")
+
+
+class _Call:
+    """Ejecución en curso de una consulta."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Agrupa ejecuciones concurrentes con la misma clave."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> tuple[T, bool]:
+        """
+        Ejecuta fn una sola vez por clave entre llamadas concurrentes.
+
+        Returns:
+            (resultado, compartido) donde compartido indica que el
+            resultado vino de la ejecución de otra petición
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            lider = call is None
+            if lider:
+                call = self._calls[key] = _Call()
+
+        if not lider:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+
+_flights = SingleFlight()
+
+
+def coalesce(key: tuple, request: Request, query: Callable[[psycopg.Connection], T]) -> T:
+    """
+    Ejecuta una consulta de router con single-flight.
+
+    Args:
+        key: Clave de la consulta (nombre y parámetros)
+        request: Petición actual (para métricas y perfilado)
+        query: Función que recibe la conexión y regresa el resultado
+
+    Returns:
+        Resultado de la consulta, propio o compartido
+    """
+    def ejecutar() -> T:
+        with get_request_connection(request) as db:
+            return query(db)
+
+    resultado, compartido = _flights.do(key, ejecutar)
+    if compartido:
+        SINGLEFLIGHT_SHARED.labels(key[0]).inc()
+    return resultado
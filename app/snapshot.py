@@ -0,0 +1,187 @@
+"""
+Snapshot de tasas actuales compartido entre workers de uvicorn.
+
+Un solo proceso (el que obtiene el lock del archivo) consulta las tasas
+actuales de CETES, SOFIPOs y ETFs cada SNAPSHOT_REFRESH_SECONDS y las
+escribe en un segmento mmap (en /dev/shm cuando existe). Los demás
+workers leen el segmento sin ir a la base de datos; si el refresher
+muere, el lock se libera y otro worker toma su lugar.
+
+Formato del segmento:
+    [versión: u64][longitud: u64][JSON]
+
+La versión funciona como seqlock: es impar mientras se escribe. Cada
+worker decodifica el JSON una sola vez por versión.
+"""
+
+import fcntl
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from app.config import get_settings
+
+
+HEADER = struct.Struct("<QQ")
+
+# Registros que se guardan de cada ranking (máximo `limit` de los endpoints)
+TOP_SNAPSHOT = 50
+
+# (versión, datos decodificados) del último snapshot leído por este worker
+_cache: tuple[int, dict[str, Any] | None] = (-1, None)
+_mmap: mmap.mmap | None = None
+_refresher: threading.Thread | None = None
+_stop = threading.Event()
+
+
+def snapshot_path() -> Path:
+    """Ruta del segmento compartido."""
+    settings = get_settings()
+    if settings.SNAPSHOT_PATH:
+        return Path(settings.SNAPSHOT_PATH)
+    base = Path("/dev/shm") if Path("/dev/shm").is_dir() else Path(tempfile.gettempdir())
+    return base / "financial_rates_snapshot"
+
+
+def _open_segment() -> mmap.mmap:
+    """Abre (o crea) el segmento con el tamaño configurado."""
+    global _mmap
+    if _mmap is None:
+        tamano = HEADER.size + get_settings().SNAPSHOT_MAX_BYTES
+        fd = os.open(snapshot_path(), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < tamano:
+                os.ftruncate(fd, tamano)
+            _mmap = mmap.mmap(fd, tamano)
+        finally:
+            os.close(fd)
+    return _mmap
+
+
+def write_snapshot(data: dict[str, Any]) -> None:
+    """Escribe un snapshot nuevo en el segmento compartido."""
+    payload = json.dumps(data, separators=(",", ":"), default=str).encode()
+    segmento = _open_segment()
+
+    if HEADER.size + len(payload) > len(segmento):
+        logger.error(f"Snapshot de {len(payload)} bytes excede SNAPSHOT_MAX_BYTES")
+        return
+
+    version, _ = HEADER.unpack_from(segmento, 0)
+    version += 1 if version % 2 == 0 else 2
+    # Versión impar: escritura en curso
+    HEADER.pack_into(segmento, 0, version, 0)
+    segmento[HEADER.size:HEADER.size + len(payload)] = payload
+    HEADER.pack_into(segmento, 0, version + 1, len(payload))
+
+
+def get_snapshot() -> dict[str, Any] | None:
+    """
+    Obtiene el snapshot actual o None si no está disponible.
+
+    Sólo decodifica el JSON cuando cambió la versión del segmento.
+    """
+    global _cache
+    if not get_settings().ENABLE_SNAPSHOT:
+        return None
+
+    try:
+        segmento = _open_segment()
+    except OSError as e:
+        logger.warning(f"No se pudo abrir el snapshot: {e}")
+        return None
+
+    for _ in range(5):
+        version, longitud = HEADER.unpack_from(segmento, 0)
+        if version == 0 or version % 2 == 1:
+            continue
+        if version == _cache[0]:
+            return _cache[1]
+
+        payload = segmento[HEADER.size:HEADER.size + longitud]
+        if HEADER.unpack_from(segmento, 0)[0] != version:
+            continue
+
+        data = json.loads(payload)
+        _cache = (version, data)
+        return data
+
+    return _cache[1]
+
+
+def build_snapshot() -> dict[str, Any]:
+    """Consulta las tasas actuales que sirven los routers."""
+    from app.database import get_read_connection
+    from app.routers.cetes import consultar_tasas_actuales
+    from app.routers.comparar import construir_comparacion
+    from app.routers.fondos import consultar_top_fondos
+    from app.routers.sofipos import consultar_top_sofipos
+    from app.schemas.fondos import Moneda
+
+    with get_read_connection() as db:
+        return {
+            "cetes_actuales": consultar_tasas_actuales(db),
+            "sofipos_top": consultar_top_sofipos(db, TOP_SNAPSHOT),
+            "fondos_top": consultar_top_fondos(db, TOP_SNAPSHOT),
+            "fondos_top_mxn": consultar_top_fondos(db, TOP_SNAPSHOT, moneda=Moneda.MXN),
+            "comparar": construir_comparacion(db),
+            "comparar_mxn": construir_comparacion(db, moneda=Moneda.MXN),
+        }
+
+
+def refresh_snapshot() -> None:
+    """Reconstruye y publica el snapshot."""
+    write_snapshot(build_snapshot())
+
+
+def _refresh_loop() -> None:
+    """Intenta ser el refresher; sólo el dueño del lock escribe."""
+    intervalo = get_settings().SNAPSHOT_REFRESH_SECONDS
+    lock_file = open(f"{snapshot_path()}.lock", "w")
+    es_refresher = False
+
+    try:
+        while not _stop.is_set():
+            if not es_refresher:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    es_refresher = True
+                    logger.info(f"Proceso {os.getpid()} es el refresher del snapshot")
+                except BlockingIOError:
+                    pass
+
+            if es_refresher:
+                try:
+                    refresh_snapshot()
+                except Exception as e:
+                    logger.error(f"Error actualizando snapshot: {e}")
+
+            _stop.wait(intervalo)
+    finally:
+        lock_file.close()
+
+
+def start_snapshot() -> None:
+    """Arranca el hilo que mantiene el snapshot (si está habilitado)."""
+    global _refresher
+    if not get_settings().ENABLE_SNAPSHOT or _refresher is not None:
+        return
+    _stop.clear()
+    _refresher = threading.Thread(target=_refresh_loop, name="snapshot", daemon=True)
+    _refresher.start()
+
+
+def stop_snapshot() -> None:
+    """Detiene el hilo del snapshot."""
+    global _refresher
+    if _refresher is not None:
+        _stop.set()
+        _refresher.join(timeout=5)
+        _refresher = None
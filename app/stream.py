@@ -0,0 +1,157 @@
+"""
+Difusión de actualizaciones de tasas a suscriptores (SSE / WebSocket).
+
+Cada proceso abre una sola conexión con LISTEN al canal de
+notificaciones que emiten los collectors al confirmar datos nuevos, y
+reparte cada notificación a todos los suscriptores. Cada suscriptor
+tiene una cola acotada; si se llena (cliente lento), el suscriptor se
+descarta en lugar de frenar a los demás.
+
+Dentro del proceso también se pueden registrar oyentes (ej. la caché de
+respuestas), que reciben la fuente de cada notificación.
+
+LISTEN necesita una sesión propia: la conexión usa STREAM_DATABASE_URL
+(conexión directa o pooler en modo sesión). Un pooler en modo transacción
+(puerto 6543 de Supabase) no entrega las notificaciones.
+"""
+
+import asyncio
+from typing import Callable
+
+import psycopg
+from loguru import logger
+
+from app.config import get_settings
+from app.database import NOTIFY_CHANNEL, es_pooler_transacciones
+
+
+class Subscription:
+    """Cola de mensajes de un suscriptor."""
+
+    def __init__(self, fuentes: set[str] | None, maxsize: int):
+        self.fuentes = fuentes
+        self.queue: asyncio.Queue[tuple[str, str] | None] = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def offer(self, fuente: str, payload: str) -> bool:
+        """Encola un mensaje; regresa False si la cola está llena."""
+        if self.fuentes and fuente not in self.fuentes:
+            return True
+        try:
+            self.queue.put_nowait((fuente, payload))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self) -> None:
+        """Vacía la cola y deja la marca de fin para el consumidor."""
+        self.dropped = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class Broadcaster:
+    """Escucha el canal de PostgreSQL y reparte a los suscriptores."""
+
+    def __init__(self):
+        self.subscribers: set[Subscription] = set()
+        self.oyentes: list[Callable[[str], None]] = []
+        self._task: asyncio.Task | None = None
+
+    def _iniciar(self) -> None:
+        """Arranca el LISTEN si no está corriendo."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+
+    def subscribe(self, fuentes: set[str] | None = None) -> Subscription:
+        """Registra un suscriptor y arranca el LISTEN si hace falta."""
+        sub = Subscription(fuentes, get_settings().STREAM_QUEUE_SIZE)
+        self.subscribers.add(sub)
+        self._iniciar()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        """Elimina un suscriptor."""
+        self.subscribers.discard(sub)
+
+    def escuchar(self, oyente: Callable[[str], None]) -> None:
+        """
+        Registra un oyente de la fuente de cada notificación y arranca el LISTEN.
+
+        El oyente corre en el event loop: no debe bloquear.
+        """
+        self.oyentes.append(oyente)
+        self._iniciar()
+
+    def dejar_de_escuchar(self, oyente: Callable[[str], None]) -> None:
+        """Elimina un oyente."""
+        if oyente in self.oyentes:
+            self.oyentes.remove(oyente)
+
+    def publish(self, fuente: str, payload: str) -> None:
+        """Reparte un mensaje; descarta a los suscriptores con la cola llena."""
+        for oyente in self.oyentes:
+            try:
+                oyente(fuente)
+            except Exception as e:
+                logger.error(f"Error en oyente de notificaciones: {e}")
+        lentos = [sub for sub in self.subscribers if not sub.offer(fuente, payload)]
+        for sub in lentos:
+            logger.warning("Suscriptor lento descartado del stream")
+            self.unsubscribe(sub)
+            sub.close()
+
+    @staticmethod
+    def _dsn() -> str:
+        """URL de la conexión LISTEN; avisa si no conserva la sesión."""
+        settings = get_settings()
+        # NOTIFY no se replica: escuchar en la base principal
+        dsn = settings.STREAM_DATABASE_URL or settings.DATABASE_URL
+        if es_pooler_transacciones(dsn):
+            variable = "STREAM_DATABASE_URL" if settings.STREAM_DATABASE_URL else "DATABASE_URL"
+            logger.warning(
+                f"LISTEN sobre {variable}, un pooler en modo transacción: no llegarán "
+                "notificaciones (stream y caché de respuestas). Configurar "
+                "STREAM_DATABASE_URL con la conexión directa o el pooler en modo sesión"
+            )
+        elif not settings.STREAM_DATABASE_URL:
+            logger.warning("STREAM_DATABASE_URL vacío: LISTEN usa DATABASE_URL")
+        return dsn
+
+    async def _listen(self) -> None:
+        """Mantiene la conexión LISTEN, reconectando ante errores."""
+        dsn = self._dsn()
+        espera = 1.0
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(dsn, autocommit=True)
+                async with conn:
+                    await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    logger.info(f"Escuchando notificaciones en '{NOTIFY_CHANNEL}'")
+                    espera = 1.0
+                    async for notify in conn.notifies():
+                        fuente, _, payload = notify.payload.partition(":")
+                        self.publish(fuente, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en LISTEN ({e}); reintentando en {espera:.0f} s")
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, 60.0)
+
+    async def stop(self) -> None:
+        """Detiene el LISTEN y cierra a todos los suscriptores."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for sub in list(self.subscribers):
+            sub.close()
+        self.subscribers.clear()
+
+
+broadcaster = Broadcaster()
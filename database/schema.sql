@@ -8,10 +8,27 @@ CREATE TABLE IF NOT EXISTS cetes (
     tasa DECIMAL(5,2) NOT NULL,
     fecha_subasta DATE NOT NULL,
     fecha_vencimiento DATE,
+    -- Inflación anual a la fecha de subasta y tasa real, calculadas al guardar
+    inflacion DECIMAL(5,2),
+    tasa_real DECIMAL(5,2),
     created_at TIMESTAMP DEFAULT NOW(),
     UNIQUE(plazo, fecha_subasta)
 );
 
+-- Columnas de tasa real para bases creadas antes de agregarlas
+ALTER TABLE cetes ADD COLUMN IF NOT EXISTS inflacion DECIMAL(5,2);
+ALTER TABLE cetes ADD COLUMN IF NOT EXISTS tasa_real DECIMAL(5,2);
+
+-- Índices de inflación de Banxico (INPC mensual, UDI diaria)
+CREATE TABLE IF NOT EXISTS indices_inflacion (
+    id SERIAL PRIMARY KEY,
+    indice VARCHAR(10) NOT NULL,  -- 'INPC', 'UDI'
+    fecha DATE NOT NULL,
+    valor DECIMAL(14,6) NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE(indice, fecha)
+);
+
 -- Tabla para SOFIPOs
 CREATE TABLE IF NOT EXISTS sofipos (
     id SERIAL PRIMARY KEY,
@@ -43,16 +60,150 @@ CREATE TABLE IF NOT EXISTS fondos_etfs (
     rendimiento_anual DECIMAL(5,2),
     rendimiento_ytd DECIMAL(5,2),
     fecha_actualizacion DATE NOT NULL,
+    -- Equivalentes en pesos, calculados al guardar con el FIX del día
+    tipo_cambio DECIMAL(10,4),
+    precio_mxn DECIMAL(12,2),
+    rendimiento_anual_mxn DECIMAL(7,2),
+    rendimiento_ytd_mxn DECIMAL(7,2),
     created_at TIMESTAMP DEFAULT NOW(),
     UNIQUE(ticker, fecha_actualizacion)
 );
 
+-- Columnas en pesos para bases creadas antes de agregarlas
+ALTER TABLE fondos_etfs ADD COLUMN IF NOT EXISTS tipo_cambio DECIMAL(10,4);
+ALTER TABLE fondos_etfs ADD COLUMN IF NOT EXISTS precio_mxn DECIMAL(12,2);
+ALTER TABLE fondos_etfs ADD COLUMN IF NOT EXISTS rendimiento_anual_mxn DECIMAL(7,2);
+ALTER TABLE fondos_etfs ADD COLUMN IF NOT EXISTS rendimiento_ytd_mxn DECIMAL(7,2);
+
+-- Tipo de cambio diario (pesos por unidad de moneda; USD = FIX de Banxico)
+CREATE TABLE IF NOT EXISTS tipo_cambio (
+    id SERIAL PRIMARY KEY,
+    moneda VARCHAR(3) NOT NULL,  -- 'USD'
+    fecha DATE NOT NULL,
+    tipo_cambio DECIMAL(10,4) NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE(moneda, fecha)
+);
+
+-- Registros sospechosos detenidos por los collectors antes de guardarse
+CREATE TABLE IF NOT EXISTS cuarentena (
+    id SERIAL PRIMARY KEY,
+    fuente VARCHAR(50) NOT NULL,  -- 'banxico', 'etfs', 'sofipos'
+    tabla VARCHAR(50) NOT NULL,  -- tabla destino del registro
+    serie VARCHAR(200) NOT NULL,  -- plazo, ticker o nombre
+    fecha DATE NOT NULL,
+    valor DECIMAL(12,4),
+    motivo VARCHAR(200) NOT NULL,
+    registro JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    liberado_at TIMESTAMP,  -- Cargado a la tabla destino después de revisarlo
+    liberado_por VARCHAR(50)  -- 'nivel confirmado' o 'admin'
+);
+
+-- Liberación para bases creadas antes de agregarla
+ALTER TABLE cuarentena ADD COLUMN IF NOT EXISTS liberado_at TIMESTAMP;
+ALTER TABLE cuarentena ADD COLUMN IF NOT EXISTS liberado_por VARCHAR(50);
+
+-- Cola de recopilaciones bajo demanda (POST /api/admin/collect/{fuente});
+-- la drenan los procesos de python -m app.collectors.worker
+CREATE TABLE IF NOT EXISTS collector_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    fuente VARCHAR(50) NOT NULL,  -- 'banxico', 'etfs', 'sofipos'
+    parametros JSONB NOT NULL DEFAULT '{}',
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',  -- pendiente, en_curso, completado, error
+    intentos INTEGER NOT NULL DEFAULT 0,
+    worker VARCHAR(200),  -- host:pid del worker que lo tomó
+    insertados INTEGER,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    iniciado_at TIMESTAMP,
+    latido_at TIMESTAMP,  -- Último heartbeat del worker mientras corre
+    terminado_at TIMESTAMP
+);
+
+-- Heartbeat para colas creadas antes de agregarlo
+ALTER TABLE collector_jobs ADD COLUMN IF NOT EXISTS latido_at TIMESTAMP;
+
+-- Historial de ejecuciones de los collectors (app.collectors.ejecuciones)
+CREATE TABLE IF NOT EXISTS collector_runs (
+    id BIGSERIAL PRIMARY KEY,
+    fuente VARCHAR(50) NOT NULL,  -- 'banxico', 'etfs', 'sofipos'
+    proceso VARCHAR(200),  -- host:pid que ejecutó el collector
+    iniciado_at TIMESTAMP NOT NULL,
+    terminado_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    duracion_segundos DOUBLE PRECISION NOT NULL,
+    llamadas_http INTEGER NOT NULL DEFAULT 0,
+    bytes_recibidos BIGINT NOT NULL DEFAULT 0,
+    insertados INTEGER NOT NULL DEFAULT 0,
+    estado VARCHAR(20) NOT NULL DEFAULT 'ok',  -- ok, parcial, error
+    errores JSONB NOT NULL DEFAULT '{}',  -- Errores por etapa de los pipelines
+    error TEXT
+);
+
+-- Estado y errores por etapa para bases creadas antes de agregarlos
+ALTER TABLE collector_runs ADD COLUMN IF NOT EXISTS estado VARCHAR(20) NOT NULL DEFAULT 'ok';
+ALTER TABLE collector_runs ADD COLUMN IF NOT EXISTS errores JSONB NOT NULL DEFAULT '{}';
+
+-- Marca de agua por fuente: una fila, actualizada al final de cada ejecución
+CREATE TABLE IF NOT EXISTS collector_watermarks (
+    fuente VARCHAR(50) PRIMARY KEY,
+    ultima_ejecucion_id BIGINT REFERENCES collector_runs(id),
+    ultima_ejecucion_at TIMESTAMP NOT NULL,
+    ultimo_exito_at TIMESTAMP,
+    ultimo_error TEXT,
+    ultimo_dato DATE  -- Fecha del dato más reciente de la fuente
+);
+
+-- Tickers que recopila el collector de ETFs (app.collectors.watchlist);
+-- el planificador elige cuáles actualizar con las llamadas del día
+CREATE TABLE IF NOT EXISTS etf_watchlist (
+    ticker VARCHAR(20) PRIMARY KEY,
+    nombre VARCHAR(200),
+    tipo VARCHAR(50) DEFAULT 'ETF',
+    mercado VARCHAR(50),
+    activo BOOLEAN NOT NULL DEFAULT TRUE,
+    peso DOUBLE PRECISION NOT NULL DEFAULT 1,  -- Multiplicador manual de la prioridad
+    demanda DOUBLE PRECISION NOT NULL DEFAULT 0,  -- Consultas a /api/fondos/{ticker}, con decaimiento
+    demanda_at TIMESTAMP NOT NULL DEFAULT NOW(),  -- Momento al que corresponde demanda
+    volatilidad DOUBLE PRECISION,  -- Desviación estándar del cambio diario (%)
+    actualizado_at TIMESTAMP,  -- Último precio guardado
+    intentado_at TIMESTAMP,  -- Última vez que se planificó
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Llamadas del día a APIs con límite diario (Alpha Vantage), compartidas
+-- por todos los nodos: el planificador de ETFs reserva aquí las suyas
+CREATE TABLE IF NOT EXISTS api_llamadas (
+    fuente VARCHAR(50) NOT NULL,  -- 'alpha_vantage'
+    fecha DATE NOT NULL,
+    llamadas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (fuente, fecha)
+);
+
 -- Índices para optimizar consultas
 CREATE INDEX IF NOT EXISTS idx_cetes_fecha ON cetes(fecha_subasta DESC);
 CREATE INDEX IF NOT EXISTS idx_cetes_plazo ON cetes(plazo);
+CREATE INDEX IF NOT EXISTS idx_cetes_plazo_real ON cetes(plazo, fecha_subasta DESC)
+    INCLUDE (id, tasa, fecha_vencimiento, inflacion, tasa_real);
 CREATE INDEX IF NOT EXISTS idx_sofipos_fecha ON sofipos(fecha_actualizacion DESC);
-CREATE INDEX IF NOT EXISTS idx_sofipo_plazos_sofipo ON sofipo_plazos(sofipo_id);
+CREATE INDEX IF NOT EXISTS idx_sofipos_nombre_fecha ON sofipos(nombre, fecha_actualizacion DESC);
+CREATE INDEX IF NOT EXISTS idx_sofipo_plazos_sofipo_plazo ON sofipo_plazos(sofipo_id, plazo);
 CREATE INDEX IF NOT EXISTS idx_fondos_ticker ON fondos_etfs(ticker);
 CREATE INDEX IF NOT EXISTS idx_fondos_fecha ON fondos_etfs(fecha_actualizacion DESC);
 CREATE INDEX IF NOT EXISTS idx_fondos_tipo ON fondos_etfs(tipo);
 CREATE INDEX IF NOT EXISTS idx_fondos_mercado ON fondos_etfs(mercado);
+CREATE INDEX IF NOT EXISTS idx_cuarentena_fuente ON cuarentena(fuente, created_at DESC);
+-- Valores sin liberar de cada serie: los lee la ventana de FiltroAnomalias
+CREATE INDEX IF NOT EXISTS idx_cuarentena_pendientes ON cuarentena(tabla, serie, fecha DESC)
+    WHERE liberado_at IS NULL;
+-- Sólo los jobs por tomar: el SELECT ... FOR UPDATE SKIP LOCKED no recorre el histórico
+CREATE INDEX IF NOT EXISTS idx_collector_jobs_pendientes ON collector_jobs(created_at)
+    WHERE estado = 'pendiente';
+CREATE INDEX IF NOT EXISTS idx_collector_jobs_en_curso ON collector_jobs(iniciado_at)
+    WHERE estado = 'en_curso';
+-- Un solo job activo (pendiente o en curso) por fuente: encolar_job usa
+-- ON CONFLICT contra este índice, sin carreras entre schedulers
+CREATE UNIQUE INDEX IF NOT EXISTS idx_collector_jobs_activo ON collector_jobs(fuente)
+    WHERE estado IN ('pendiente', 'en_curso');
+CREATE INDEX IF NOT EXISTS idx_collector_runs_fuente ON collector_runs(fuente, iniciado_at DESC);
+CREATE INDEX IF NOT EXISTS idx_collector_runs_iniciado ON collector_runs(iniciado_at DESC);
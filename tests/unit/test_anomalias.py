@@ -0,0 +1,172 @@
+"""
+FiltroAnomalias.separar sin base de datos: la ventana de cada serie y la
+liberación de la cuarentena se sustituyen por datos fijos.
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from app.collectors.anomalias import FiltroAnomalias, Ventana
+
+
+INICIO = date(2025, 1, 1)
+
+
+def dia(n: int) -> date:
+    return INICIO + timedelta(days=n)
+
+
+def registro(serie: str, n: int, valor: float | None) -> dict:
+    return {"serie": serie, "fecha": dia(n), "valor": valor}
+
+
+class Conexion:
+    """Sustituye a la conexión: separar sólo la pasa a _ventanas y recuperar."""
+
+
+@pytest.fixture
+def filtro(monkeypatch):
+    """Filtro con ventanas fijas; recuperar regresa los ids liberados."""
+    filtro = FiltroAnomalias(
+        "tabla", "serie", "valor", "fecha", umbral_salto=0.3, ventana=20, umbral_z=4.0, confirmaciones=3
+    )
+    filtro.ventanas_fijas = {}
+    filtro.liberados = []
+
+    def recuperar(conn, ids, motivo):
+        filtro.liberados.extend(ids)
+        return [{"serie": "cuarentena", "id": i} for i in ids]
+
+    monkeypatch.setattr(filtro, "_ventanas", lambda conn, series: filtro.ventanas_fijas)
+    monkeypatch.setattr(filtro, "recuperar", recuperar)
+    return filtro
+
+
+def historia(valores: list[float], cuarentena: list[tuple[int, date, float]] = ()) -> Ventana:
+    """Ventana con valores diarios que terminan en el día 9."""
+    return Ventana(list(valores), dia(9), list(cuarentena))
+
+
+def test_lote_vacio(filtro):
+    assert filtro.separar(Conexion(), []) == ([], [])
+
+
+def test_pico_aislado_va_a_cuarentena(filtro):
+    filtro.ventanas_fijas = {"A": historia([14.2] * 10)}
+    lote = [registro("A", 10, 14.2), registro("A", 11, 20.0), registro("A", 12, 14.2)]
+
+    aceptados, sospechosos = filtro.separar(Conexion(), lote)
+
+    assert [r["fecha"] for r in aceptados] == [dia(10), dia(12)]
+    assert len(sospechosos) == 1
+    assert sospechosos[0][0]["valor"] == 20.0
+    assert sospechosos[0][1].startswith("z-score")
+    assert filtro.liberados == []
+
+
+def test_cambio_de_nivel_en_el_lote_se_acepta_al_confirmarse(filtro):
+    # 14.2 -> 12.0 es un cambio de 15% (sin salto) con z-score alto
+    filtro.ventanas_fijas = {"A": historia([14.2] * 10)}
+    lote = [registro("A", n, 12.0) for n in range(10, 15)]
+
+    aceptados, sospechosos = filtro.separar(Conexion(), lote)
+
+    assert sospechosos == []
+    assert len(aceptados) == 5
+
+
+def test_cambio_de_nivel_entre_ejecuciones_libera_la_cuarentena(filtro):
+    # Dos días del nivel nuevo ya en cuarentena; el tercero lo confirma
+    filtro.ventanas_fijas = {"A": historia([14.2] * 10, [(101, dia(10), 12.0), (102, dia(11), 12.0)])}
+
+    aceptados, sospechosos = filtro.separar(Conexion(), [registro("A", 12, 12.0)])
+
+    assert sospechosos == []
+    assert filtro.liberados == [101, 102]
+    assert {r["serie"] for r in aceptados} == {"A", "cuarentena"}
+
+
+def test_un_valor_normal_rompe_la_racha(filtro):
+    filtro.ventanas_fijas = {"A": historia([14.2] * 10, [(101, dia(10), 12.0), (102, dia(11), 12.0)])}
+    lote = [registro("A", 12, 14.2), registro("A", 13, 12.0)]
+
+    aceptados, sospechosos = filtro.separar(Conexion(), lote)
+
+    assert [r["fecha"] for r in aceptados] == [dia(12)]
+    assert [r["fecha"] for r, _ in sospechosos] == [dia(13)]
+    assert filtro.liberados == []
+
+
+def test_sospechosos_que_no_coinciden_no_confirman(filtro):
+    filtro.ventanas_fijas = {"A": historia([14.2] * 10)}
+    lote = [registro("A", 10, 12.0), registro("A", 11, 16.5), registro("A", 12, 12.0)]
+
+    aceptados, sospechosos = filtro.separar(Conexion(), lote)
+
+    assert aceptados == []
+    assert len(sospechosos) == 3
+
+
+def test_lote_con_varias_series(filtro):
+    filtro.ventanas_fijas = {
+        "A": historia([14.2] * 10),
+        "B": historia([100.0 + (n % 2) for n in range(10)]),
+    }
+    lote = [
+        registro("A", 10, 14.2),
+        registro("B", 10, 100.5),
+        registro("B", 11, 250.0),  # salto de B
+        registro("A", 11, 14.2),
+        registro("C", 10, 5.0),  # serie sin historia
+        registro("C", 11, 5.1),
+    ]
+
+    aceptados, sospechosos = filtro.separar(Conexion(), lote)
+
+    assert [(r["serie"], r["fecha"]) for r, _ in sospechosos] == [("B", dia(11))]
+    assert len(aceptados) == 5
+    # Cada serie se compara contra su propia ventana
+    assert sospechosos[0][1] == "z-score 74.4 (media 100.5)"
+
+
+def test_salto_en_serie_nueva(filtro):
+    # Sin historia no hay z-score; sólo aplica el salto dentro del lote
+    lote = [registro("C", 2, 9.0), registro("C", 0, 5.0), registro("C", 1, 5.1)]
+
+    aceptados, sospechosos = filtro.separar(Conexion(), lote)
+
+    assert [r["fecha"] for r in aceptados] == [dia(0), dia(1)]
+    assert [r["fecha"] for r, _ in sospechosos] == [dia(2)]
+    assert sospechosos[0][1] == "salto 76% (anterior 5.1)"
+
+
+def test_valores_nulos_se_aceptan_y_no_rompen_las_pruebas(filtro):
+    filtro.ventanas_fijas = {"A": historia([14.2] * 10)}
+    lote = [registro("A", 10, None), registro("A", 11, 20.0), registro("A", 12, None), registro("A", 13, 14.2)]
+
+    aceptados, sospechosos = filtro.separar(Conexion(), lote)
+
+    assert [r["fecha"] for r in aceptados] == [dia(10), dia(12), dia(13)]
+    assert [r["fecha"] for r, _ in sospechosos] == [dia(11)]
+
+
+def test_registros_anteriores_a_la_ventana_no_se_comparan_por_z(filtro):
+    # Carga de historia: fechas anteriores a lo guardado no usan z-score
+    filtro.ventanas_fijas = {"A": historia([14.2] * 10)}
+
+    aceptados, sospechosos = filtro.separar(Conexion(), [registro("A", -30, 12.0)])
+
+    assert len(aceptados) == 1
+    assert sospechosos == []
+
+
+def test_sin_confirmaciones_el_nivel_nuevo_sigue_en_cuarentena(filtro):
+    filtro.confirmaciones = 0
+    filtro.ventanas_fijas = {"A": historia([14.2] * 10)}
+    lote = [registro("A", n, 12.0) for n in range(10, 15)]
+
+    aceptados, sospechosos = filtro.separar(Conexion(), lote)
+
+    assert aceptados == []
+    assert len(sospechosos) == 5
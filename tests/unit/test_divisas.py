@@ -0,0 +1,137 @@
+"""
+As-of join del tipo de cambio (valores_as_of) y conversión de fondos a
+pesos (convertir_a_mxn) con un FIX fijo en lugar de la tabla tipo_cambio.
+"""
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.collectors import divisas
+from app.collectors.divisas import COLUMNAS_MXN, convertir_a_mxn, valores_as_of
+
+
+# FIX de días hábiles: 2024-01-01 y 2025-01-01 son festivos, 2025-01-04/05 fin de semana
+FIX = {
+    date(2024, 1, 2): 17.00,
+    date(2024, 12, 30): 20.40,
+    date(2024, 12, 31): 20.50,
+    date(2025, 1, 2): 20.60,
+    date(2025, 1, 3): 20.80,
+    date(2025, 1, 6): 21.00,
+}
+
+
+def fechas(*dias: date) -> np.ndarray:
+    return np.array(dias, dtype="datetime64[D]")
+
+
+def serie(valores: dict[date, float]) -> tuple[np.ndarray, np.ndarray]:
+    orden = sorted(valores)
+    return fechas(*orden), np.array([valores[d] for d in orden], dtype=np.float64)
+
+
+@pytest.fixture
+def fix(monkeypatch):
+    """cargar_tipo_cambio lee FIX (filtrado por rango como la consulta)."""
+    valores = dict(FIX)
+
+    def cargar(conn, desde, hasta):
+        return serie({d: v for d, v in valores.items() if desde <= d <= hasta})
+
+    monkeypatch.setattr(divisas, "cargar_tipo_cambio", cargar)
+    return valores
+
+
+def fondo(dia: date, precio=100.0, anual=10.0, diario=1.0) -> dict:
+    return {"fecha_actualizacion": dia, "precio_actual": precio, "rendimiento_anual": anual, "rendimiento_ytd": diario}
+
+
+class TestValoresAsOf:
+    def test_fecha_anterior_al_primer_fix(self):
+        idx, valor = valores_as_of(fechas(date(2023, 12, 29)), *serie(FIX))
+        assert idx[0] == -1
+        assert np.isnan(valor[0])
+
+    def test_fecha_exacta(self):
+        idx, valor = valores_as_of(fechas(date(2025, 1, 3)), *serie(FIX))
+        assert idx[0] == 4
+        assert valor[0] == 20.80
+
+    def test_fin_de_semana_usa_el_viernes(self):
+        _, valor = valores_as_of(fechas(date(2025, 1, 4), date(2025, 1, 5)), *serie(FIX))
+        assert valor.tolist() == [20.80, 20.80]
+
+    def test_festivo_usa_el_dia_habil_anterior(self):
+        _, valor = valores_as_of(fechas(date(2025, 1, 1)), *serie(FIX))
+        assert valor[0] == 20.50
+
+    def test_hueco_mayor_a_max_dias(self):
+        # Del 2024-01-02 al 2024-12-30 no hay FIX
+        _, valor = valores_as_of(fechas(date(2024, 1, 7), date(2024, 1, 8)), *serie(FIX))
+        assert valor[0] == 17.00
+        assert np.isnan(valor[1])
+
+    def test_desfase(self):
+        _, valor = valores_as_of(fechas(date(2025, 1, 2)), *serie(FIX), desfase=366)
+        assert valor[0] == 17.00
+
+    def test_orden_de_fechas_no_importa(self):
+        consulta = fechas(date(2025, 1, 6), date(2023, 1, 1), date(2025, 1, 1))
+        idx, valor = valores_as_of(consulta, *serie(FIX))
+        assert idx.tolist() == [5, -1, 2]
+        assert valor[0] == 21.00 and np.isnan(valor[1]) and valor[2] == 20.50
+
+
+class TestConvertirAMxn:
+    def test_dia_habil(self, fix):
+        registro = fondo(date(2025, 1, 3))
+        convertir_a_mxn(None, [registro])
+
+        assert registro["tipo_cambio"] == 20.80
+        assert registro["precio_mxn"] == 2080.00
+        # Cambio diario contra el FIX anterior
+        assert registro["rendimiento_ytd_mxn"] == round((1.01 * 20.80 / 20.60 - 1) * 100, 2)
+        # Anual contra el FIX de hace un año (2024-01-03 -> 2024-01-02)
+        assert registro["rendimiento_anual_mxn"] == round((1.10 * 20.80 / 17.00 - 1) * 100, 2)
+
+    def test_fin_de_semana_y_festivo(self, fix):
+        sabado, festivo = fondo(date(2025, 1, 4)), fondo(date(2025, 1, 1))
+        convertir_a_mxn(None, [sabado, festivo])
+
+        assert sabado["tipo_cambio"] == 20.80
+        assert sabado["rendimiento_ytd_mxn"] == round((1.01 * 20.80 / 20.60 - 1) * 100, 2)
+        assert festivo["tipo_cambio"] == 20.50
+        assert festivo["rendimiento_ytd_mxn"] == round((1.01 * 20.50 / 20.40 - 1) * 100, 2)
+
+    def test_fecha_anterior_al_primer_fix(self, fix):
+        antes, despues = fondo(date(2023, 12, 1)), fondo(date(2025, 1, 6))
+        convertir_a_mxn(None, [antes, despues])
+
+        assert all(antes[c] is None for c in COLUMNAS_MXN)
+        assert despues["precio_mxn"] == 2100.00
+
+    def test_primer_fix_sin_anterior(self, fix):
+        registro = fondo(date(2024, 1, 2))
+        convertir_a_mxn(None, [registro])
+
+        assert registro["precio_mxn"] == 1700.00
+        assert registro["rendimiento_ytd_mxn"] is None
+        assert registro["rendimiento_anual_mxn"] is None
+
+    def test_sin_fix(self, fix):
+        fix.clear()
+        registro = fondo(date(2025, 1, 3))
+        convertir_a_mxn(None, [registro])
+
+        assert all(registro[c] is None for c in COLUMNAS_MXN)
+
+    def test_valores_nulos(self, fix):
+        registro = fondo(date(2025, 1, 3), precio=None, anual=None)
+        convertir_a_mxn(None, [registro])
+
+        assert registro["tipo_cambio"] == 20.80
+        assert registro["precio_mxn"] is None
+        assert registro["rendimiento_anual_mxn"] is None
+        assert registro["rendimiento_ytd_mxn"] is not None
@@ -0,0 +1,115 @@
+"""
+Inflación anual y tasa real de CETES (app.collectors.inflacion) con
+índices fijos en lugar de la tabla indices_inflacion.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from app.collectors import inflacion
+from app.collectors.inflacion import INPC, UDI, calcular_tasas_reales, inflacion_anual
+
+
+def udi_diaria(desde: date, hasta: date, inicial: float, anual: float) -> dict[date, float]:
+    """UDI de todos los días (se publica también en fines de semana) con crecimiento constante."""
+    diaria = (1 + anual) ** (1 / 365)
+    dias = (hasta - desde).days + 1
+    return {desde + timedelta(days=n): inicial * diaria ** n for n in range(dias)}
+
+
+# INPC del primero de cada mes: diciembre de 2023 en 100, 2024 en 100 + mes,
+# 2025 en 104 + mes
+INPC_MENSUAL = {
+    date(2023, 12, 1): 100.0,
+    **{date(2024, mes, 1): 100.0 + mes for mes in range(1, 13)},
+    **{date(2025, mes, 1): 104.0 + mes for mes in range(1, 4)},
+}
+
+
+@pytest.fixture
+def indices(monkeypatch):
+    """cargar_indice lee de un dict por índice (filtrado por rango como la consulta)."""
+    valores = {UDI: {}, INPC: {}}
+
+    def cargar(conn, indice, desde, hasta):
+        serie = {d: v for d, v in valores[indice].items() if desde <= d <= hasta}
+        orden = sorted(serie)
+        return np.array(orden, dtype="datetime64[D]"), np.array([serie[d] for d in orden], dtype=np.float64)
+
+    monkeypatch.setattr(inflacion, "cargar_indice", cargar)
+    return valores
+
+
+def anual(*dias: date) -> np.ndarray:
+    return inflacion_anual(None, np.array(dias, dtype="datetime64[D]"))
+
+
+def test_udi(indices):
+    indices[UDI] = udi_diaria(date(2024, 1, 1), date(2025, 3, 31), 8.0, 0.04)
+
+    # Un año de 365 días; 2024 es bisiesto, así que se compara contra el 2 de marzo
+    assert anual(date(2025, 3, 1))[0] == pytest.approx(4.0)
+
+
+def test_udi_antes_de_un_año_de_historia(indices):
+    indices[UDI] = udi_diaria(date(2024, 6, 1), date(2025, 3, 31), 8.0, 0.04)
+
+    assert np.isnan(anual(date(2025, 3, 1))[0])
+
+
+def test_inpc_con_desfase_de_publicacion(indices):
+    indices[INPC] = dict(INPC_MENSUAL)
+
+    resultado = anual(date(2025, 2, 5), date(2025, 2, 15), date(2025, 3, 5))
+
+    # 2025-02-05 - 40 días = 2024-12-27: el último INPC publicado es el de diciembre
+    assert resultado[0] == pytest.approx((112.0 / 100.0 - 1) * 100)
+    # Desde el 10 de febrero ya se publicó el de enero
+    assert resultado[1] == pytest.approx((105.0 / 101.0 - 1) * 100)
+    assert resultado[2] == pytest.approx((105.0 / 101.0 - 1) * 100)
+
+
+def test_inpc_cubre_huecos_de_udi(indices):
+    udi = udi_diaria(date(2024, 1, 1), date(2025, 3, 31), 8.0, 0.06)
+    # Sin UDI en torno al 2025-03-05 (hueco mayor a MAX_DIAS_UDI)
+    indices[UDI] = {d: v for d, v in udi.items() if not date(2025, 2, 20) <= d <= date(2025, 3, 10)}
+    indices[INPC] = dict(INPC_MENSUAL)
+
+    resultado = anual(date(2025, 2, 15), date(2025, 3, 5), date(2025, 3, 15))
+
+    assert resultado[0] == pytest.approx(6.0)
+    assert resultado[1] == pytest.approx((105.0 / 101.0 - 1) * 100)
+    assert resultado[2] == pytest.approx(6.0)
+
+
+def test_inpc_viejo_no_se_usa(indices):
+    # Sin INPC después de enero de 2024: en 2025 ya es más antiguo que MAX_DIAS_INPC
+    indices[INPC] = {d: v for d, v in INPC_MENSUAL.items() if d <= date(2024, 1, 1)}
+
+    assert np.isnan(anual(date(2025, 3, 5))[0])
+
+
+def test_tasa_real(indices):
+    indices[UDI] = udi_diaria(date(2024, 1, 1), date(2025, 3, 31), 8.0, 0.04)
+    registros = [
+        {"fecha_subasta": date(2025, 3, 1), "tasa": 10.0},
+        {"fecha_subasta": date(2025, 3, 8), "tasa": 3.0},
+    ]
+
+    calcular_tasas_reales(None, registros)
+
+    assert registros[0]["inflacion"] == 4.0
+    assert registros[0]["tasa_real"] == round((1.10 / 1.04 - 1) * 100, 2)
+    # Tasa por debajo de la inflación: tasa real negativa
+    assert registros[1]["tasa_real"] == round((1.03 / 1.04 - 1) * 100, 2)
+
+
+def test_tasa_real_sin_indices(indices):
+    registros = [{"fecha_subasta": date(2025, 3, 1), "tasa": 10.0}]
+
+    calcular_tasas_reales(None, registros)
+
+    assert registros[0]["inflacion"] is None
+    assert registros[0]["tasa_real"] is None